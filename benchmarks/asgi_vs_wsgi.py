@@ -0,0 +1,190 @@
+"""
+Compare the WSGI and ASGI entry points on the hot read endpoints.
+
+Both handlers are driven in-process, so the numbers show the cost of the
+Django request path and not of a particular server or the network:
+
+* WSGI: ``WSGIHandler`` behind a pool of ``threads`` workers, as a threaded
+  server (gunicorn ``gthread``, mod_wsgi) would run it. Connections beyond
+  the pool size wait for a free thread.
+* ASGI: ``ASGIHandler`` on one event loop, one task per connection, as
+  uvicorn would run it, once with the default sync views and once with
+  ``ASGI_URLCONF`` routing the hot endpoints to ``restaurant.async_views``.
+
+Each of ``connections`` clients sends requests back to back until
+``requests`` have been answered per endpoint. ``client_delay`` (ms) models
+slow clients: writing the response body takes that long, which holds a WSGI
+worker thread but only suspends an ASGI task.
+
+    python -m benchmarks.asgi_vs_wsgi [connections] [requests] [threads] [client_delay]
+
+Note that under ASGI Django still runs every ``MiddlewareMixin`` middleware
+(sessions, CSRF, messages, ...) in a worker thread; the async views add no
+thread handoffs of their own.
+"""
+import asyncio
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.common import test_database
+from benchmarks.menu_snapshot import populate
+
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from restaurant.models import Booking
+from restaurant.snapshot import rebuild_menu_snapshot
+
+
+def summarize(samples, elapsed):
+    samples.sort()
+    return {
+        'rps': len(samples) / elapsed,
+        'p50': samples[len(samples) // 2],
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def report(label, stats):
+    print(f"{label:<46} {stats['rps']:9.0f} req/s   p50 {stats['p50']:8.2f} ms   p99 {stats['p99']:8.2f} ms")
+
+
+def split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+# WSGI
+
+def run_wsgi(path, headers, connections, total, threads, client_delay):
+    handler = WSGIHandler()
+    path_info, query = split(path)
+    remaining = iter(range(total))
+    lock = threading.Lock()
+    samples = []
+
+    def start_response(status, response_headers, exc_info=None):
+        assert status.startswith(('200', '304')), status
+
+    def request():
+        environ = {'PATH_INFO': path_info, 'QUERY_STRING': query, 'SERVER_NAME': 'testserver'}
+        environ.update(headers)
+        setup_testing_defaults(environ)
+        response = handler(environ, start_response)
+        b''.join(response)
+        if client_delay:
+            time.sleep(client_delay)
+        response.close()
+
+    def client(pool):
+        # One connection: each request waits for a free worker thread
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            pool.submit(request).result()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    with ThreadPoolExecutor(threads) as pool, ThreadPoolExecutor(connections) as clients:
+        started = time.perf_counter()
+        for future in [clients.submit(client, pool) for _ in range(connections)]:
+            future.result()
+        elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed)
+
+
+# ASGI
+
+async def run_asgi(path, headers, connections, total, client_delay):
+    handler = ASGIHandler()
+    path_info, query = split(path)
+    asgi_headers = [(b'host', b'testserver')] + [
+        (name[5:].replace('_', '-').lower().encode(), value.encode()) for name, value in headers.items()
+    ]
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'root_path': '',
+        'path': path_info, 'raw_path': path_info.encode(), 'query_string': query.encode(),
+        'headers': asgi_headers, 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    remaining = iter(range(total))
+    samples = []
+
+    async def request():
+        body_sent = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnected.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                assert message['status'] in (200, 304), message['status']
+            elif client_delay:
+                await asyncio.sleep(client_delay)
+
+        await handler(dict(scope), receive, send)
+        disconnected.set()
+
+    async def client():
+        while next(remaining, None) is not None:
+            start = time.perf_counter()
+            await request()
+            samples.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(connections)))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 32
+    client_delay = float(sys.argv[4]) / 1000 if len(sys.argv) > 4 else 0
+
+    with test_database():
+        populate(500)
+        rebuild_menu_snapshot()
+        user = User.objects.create_user(username='bench', password='bench-password')
+        booking = Booking.objects.create(
+            customer_name='Bench', customer_email='bench@example.com', no_of_guests=2,
+            booking_date=timezone.now() + timedelta(days=1), user=user,
+        )
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+        endpoints = [
+            ('menu list', '/restaurant/menu/?page=2', {}),
+            ('featured', '/restaurant/menu/featured/', {}),
+            ('by category', '/restaurant/menu/category/pizza/', {}),
+            ('categories', '/restaurant/menu/categories/', {}),
+            ('booking detail', f'/restaurant/booking/{booking.pk}/', auth),
+        ]
+        print(
+            f'{connections} connections, {total} requests per endpoint, {threads} WSGI threads, '
+            f'{client_delay * 1000:g} ms client delay'
+        )
+        for label, path, headers in endpoints:
+            report(f'{label}: WSGI', run_wsgi(path, headers, connections, total, threads, client_delay))
+            report(f'{label}: ASGI', asyncio.run(run_asgi(path, headers, connections, total, client_delay)))
+            with override_settings(ASGI_URLCONF='littlelemon.urls_asgi'):
+                stats = asyncio.run(run_asgi(path, headers, connections, total, client_delay))
+            report(f'{label}: ASGI, async views', stats)
+
+
+if __name__ == '__main__':
+    main()
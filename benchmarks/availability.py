@@ -0,0 +1,56 @@
+"""
+Time the table availability index on a busy week of bookings.
+
+    python -m benchmarks.availability [bookings_per_day]
+"""
+import sys
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from benchmarks.common import measure, report, test_database
+
+from restaurant.availability import availability_index, restaurant_tables
+from restaurant.models import Booking
+
+
+def populate(per_day):
+    tz = timezone.get_current_timezone()
+    tables = sorted(restaurant_tables())
+    start = timezone.now().date() + timedelta(days=1)
+    bookings = []
+    for day in range(7):
+        date = start + timedelta(days=day)
+        for i in range(per_day):
+            table = tables[i % len(tables)]
+            hour = 11 + (i // len(tables)) * 2
+            if hour > 21:
+                break
+            bookings.append(Booking(
+                customer_name=f'Guest {day}-{i}',
+                customer_email=f'guest{day}-{i}@example.com',
+                no_of_guests=2,
+                booking_date=datetime.combine(date, time(hour, 0), tzinfo=tz),
+                table_number=table,
+            ))
+    Booking.objects.bulk_create(bookings)
+    return start
+
+
+def main():
+    per_day = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with test_database():
+        start = populate(per_day)
+        availability_index.invalidate()
+        report('index load', measure(lambda: (availability_index.invalidate(), availability_index.free_tables(
+            timezone.now(), 2)), repeat=20))
+
+        dinner = datetime.combine(start, time(19, 30), tzinfo=timezone.get_current_timezone())
+        report('free tables at 19:30', measure(lambda: availability_index.free_tables(dinner, 4), repeat=2000))
+        report('single table conflict check', measure(lambda: availability_index.conflicts(5, dinner), repeat=2000))
+        report('free slots, one day', measure(lambda: availability_index.free_slots(start, 4), repeat=500))
+        report('free slots, one week', measure(lambda: availability_index.free_slots(start, 4, days=7), repeat=200))
+
+
+if __name__ == '__main__':
+    main()
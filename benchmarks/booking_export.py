@@ -0,0 +1,49 @@
+"""
+Measure streaming booking export throughput, against the serializer path it
+replaces.
+
+    python -m benchmarks.booking_export [rows]
+"""
+import sys
+import time
+from datetime import timedelta
+
+from benchmarks.common import test_database
+
+from django.utils import timezone
+
+from benchmarks.booking_pagination import populate
+from restaurant.booking_export import bookings_between, export_bookings
+from restaurant.serializers import BookingSerializer
+
+
+def throughput(label, func, rows):
+    start = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - start
+    print(f'{label:<32} {elapsed:7.2f} s   {rows / elapsed:9.0f} rows/s   {size / 2**20:7.1f} MiB')
+
+
+def drain(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    with test_database():
+        populate(rows)
+        today = timezone.now().date()
+        # Nothing is archived, so this is the Booking queryset alone
+        [queryset] = bookings_between(today, today + timedelta(days=3650))
+        assert queryset.count() == rows
+
+        for file_format in ('ndjson', 'csv'):
+            throughput(f'export ({file_format})', lambda: drain(export_bookings(queryset, file_format)), rows)
+
+        sample = min(rows, 50_000)
+        throughput(f'BookingSerializer ({sample} rows)', lambda: len(str(
+            BookingSerializer(queryset.select_related('user')[:sample], many=True).data)), sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare page number and keyset pagination of the staff booking list.
+
+    python -m benchmarks.booking_pagination [rows]
+
+Defaults to a million bookings; deep pages are where OFFSET scans hurt.
+"""
+import sys
+from datetime import timedelta
+
+from benchmarks.common import measure, report, test_database
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from restaurant.models import Booking
+from restaurant.pagination import BookingPagination, KeysetPagination
+
+BATCH_SIZE = 20000
+
+
+def populate(rows):
+    start = timezone.now() + timedelta(days=1)
+    with transaction.atomic():
+        for offset in range(0, rows, BATCH_SIZE):
+            Booking.objects.bulk_create(
+                Booking(
+                    customer_name=f'Guest {i}',
+                    customer_email=f'guest{i}@example.com',
+                    no_of_guests=2 + i % 6,
+                    booking_date=start + timedelta(minutes=30 * (i // 10)),
+                    table_number=i % 10 + 1,
+                )
+                for i in range(offset, min(rows, offset + BATCH_SIZE))
+            )
+
+
+def fetch(paginator_class, params):
+    request = Request(APIRequestFactory().get('/restaurant/booking/', params))
+    paginator = paginator_class()
+    page = paginator.paginate_queryset(Booking.objects.all(), request)
+    return paginator.get_paginated_response([booking.pk for booking in page])
+
+
+def cursor_at(position):
+    """Return the cursor that continues after the row at ``position``."""
+    row = Booking.objects.order_by('booking_date', 'id')[position]
+    paginator = KeysetPagination()
+    paginator.ordering = BookingPagination.keyset_ordering
+    paginator.base_url = 'http://testserver/restaurant/booking/'
+    return paginator.encode_cursor('n', paginator.row_key(row)).split('cursor=')[1]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with test_database():
+        populate(rows)
+        page_size = PageNumberPagination.page_size
+        last_page = rows // page_size
+        print(f'{rows} bookings, {page_size} per page')
+
+        for page in (1, last_page // 2, last_page):
+            report(f'page number, page {page}', measure(
+                lambda: fetch(PageNumberPagination, {'page': page}), repeat=20, warmup=2))
+            cursor = cursor_at((page - 1) * page_size - 1) if page > 1 else ''
+            report(f'keyset, page {page}', measure(
+                lambda: fetch(BookingPagination, {'cursor': cursor}), repeat=20, warmup=2))
+        report('keyset + approximate total', measure(
+            lambda: fetch(BookingPagination, {'cursor': '', 'include_total': 'true'}), repeat=20, warmup=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Concurrent booking stress test: many processes competing for a few slots.
+
+    python -m benchmarks.booking_stress [processes] [attempts_per_process]
+
+Every process posts bookings back to back to ``BookingListCreateView`` for
+random parties, at one of six half-hour starts of the same evening, with a
+random table or none. Afterwards the bookings are checked: no table is
+double-booked, no slot holds more tables or guests than the dining room,
+every failure was a 400 or 409 (never a 500 from an ``IntegrityError``) and
+the slot inventory matches one rebuilt from the bookings. Exits with status
+1 if any check fails.
+"""
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+from benchmarks.sqlite_contention import TUNED, use_database
+
+from django.core.management import call_command
+from django.db import close_old_connections, connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+
+def worker(name, index, attempts, evening):
+    use_database(name, TUNED)
+    from restaurant.availability import restaurant_tables
+    from restaurant.views import BookingListCreateView
+
+    view = BookingListCreateView.as_view()
+    factory = APIRequestFactory()
+    rng = random.Random(index)
+    tables = sorted(restaurant_tables())
+    statuses = Counter()
+    for i in range(attempts):
+        data = {
+            'customer_name': f'Guest {index}-{i}',
+            'customer_email': f'guest{index}-{i}@example.com',
+            'no_of_guests': rng.choice([1, 2, 2, 2, 3, 4, 4, 5, 6]),
+            'booking_date': (evening + timedelta(minutes=30 * rng.randrange(6))).isoformat(),
+        }
+        if rng.random() < 0.7:
+            data['table_number'] = rng.choice(tables)
+        try:
+            statuses[view(factory.post('/restaurant/booking/', data, format='json')).status_code] += 1
+        except Exception as exc:
+            statuses[type(exc).__name__] += 1
+        close_old_connections()
+    connection.close()
+    return statuses
+
+
+def check(evening):
+    """Return a list of invariant violations in the bookings and slot inventory."""
+    from restaurant.availability import booking_duration, restaurant_tables
+    from restaurant.inventory import rebuild_inventory, slot_starts
+    from restaurant.models import Booking, SlotInventory
+
+    problems = []
+    tables = restaurant_tables()
+    duration = booking_duration()
+    bookings = list(Booking.objects.values_list('booking_date', 'table_number', 'no_of_guests'))
+    by_table = {}
+    for booking_date, table_number, _ in bookings:
+        if table_number is not None:
+            by_table.setdefault(table_number, []).append(booking_date)
+    for table_number, starts in by_table.items():
+        starts.sort()
+        for earlier, later in zip(starts, starts[1:]):
+            if later - earlier < duration:
+                problems.append(f'table {table_number} double-booked at {earlier} and {later}')
+
+    held = {}
+    for booking_date, _, guests in bookings:
+        for slot in slot_starts(booking_date):
+            counters = held.setdefault(slot, [0, 0])
+            counters[0] += 1
+            counters[1] += guests
+    for slot, (count, guests) in sorted(held.items()):
+        if count > len(tables) or guests > sum(tables.values()):
+            problems.append(f'{slot}: {count} bookings for {guests} guests')
+
+    inventory = list(SlotInventory.objects.values_list('slot', 'covers_left', 'tables_left', 'tables_taken'))
+    rebuild_inventory(since=evening - duration)
+    if inventory != list(SlotInventory.objects.values_list('slot', 'covers_left', 'tables_left', 'tables_taken')):
+        problems.append('the slot inventory differs from one rebuilt from the bookings')
+    return problems, len(bookings)
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    evening = (timezone.now() + timedelta(days=2)).replace(hour=18, minute=0, second=0, microsecond=0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.join(directory, 'stress.sqlite3')
+        use_database(name, TUNED)
+        call_command('migrate', verbosity=0)
+        connection.close()
+
+        jobs = [(name, index, attempts, evening) for index in range(processes)]
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            started = time.perf_counter()
+            results = pool.starmap(worker, jobs)
+            elapsed = time.perf_counter() - started
+
+        statuses = sum(results, Counter())
+        problems, booked = check(evening)
+        connection.close()
+
+    print(f'{processes} processes x {attempts} attempts in {elapsed:.1f} s ({processes * attempts / elapsed:.0f}/s)')
+    print('responses: ' + ', '.join(f'{key}: {count}' for key, count in sorted(statuses.items(), key=str)))
+    print(f'{booked} bookings')
+    failures = {key: count for key, count in statuses.items() if key not in (201, 400, 409)}
+    if failures:
+        problems.append(f'unexpected responses: {failures}')
+    for problem in problems:
+        print(f'FAIL: {problem}')
+    if problems:
+        sys.exit(1)
+    print('OK: no double-booked table, no overfull slot, inventory consistent')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway test database so they never touch
+``db.sqlite3``. Run them from the project root, e.g.::
+
+    python -m benchmarks.menu_snapshot
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'littlelemon.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+
+@contextmanager
+def test_database(name=None):
+    """
+    Create a fresh, migrated test database for the duration of the block, in
+    memory or, for benchmarks writing from several threads, in file ``name``.
+    """
+    if name:
+        connection.settings_dict['TEST']['NAME'] = name
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=200, warmup=5):
+    """Call ``func`` ``repeat`` times and return latency statistics in ms."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'p99': samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def report(label, stats):
+    print(f"{label:<40} mean {stats['mean']:8.3f} ms   p50 {stats['p50']:8.3f} ms   p99 {stats['p99']:8.3f} ms")
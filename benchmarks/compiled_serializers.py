@@ -0,0 +1,48 @@
+"""
+Compare the DRF serializers with their compiled read path
+(``restaurant.compiled``), from the query to the rendered JSON.
+
+    python -m benchmarks.compiled_serializers [rows]
+"""
+import sys
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth.models import User
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.booking_pagination import populate as populate_bookings
+from benchmarks.menu_snapshot import populate as populate_menu
+from restaurant.compiled import compiled
+from restaurant.models import Booking, Menu
+from restaurant.serializers import BookingSerializer, MenuSerializer
+
+render = JSONRenderer().render
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with test_database():
+        populate_menu(rows)
+        populate_bookings(rows)
+        user = User.objects.create_user(username='guest')
+        Booking.objects.filter(table_number__lte=5).update(user=user)
+        print(f'{rows} rows per model')
+
+        cases = [
+            ('menu', MenuSerializer, Menu.objects.all()),
+            ('booking', BookingSerializer, Booking.objects.all()),
+        ]
+        for label, serializer_class, queryset in cases:
+            queryset = serializer_class.setup_eager_loading(queryset)
+            fast = compiled(serializer_class)
+            assert render(serializer_class(queryset, many=True).data) == render(fast.serialize(fast.rows(queryset)))
+            repeat = max(5, 20000 // rows)
+            report(f'{label}: serializer', measure(
+                lambda: render(serializer_class(queryset, many=True).data), repeat=repeat))
+            report(f'{label}: compiled', measure(
+                lambda: render(fast.serialize(fast.rows(queryset))), repeat=repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compare DRF's JSON renderer and parser with the orjson-backed ones
+(``restaurant.renderers``) on the menu list and booking list payloads.
+
+    python -m benchmarks.json_renderers [rows]
+"""
+import io
+import json
+import sys
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from benchmarks.booking_pagination import populate as populate_bookings
+from benchmarks.menu_snapshot import populate as populate_menu
+from restaurant import renderers
+from restaurant.compiled import compiled
+from restaurant.models import Booking
+from restaurant.renderers import FastJSONParser, FastJSONRenderer
+from restaurant.serializers import BookingSerializer
+from restaurant.snapshot import get_menu_snapshot
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    if renderers.orjson is None:
+        print('orjson is not installed: the fast classes fall back to DRF\'s')
+    with test_database():
+        populate_menu(rows)
+        populate_bookings(rows)
+        user = User.objects.create_user(username='guest')
+        Booking.objects.filter(table_number__lte=5).update(user=user)
+        serializer = compiled(BookingSerializer)
+        payloads = {
+            'menu list': {'count': rows, 'next': None, 'previous': None, 'results': get_menu_snapshot().items},
+            'booking list': {
+                'count': rows, 'next': None, 'previous': None,
+                'results': serializer.serialize(serializer.rows(Booking.objects.all())),
+            },
+            # What the default encoder is called for: Decimal and datetime objects
+            'booking values': list(Booking.objects.values()),
+        }
+        print(f'{rows} rows per payload')
+        repeat = max(20, 50000 // rows)
+        for label, data in payloads.items():
+            report(f'{label}: JSONRenderer', measure(lambda: JSONRenderer().render(data), repeat=repeat))
+            report(f'{label}: FastJSONRenderer', measure(lambda: FastJSONRenderer().render(data), repeat=repeat))
+
+        body = json.dumps({
+            'customer_name': 'Jane Doe', 'customer_email': 'jane@example.com', 'no_of_guests': 4,
+            'booking_date': timezone.now().isoformat(), 'table_number': 3, 'special_requests': 'Window seat',
+        }).encode()
+        report('booking POST: JSONParser', measure(lambda: JSONParser().parse(io.BytesIO(body)), repeat=5000))
+        report('booking POST: FastJSONParser', measure(lambda: FastJSONParser().parse(io.BytesIO(body)), repeat=5000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare per-request JWT authentication with and without the token user cache.
+
+    python -m benchmarks.jwt_auth [users]
+
+``users`` accounts exist so the ``auth_user`` lookup is not a one-row table
+scan. Measures ``authenticate()`` alone and the whole booking detail view.
+"""
+import sys
+from datetime import timedelta
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from restaurant import views
+from restaurant.authentication import CachedJWTAuthentication, token_user_cache
+from restaurant.models import Booking
+from restaurant.serializers import TokenObtainPairSerializer
+
+
+def queries(func):
+    with CaptureQueriesContext(connection) as context:
+        func()
+    return len(context.captured_queries)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with test_database():
+        password = make_password('bench-password')
+        User.objects.bulk_create(User(username=f'user{i}', password=password) for i in range(count))
+        user = User.objects.get(username=f'user{count // 2}')
+        booking = Booking.objects.create(
+            customer_name='Bench', customer_email='bench@example.com', no_of_guests=2,
+            booking_date=timezone.now() + timedelta(days=1), user=user,
+        )
+        token = TokenObtainPairSerializer.get_token(user).access_token
+        factory = APIRequestFactory()
+        header = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        print(f'{count} users')
+
+        def authenticate(backend):
+            return lambda: backend.authenticate(Request(factory.get('/', **header)))
+
+        stock = JWTAuthentication()
+        cached = CachedJWTAuthentication()
+
+        def cold():
+            token_user_cache.clear()
+            cached.authenticate(Request(factory.get('/', **header)))
+
+        for label, func in [
+            ('authenticate: JWTAuthentication', authenticate(stock)),
+            ('authenticate: cached, first request', cold),
+            ('authenticate: cached', authenticate(cached)),
+        ]:
+            report(f'{label} ({queries(func)} queries)', measure(func, repeat=2000))
+
+        view = views.BookingDetailView.as_view()
+
+        def detail(classes):
+            def request():
+                views.BookingDetailView.authentication_classes = classes
+                response = view(factory.get(f'/restaurant/booking/{booking.pk}/', **header), pk=booking.pk)
+                response.render()
+            return request
+
+        for label, classes in [
+            ('booking detail: JWTAuthentication', [JWTAuthentication]),
+            ('booking detail: cached', [CachedJWTAuthentication]),
+        ]:
+            func = detail(classes)
+            report(f'{label} ({queries(func)} queries)', measure(func, repeat=1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,464 @@
+"""
+Load test every endpoint of ``restaurant/urls.py`` and the JWT token
+endpoints, and compare the results with a saved baseline.
+
+    python -m benchmarks.load_test [--concurrency 8] [--requests 200] [--output run.json] [--baseline base.json]
+
+By default requests go in-process through Django's ``WSGIHandler``, against
+a throwaway database filled by ``manage.py generate_data``'s generator
+(``--menu-items``, ``--users``, ``--bookings``, ``--seed``). With ``--url``
+they go over HTTP to a running server (``runserver``, gunicorn, uvicorn) and
+its data; ``--username`` and ``--password`` name the staff account used for
+the authenticated endpoints, which are skipped without one.
+
+Each endpoint gets ``--requests`` requests from ``--concurrency`` clients
+sending back to back. Reported per endpoint: throughput, mean, p50, p95 and
+p99 latency, non-2xx responses and database queries per request, taken from
+the ``db_queries_per_request`` histogram of ``/metrics`` before and after
+(over HTTP, scraped with the ``METRICS_TOKEN`` environment variable).
+Streaming exports run their queries after the metrics middleware has
+counted them, so they report none.
+
+``--output`` saves the results as JSON. ``--baseline`` compares them with
+saved results, and the exit status is 1 if an endpoint regressed by more
+than ``--threshold``: p95 latency up, throughput down, or more queries or
+errors per run. ``--diff OLD NEW`` compares two saved runs.
+
+Unless ``--read-only``, write endpoints are loaded too: they add menu items
+and bookings, on random days decades ahead so repeated runs don't collide.
+"""
+import argparse
+import http.client
+import io
+import itertools
+import json
+import os
+import random
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from urllib.parse import quote, urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.common import test_database
+
+import django
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import resolve
+from django.utils import timezone
+
+from restaurant.availability import booking_duration, restaurant_tables
+from restaurant.datagen import generate
+from restaurant.metrics import registry, render
+
+WARMUP = 10
+# In-process clients share the GIL with the server, so runs vary by 10-30%
+DEFAULT_THRESHOLD = 0.25
+QUERY_SAMPLE = re.compile(r'^db_queries_per_request_(sum|count)\{route="((?:[^"\\]|\\.)*)"\} (\S+)$', re.M)
+
+
+# Transports
+
+class InProcess:
+    """Requests through ``WSGIHandler``, without a server or sockets."""
+    target = 'in-process'
+
+    def __init__(self):
+        self.handler = WSGIHandler()
+
+    def request(self, method, path, body=b'', content_type=None, token=None):
+        path_info, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path_info, 'QUERY_STRING': query,
+            'SERVER_NAME': 'testserver', 'wsgi.input': io.BytesIO(body), 'CONTENT_LENGTH': str(len(body)),
+        }
+        if content_type:
+            environ['CONTENT_TYPE'] = content_type
+        if token:
+            environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        setup_testing_defaults(environ)
+        statuses = []
+        response = self.handler(environ, lambda status, headers, exc_info=None: statuses.append(int(status[:3])))
+        try:
+            content = b''.join(response)
+        finally:
+            response.close()
+        return statuses[0], content
+
+    def metrics(self):
+        return render(registry.collect())
+
+
+class HTTP:
+    """Requests to a running server, one keep-alive connection per client thread."""
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.target = url
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def request(self, method, path, body=b'', content_type=None, token=None):
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        for attempt in range(2):
+            connection = getattr(self.local, 'connection', None)
+            if connection is None:
+                connection = self.local.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                connection.request(method, self.prefix + path, body=body or None, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (http.client.HTTPException, OSError):
+                # The server closed an idle keep-alive connection: reconnect once
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+                continue
+            if response.will_close:
+                connection.close()
+                self.local.connection = None
+            return response.status, content
+
+    def metrics(self):
+        status, content = self.request('GET', '/metrics', token=os.environ.get('METRICS_TOKEN'))
+        return content.decode() if status == 200 else None
+
+
+# Endpoints
+
+class Endpoint:
+    def __init__(self, name, method, path, body=b'', content_type=None, auth=False, write=False, max_requests=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        # bytes, or a callable returning a fresh body for every request
+        self.body = body
+        self.content_type = content_type
+        self.auth = auth
+        self.write = write
+        self.max_requests = max_requests
+        self.route = resolve(path.partition('?')[0]).view_name
+
+
+def as_json(data):
+    return json.dumps(data).encode()
+
+
+def booking_slots():
+    """
+    Return a function giving a new ``(table, booking_date)`` for a 2-guest
+    booking on every call, from any thread, decades ahead on a random day.
+    """
+    tables = [table for table, seats in sorted(restaurant_tables().items()) if seats >= 2]
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+    start += timedelta(days=random.randrange(3650, 36500))
+    numbers = itertools.count()
+
+    def slot():
+        turn, index = divmod(next(numbers), len(tables))
+        return tables[index], start + turn * booking_duration()
+    return slot
+
+
+def discover(transport, username, password):
+    """Ids, names and tokens the endpoints need, read through the API itself."""
+    context = {'slot': booking_slots(), 'today': timezone.localdate()}
+    status, content = transport.request('GET', '/restaurant/menu/')
+    if status != 200:
+        sys.exit(f'Could not list the menu: {status} {content[:200]!r}')
+    data = json.loads(content)
+    items = data['results'] if isinstance(data, dict) else data
+    if not items:
+        sys.exit('The menu is empty: generate data first (python manage.py generate_data).')
+    context['menu_id'] = items[0]['id']
+    context['category'] = items[0]['category']
+    context['word'] = items[0]['name'].split()[0]
+
+    if username:
+        credentials = {'username': username, 'password': password}
+        status, content = transport.request('POST', '/api/token/', as_json(credentials), 'application/json')
+        if status != 200:
+            sys.exit(f'Could not obtain a token for {username!r}: {status} {content[:200]!r}')
+        context.update(json.loads(content), credentials=credentials)
+        status, content = transport.request('GET', '/restaurant/booking/', token=context['access'])
+        bookings = json.loads(content)['results']
+        if bookings:
+            context['booking_id'] = bookings[0]['id']
+        else:
+            status, content = transport.request(
+                'POST', '/restaurant/booking/', new_booking(context), 'application/json', context['access'],
+            )
+            context['booking_id'] = json.loads(content)['id']
+    return context
+
+
+def new_booking(context, count=None):
+    def booking():
+        table, booking_date = context['slot']()
+        return {
+            'customer_name': 'Load Test', 'customer_email': 'load.test@example.com',
+            'no_of_guests': 2, 'booking_date': booking_date.isoformat(), 'table_number': table,
+        }
+    return as_json(booking() if count is None else [booking() for _ in range(count)])
+
+
+def endpoints(context):
+    today = context['today']
+    menu_names = itertools.count()
+    imported = '\n'.join(
+        json.dumps({'name': f'Load Test Import {i}', 'price': '9.99', 'category': 'Load Test'}) for i in range(5)
+    ).encode()
+    run = random.randrange(10 ** 9)
+    return [
+        Endpoint('api overview', 'GET', '/restaurant/'),
+        Endpoint('menu list', 'GET', '/restaurant/menu/?page=2'),
+        Endpoint('menu detail', 'GET', f"/restaurant/menu/{context['menu_id']}/"),
+        Endpoint('featured', 'GET', '/restaurant/menu/featured/'),
+        Endpoint('categories', 'GET', '/restaurant/menu/categories/'),
+        Endpoint('by category', 'GET', f"/restaurant/menu/category/{quote(context['category'])}/"),
+        Endpoint('search', 'GET', f"/restaurant/menu/search/?q={quote(context['word'])}"),
+        Endpoint('snapshot', 'GET', '/restaurant/menu/snapshot/'),
+        Endpoint('availability', 'GET', f'/restaurant/availability/?date={today}&guests=2'),
+        Endpoint('menu export', 'GET', '/restaurant/menu/export/csv/', auth=True),
+        Endpoint('booking list', 'GET', '/restaurant/booking/', auth=True),
+        Endpoint('booking detail', 'GET', f"/restaurant/booking/{context.get('booking_id', 0)}/", auth=True),
+        Endpoint(
+            'booking export', 'GET', f'/restaurant/booking/export/csv/?start={today}&end={today + timedelta(days=6)}',
+            auth=True,
+        ),
+        Endpoint('profile', 'GET', '/restaurant/profile/', auth=True),
+        Endpoint('occupancy report', 'GET', f'/restaurant/reports/occupancy/?start={today:%Y-%m}&end={today:%Y-%m}',
+                 auth=True),
+        Endpoint('replica health', 'GET', '/restaurant/health/replicas/'),
+        # Password hashing takes about half a second per request by design
+        Endpoint(
+            'token obtain', 'POST', '/api/token/', as_json(context.get('credentials')), 'application/json', auth=True,
+            max_requests=20,
+        ),
+        Endpoint(
+            'token refresh', 'POST', '/api/token/refresh/', as_json({'refresh': context.get('refresh')}),
+            'application/json', auth=True,
+        ),
+        Endpoint(
+            'menu create', 'POST', '/restaurant/menu/',
+            lambda: as_json({'name': f'Load Test {run}-{next(menu_names)}', 'price': '9.99', 'category': 'Load Test'}),
+            'application/json', auth=True, write=True,
+        ),
+        Endpoint(
+            'menu import', 'POST', '/restaurant/menu/import/ndjson/', imported, 'application/x-ndjson',
+            auth=True, write=True,
+        ),
+        Endpoint('booking create', 'POST', '/restaurant/booking/', lambda: new_booking(context), 'application/json',
+                 write=True),
+        Endpoint('booking bulk', 'POST', '/restaurant/booking/bulk/', lambda: new_booking(context, 5),
+                 'application/json', auth=True, write=True),
+    ]
+
+
+# Measurement
+
+def query_totals(text):
+    """``{route: [sum, count]}`` of the queries-per-request histogram in a ``/metrics`` page."""
+    totals = {}
+    for kind, route, value in QUERY_SAMPLE.findall(text or ''):
+        totals.setdefault(route.replace('\\"', '"').replace('\\\\', '\\'), [0, 0])[kind == 'count'] = float(value)
+    return totals
+
+
+def queries_per_request(before, after, route):
+    old, new = before.get(route, [0, 0]), after.get(route, [0, 0])
+    count = new[1] - old[1]
+    return round((new[0] - old[0]) / count, 2) if count > 0 else None
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run(transport, endpoint, token, concurrency, total):
+    remaining = itertools.count()
+    samples = []
+    errors = []
+
+    def send():
+        body = endpoint.body() if callable(endpoint.body) else endpoint.body
+        started = time.perf_counter()
+        status, _ = transport.request(endpoint.method, endpoint.path, body, endpoint.content_type, token)
+        samples.append((time.perf_counter() - started) * 1000)
+        if not 200 <= status < 300:
+            errors.append(status)
+
+    def client():
+        while next(remaining) < total:
+            send()
+
+    for _ in range(min(WARMUP, total)):
+        send()
+    samples.clear()
+    errors.clear()
+    before = query_totals(transport.metrics())
+    with ThreadPoolExecutor(concurrency) as clients:
+        started = time.perf_counter()
+        for future in [clients.submit(client) for _ in range(concurrency)]:
+            future.result()
+        elapsed = time.perf_counter() - started
+    after = query_totals(transport.metrics())
+
+    samples.sort()
+    return {
+        'method': endpoint.method,
+        'path': endpoint.path,
+        'route': endpoint.route,
+        'requests': len(samples),
+        'errors': len(errors),
+        'rps': round(len(samples) / elapsed, 1),
+        'mean': round(statistics.fmean(samples), 3),
+        'p50': round(percentile(samples, 0.5), 3),
+        'p95': round(percentile(samples, 0.95), 3),
+        'p99': round(percentile(samples, 0.99), 3),
+        'queries': queries_per_request(before, after, endpoint.route),
+    }
+
+
+def report(name, stats):
+    queries = '-' if stats['queries'] is None else f"{stats['queries']:g}"
+    print(
+        f"{name:<16} {stats['rps']:8.0f} req/s   p50 {stats['p50']:8.2f}   p95 {stats['p95']:8.2f}   "
+        f"p99 {stats['p99']:8.2f} ms   {queries:>5} queries   {stats['errors']} errors"
+    )
+
+
+# Baselines
+
+def change(old, new):
+    return f'{(new - old) / old:+.0%}' if old else 'n/a'
+
+
+def compare(baseline, results, threshold=DEFAULT_THRESHOLD):
+    """Print how every endpoint changed against ``baseline`` and return the names that regressed."""
+    for key in ('target', 'concurrency', 'requests', 'dataset'):
+        if baseline['meta'].get(key) != results['meta'].get(key):
+            print(f"note: {key} differs: {baseline['meta'].get(key)} -> {results['meta'].get(key)}")
+    regressed = []
+    for name, new in results['endpoints'].items():
+        old = baseline['endpoints'].get(name)
+        if old is None:
+            print(f'{name:<16} new')
+            continue
+        problems = []
+        if new['p95'] > old['p95'] * (1 + threshold):
+            problems.append('p95')
+        if new['rps'] < old['rps'] * (1 - threshold):
+            problems.append('throughput')
+        if None not in (old['queries'], new['queries']) and new['queries'] > old['queries'] + 0.05:
+            problems.append('queries')
+        if new['errors'] > old['errors']:
+            problems.append('errors')
+        if problems:
+            regressed.append(name)
+        print(
+            f"{name:<16} req/s {change(old['rps'], new['rps']):>6}   p95 {change(old['p95'], new['p95']):>6}   "
+            f"queries {old['queries']} -> {new['queries']}   "
+            + (f"REGRESSED ({', '.join(problems)})" if problems else 'ok')
+        )
+    return regressed
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+# Main
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', help='Base URL of a running server; in-process when omitted')
+    parser.add_argument('--username', help='Staff account for authenticated endpoints (with --url)')
+    parser.add_argument('--password')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--only', help='Regular expression selecting endpoints by name')
+    parser.add_argument('--read-only', action='store_true', help='Skip endpoints that write')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--menu-items', type=int, default=1000)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--bookings', type=int, default=10000)
+    parser.add_argument('--output', help='Save the results as JSON')
+    parser.add_argument('--baseline', help='Compare with results saved by --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'), help='Compare two saved runs and exit')
+    return parser.parse_args()
+
+
+def load_test(transport, args, dataset):
+    context = discover(transport, args.username, args.password)
+    results = {
+        'meta': {
+            'target': transport.target,
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'dataset': dataset,
+            'started': datetime.now().astimezone().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'django': django.__version__,
+        },
+        'endpoints': {},
+    }
+    print(f'{transport.target}: {args.concurrency} clients, {args.requests} requests per endpoint')
+    for endpoint in endpoints(context):
+        if args.only and not re.search(args.only, endpoint.name):
+            continue
+        if (endpoint.write and args.read_only) or (endpoint.auth and 'access' not in context):
+            continue
+        total = min(args.requests, endpoint.max_requests or args.requests)
+        stats = run(transport, endpoint, context.get('access') if endpoint.auth else None, args.concurrency, total)
+        results['endpoints'][endpoint.name] = stats
+        report(endpoint.name, stats)
+    return results
+
+
+def main():
+    args = parse_args()
+    if args.diff:
+        sys.exit(1 if compare(load(args.diff[0]), load(args.diff[1]), args.threshold) else 0)
+
+    if args.url:
+        results = load_test(HTTP(args.url), args, dataset=None)
+    else:
+        # A file database, so that concurrent writers wait on SQLite's lock
+        # instead of failing on a shared in-memory database's table locks
+        with tempfile.TemporaryDirectory() as directory, test_database(f'{directory}/load_test.sqlite3'):
+            generate(seed=args.seed, menu_items=args.menu_items, users=args.users, bookings=args.bookings,
+                     end=timezone.localdate() + timedelta(days=30))
+            User.objects.create_user(username='load-test', password='load-test-password', is_staff=True)
+            args.username, args.password = 'load-test', 'load-test-password'
+            dataset = {'seed': args.seed, 'menu_items': args.menu_items, 'users': args.users,
+                       'bookings': args.bookings}
+            results = load_test(InProcess(), args, dataset)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+    if args.baseline:
+        print(f'\nCompared with {args.baseline}:')
+        if compare(load(args.baseline), results, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
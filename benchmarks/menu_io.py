@@ -0,0 +1,71 @@
+"""
+Time the streaming menu import and export on a large catalog.
+
+    python -m benchmarks.menu_io [item_count]
+
+Import timings include the menu snapshot rebuild triggered at the end.
+"""
+import json
+import os
+import sys
+import tempfile
+import resource
+import time
+
+from benchmarks.common import test_database
+
+from restaurant.menu_io import export_menu, import_menu, read_rows
+from restaurant.models import Menu
+
+CATEGORIES = ['Appetizers', 'Main Course', 'Pizza', 'Pasta', 'Desserts', 'Drinks']
+
+
+def write_catalog(path, count):
+    with open(path, 'w', encoding='utf-8') as handle:
+        for i in range(count):
+            handle.write(json.dumps({
+                'name': f'Dish {i}',
+                'description': f'House special number {i} with seasonal vegetables',
+                'price': f'{5 + i % 30}.99',
+                'category': CATEGORIES[i % len(CATEGORIES)],
+                'available': i % 10 != 0,
+                'featured': i % 7 == 0,
+            }) + '\n')
+
+
+def timed(label, func, count):
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f'{label:<28} {elapsed:7.2f} s   {count / elapsed:9.0f} rows/s   max RSS so far {peak:6.0f} MiB')
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with test_database(), tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'menu.ndjson')
+        write_catalog(source, count)
+
+        def run_import():
+            with open(source, encoding='utf-8') as handle:
+                return import_menu(read_rows(handle, 'ndjson'))
+
+        timed('import (insert)', run_import, count)
+        timed('import (upsert existing)', run_import, count)
+        assert Menu.objects.count() == count
+
+        for file_format in ('csv', 'ndjson'):
+            target = os.path.join(directory, f'export.{file_format}')
+
+            def run_export():
+                with open(target, 'w', encoding='utf-8') as handle:
+                    for chunk in export_menu(file_format):
+                        handle.write(chunk)
+
+            timed(f'export ({file_format})', run_export, count)
+
+
+if __name__ == '__main__':
+    main()
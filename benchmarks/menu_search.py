@@ -0,0 +1,79 @@
+"""
+Compare menu search through ``LIKE '%term%'`` (the stock admin search) with
+the FTS5 index in ``restaurant.search``.
+
+    python -m benchmarks.menu_search [item_count]
+
+Items get random ingredient lists, so common terms match a large share of
+the catalog and rare ones only a few rows.
+"""
+import random
+import sys
+from decimal import Decimal
+
+from benchmarks.common import measure, report, test_database
+
+from django.db.models import Q
+from rest_framework.test import APIRequestFactory
+
+from restaurant.cache import bump_menu_version
+from restaurant.models import Category, Menu
+from restaurant.search import search_menu
+from restaurant.views import menu_search
+
+CATEGORIES = ['Appetizers', 'Main Course', 'Pizza', 'Pasta', 'Desserts', 'Drinks']
+INGREDIENTS = [
+    'basil', 'feta', 'tomato', 'garlic', 'olive', 'lemon', 'oregano', 'mozzarella', 'parmesan', 'spinach',
+    'mushroom', 'chickpea', 'lamb', 'chicken', 'salmon', 'shrimp', 'pistachio', 'honey', 'yogurt', 'mint',
+    'cucumber', 'eggplant', 'zucchini', 'pepper', 'onion', 'caper', 'anchovy', 'saffron', 'thyme', 'walnut',
+]
+RARE = ['sumac', 'halloumi', 'pomegranate', 'tahini']
+
+
+def populate(count, seed=0):
+    rng = random.Random(seed)
+    categories = Category.objects.for_names(CATEGORIES)
+    items = []
+    for i in range(count):
+        ingredients = rng.sample(INGREDIENTS, 5)
+        if i % 1000 == 0:
+            ingredients.append(RARE[i // 1000 % len(RARE)])
+        items.append(Menu(
+            name=f'{ingredients[0].title()} special {i}',
+            description=f"Made with {', '.join(ingredients[1:])}, served with bread",
+            price=Decimal(5 + i % 30) + Decimal('0.99'),
+            category=categories[CATEGORIES[i % len(CATEGORIES)]],
+        ))
+    Menu.objects.bulk_create(items, batch_size=2000)
+
+
+def like_search(term):
+    query = Q(name__icontains=term) | Q(description__icontains=term) | Q(category__name__icontains=term)
+    return list(Menu.objects.filter(query).values_list('pk', flat=True)[:20])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with test_database():
+        populate(count)
+        print(f'{count} menu items')
+        view = menu_search
+        factory = APIRequestFactory()
+
+        def endpoint(term):
+            def request():
+                # Skip the response cache, it would only measure a cache hit
+                bump_menu_version()
+                view(factory.get('/restaurant/menu/search/', {'q': term})).render()
+            return request
+
+        for term in ['basil', 'sumac', 'moz', 'feta lemon']:
+            report(f'{term!r}: LIKE', measure(lambda: like_search(term), repeat=20))
+            report(f'{term!r}: FTS5', measure(lambda: search_menu(term), repeat=200))
+            report(f'{term!r}: endpoint', measure(endpoint(term), repeat=200))
+            report(f'{term!r}: endpoint, cached', measure(
+                lambda: view(factory.get('/restaurant/menu/search/', {'q': term})).render()))
+
+
+if __name__ == '__main__':
+    main()
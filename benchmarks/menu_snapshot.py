@@ -0,0 +1,61 @@
+"""
+Compare serving the menu through the ORM + MenuSerializer with serving it
+from the pre-serialized snapshot.
+
+    python -m benchmarks.menu_snapshot [item_count]
+"""
+import sys
+from decimal import Decimal
+
+from benchmarks.common import measure, report, test_database
+
+from restaurant.models import Category, Menu
+from restaurant.serializers import MenuSerializer
+from restaurant.snapshot import get_menu_snapshot, rebuild_menu_snapshot
+
+CATEGORIES = ['Appetizers', 'Main Course', 'Pizza', 'Pasta', 'Desserts', 'Drinks']
+
+
+def populate(count):
+    categories = Category.objects.for_names(CATEGORIES)
+    Menu.objects.bulk_create(
+        Menu(
+            name=f'Dish {i}',
+            description=f'House special number {i} with seasonal vegetables',
+            price=Decimal(5 + i % 30) + Decimal('0.99'),
+            category=categories[CATEGORIES[i % len(CATEGORIES)]],
+            available=i % 10 != 0,
+            featured=i % 7 == 0,
+        )
+        for i in range(count)
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    with test_database():
+        populate(count)
+        rebuild_menu_snapshot()
+        print(f'{count} menu items')
+
+        menu = MenuSerializer.setup_eager_loading(Menu.objects.all())
+        report('full menu: ORM + serializer', measure(
+            lambda: MenuSerializer(menu.all(), many=True).data))
+        report('full menu: snapshot', measure(
+            lambda: get_menu_snapshot().items))
+
+        report('featured: ORM + serializer', measure(
+            lambda: MenuSerializer(menu.filter(featured=True, available=True), many=True).data))
+        report('featured: snapshot', measure(
+            lambda: get_menu_snapshot().featured))
+
+        report('category: ORM + serializer', measure(
+            lambda: MenuSerializer(menu.filter(category__slug='pizza', available=True), many=True).data))
+        report('category: snapshot', measure(
+            lambda: get_menu_snapshot().category_items('pizza')))
+
+        report('snapshot rebuild', measure(rebuild_menu_snapshot, repeat=20))
+
+
+if __name__ == '__main__':
+    main()
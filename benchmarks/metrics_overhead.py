@@ -0,0 +1,81 @@
+"""
+Per-request cost of the request metrics.
+
+    python -m benchmarks.metrics_overhead
+
+* middleware: ``metrics_middleware`` around a view that returns a ready
+  response, against calling the view directly;
+* per query: a ``SELECT 1`` with and without the ``record_query`` wrapper
+  counting it for a request;
+* per serializer: a one-field serializer's ``.data`` with and without
+  ``TimedDataMixin``.
+
+The budget is 50 µs per request.
+"""
+from benchmarks.common import measure, test_database
+
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.urls import resolve
+from rest_framework import serializers
+
+from restaurant.metrics import RequestMetrics, current_request, record_query, registry
+from restaurant.middleware import metrics_middleware
+from restaurant.models import Category, Menu
+from restaurant.serializers import TimedDataMixin
+
+REPEAT = 20000
+
+
+class PlainSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+
+
+class TimedSerializer(TimedDataMixin, PlainSerializer):
+    pass
+
+
+def report(label, baseline, measured):
+    overhead = (measured['mean'] - baseline['mean']) * 1000
+    print(f"{label:<28} {baseline['mean'] * 1000:8.2f} µs -> {measured['mean'] * 1000:8.2f} µs   "
+          f"overhead {overhead:6.2f} µs")
+
+
+def main():
+    with test_database():
+        item = Menu.objects.create(name='Margherita', price=9, category=Category.objects.for_name('Pizza'))
+        request = RequestFactory().get(f'/restaurant/menu/{item.pk}/')
+        request.resolver_match = resolve(request.path)
+        response = HttpResponse(b'{"id": 1}', content_type='application/json')
+        response['Content-Length'] = '9'
+
+        def view(request):
+            return response
+
+        middleware = metrics_middleware(view)
+        report('middleware', measure(lambda: view(request), repeat=REPEAT),
+               measure(lambda: middleware(request), repeat=REPEAT))
+        registry.reset()
+
+        cursor = connection.cursor()
+        wrappers = connection.execute_wrappers
+        assert record_query in wrappers
+
+        def query():
+            cursor.execute('SELECT 1')
+
+        connection.execute_wrappers = []
+        baseline = measure(query, repeat=REPEAT)
+        connection.execute_wrappers = wrappers
+        token = current_request.set(RequestMetrics())
+        try:
+            report('per query', baseline, measure(query, repeat=REPEAT))
+            report('per serializer', measure(lambda: PlainSerializer({'id': 1}).data, repeat=REPEAT),
+                   measure(lambda: TimedSerializer({'id': 1}).data, repeat=REPEAT))
+        finally:
+            current_request.reset(token)
+
+
+if __name__ == '__main__':
+    main()
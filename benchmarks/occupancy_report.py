@@ -0,0 +1,46 @@
+"""
+Time the staff occupancy report (``restaurant.occupancy``), which reads the
+rollups, against the same covers per day and hour aggregated over the
+bookings, as the booking count grows.
+
+    python -m benchmarks.occupancy_report [rows ...]
+"""
+import sys
+from datetime import timedelta
+
+from benchmarks.common import measure, report, test_database
+
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractHour, TruncDate
+from django.utils import timezone
+
+from benchmarks.booking_pagination import populate
+from restaurant.models import Booking, OccupancyRollup
+from restaurant.occupancy import occupancy_report, rebuild_rollups
+
+
+def aggregate_bookings(start, end):
+    return list(
+        Booking.objects.filter(booking_date__date__gte=start, booking_date__date__lte=end)
+        .annotate(day=TruncDate('booking_date'), hour=ExtractHour('booking_date'))
+        .values('day', 'hour')
+        .annotate(bookings=Count('id'), covers=Sum('no_of_guests'))
+        .order_by('day', 'hour')
+    )
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    start = timezone.localdate() + timedelta(days=1)
+    end = start + timedelta(days=29)
+    for rows in sizes:
+        with test_database():
+            populate(rows)
+            rebuild_rollups()
+            print(f'{rows} bookings, {OccupancyRollup.objects.count()} rollup rows, report over {start} to {end}')
+            report('aggregate over bookings', measure(lambda: aggregate_bookings(start, end), repeat=20, warmup=2))
+            report('occupancy report (rollups)', measure(lambda: occupancy_report(start, end), repeat=20, warmup=2))
+
+
+if __name__ == '__main__':
+    main()
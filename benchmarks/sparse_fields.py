@@ -0,0 +1,49 @@
+"""
+Payload size and latency of the list endpoints with and without sparse
+fieldsets (``?fields=``/``?omit=``, see ``restaurant.sparse``), through the
+whole request cycle.
+
+    python -m benchmarks.sparse_fields [rows]
+"""
+import itertools
+import sys
+
+from benchmarks.common import measure, report, test_database
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from benchmarks.booking_pagination import populate as populate_bookings
+from benchmarks.menu_snapshot import populate as populate_menu
+from restaurant.models import Booking
+
+CASES = [
+    ('menu list', '/restaurant/menu/', {}),
+    ('menu list, menu card fields', '/restaurant/menu/', {'fields': 'id,name,price,category'}),
+    ('booking list', '/restaurant/booking/', {}),
+    ('booking list, omit user', '/restaurant/booking/', {'omit': 'user'}),
+    ('booking list, 4 fields', '/restaurant/booking/', {'fields': 'id,booking_date,table_number,no_of_guests'}),
+]
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    with test_database():
+        populate_menu(rows)
+        populate_bookings(rows)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        Booking.objects.update(user=staff)
+        client = APIClient()
+        client.force_authenticate(staff)
+        print(f'{rows} rows per model')
+
+        for label, url, params in CASES:
+            size = len(client.get(url, params).content)
+            # A new query string every time misses the menu list cache
+            counter = itertools.count()
+            report(label, measure(lambda: client.get(url, {**params, 'run': next(counter)}), repeat=100))
+            print(f'{"":<40} {size} bytes per page')
+
+
+if __name__ == '__main__':
+    main()
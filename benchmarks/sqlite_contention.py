@@ -0,0 +1,95 @@
+"""
+Booking inserts from several processes against one SQLite file, with the
+stock SQLite settings and with the tuned profile from ``settings.DATABASES``.
+
+    python -m benchmarks.sqlite_contention [processes] [bookings_per_process]
+
+Every process posts bookings to ``BookingListCreateView`` back to back, like
+one worker of a multi-process server, and closes its connection after each
+request the way Django does at the end of a request.
+"""
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+import benchmarks.common  # noqa: F401  (sets up Django)
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import OperationalError, close_old_connections, connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+STOCK = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}
+TUNED = {
+    key: settings.DATABASES['default'][key]
+    for key in ('OPTIONS', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')
+}
+
+
+def use_database(name, profile):
+    """Point the default connection at ``name`` before it first connects."""
+    connection.close()
+    connection.settings_dict.update(profile, NAME=name)
+
+
+def worker(name, profile, index, count, start):
+    use_database(name, profile)
+    from restaurant.views import BookingListCreateView
+
+    view = BookingListCreateView.as_view()
+    factory = APIRequestFactory()
+    created = locked = 0
+    for i in range(count):
+        request = factory.post('/restaurant/booking/', {
+            'customer_name': f'Guest {index}-{i}',
+            'customer_email': f'guest{index}-{i}@example.com',
+            'no_of_guests': 2,
+            'booking_date': (start + timedelta(hours=3 * i)).isoformat(),
+            'table_number': index % 10 + 1,
+        }, format='json')
+        try:
+            response = view(request)
+            created += response.status_code == 201
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+        close_old_connections()
+    connection.close()
+    return created, locked
+
+
+def run(label, profile, processes, count):
+    with tempfile.TemporaryDirectory() as directory:
+        name = os.path.join(directory, 'bench.sqlite3')
+        use_database(name, profile)
+        call_command('migrate', verbosity=0)
+        connection.close()
+
+        # Each process gets its own table and day range, so no booking conflicts
+        start = timezone.now() + timedelta(days=1)
+        jobs = [(name, profile, index, count, start + timedelta(days=365 * (index // 10))) for index in range(processes)]
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            started = time.perf_counter()
+            results = pool.starmap(worker, jobs)
+            elapsed = time.perf_counter() - started
+
+    created = sum(result[0] for result in results)
+    locked = sum(result[1] for result in results)
+    print(f'{label:<12} {created / elapsed:8.0f} bookings/s   {created} created   {locked} "database is locked"')
+
+
+def main():
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f'{processes} processes x {count} bookings')
+    run('stock', STOCK, processes, count)
+    run('tuned', TUNED, processes, count)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,10 @@ ASGI config for littlelemon project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+With ``settings.ASGI_URLCONF = 'littlelemon.urls_asgi'``, requests served
+from here route the hot read endpoints to the async views in
+``restaurant.async_views``.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
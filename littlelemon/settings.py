@@ -44,6 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'restaurant.middleware.metrics_middleware',
+    'restaurant.middleware.compression_middleware',
+    'restaurant.middleware.asgi_urlconf_middleware',
+    'restaurant.middleware.replica_middleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -56,6 +60,13 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'littlelemon.urls'
 
+# Set to 'littlelemon.urls_asgi' to serve the hot read endpoints from async
+# views under ASGI (see restaurant.middleware). Off by default: Django runs
+# each of its own middleware in a worker thread for an async view, which
+# costs more than the async views save unless clients are slow to read
+# (compare with benchmarks.asgi_vs_wsgi).
+ASGI_URLCONF = None
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -77,13 +88,89 @@ WSGI_APPLICATION = 'littlelemon.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent requests: WAL lets readers run alongside the
+# writer, writers wait for the lock (busy_timeout) instead of failing, and
+# transactions take the write lock up front (BEGIN IMMEDIATE) so a
+# transaction that reads before it writes can't deadlock with another one.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas (see restaurant.replicas): GET requests to the API read from
+# one of DATABASE_REPLICAS, clients that just wrote stay on the primary for
+# REPLICA_PIN_SECONDS, and the replica health endpoint fails once one is more
+# than REPLICA_MAX_LAG seconds behind. SQLITE_REPLICAS=n adds n file copies of
+# db.sqlite3, kept fresh by `manage.py refresh_replicas --interval 5`.
+import os
+
+SQLITE_REPLICAS = int(os.environ.get('SQLITE_REPLICAS', 0))
+for n in range(1, SQLITE_REPLICAS + 1):
+    DATABASES[f'replica{n}'] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'replica{n}.sqlite3',
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'transaction_mode': 'DEFERRED'},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['restaurant.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = 15
+REPLICA_MAX_LAG = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point this at Redis/Memcached when running
+# several workers so menu invalidations reach all of them.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'littlelemon',
+    }
+}
+
+# Cached menu payloads are invalidated on every Menu save/delete, the timeout
+# only bounds how long unused entries linger.
+MENU_CACHE_ALIAS = 'default'
+MENU_CACHE_TIMEOUT = 60 * 60
+
+# gzip for clients that accept it (see restaurant.compression); compressed
+# menu payloads are cached alongside the payloads themselves.
+RESPONSE_COMPRESSION_LEVEL = 6
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+
+
+# Request metrics, served at /metrics (see restaurant.metrics). With several
+# worker processes, point METRICS_MULTIPROC_DIR (or the
+# PROMETHEUS_MULTIPROC_DIR environment variable) at a directory shared by the
+# workers and emptied on deploy, so every worker reports the server's totals.
+METRICS_MULTIPROC_DIR = None  # falls back to $PROMETHEUS_MULTIPROC_DIR
+METRICS_FLUSH_INTERVAL = 5  # seconds
+# Besides staff users, /metrics is served to these addresses or networks
+# (e.g. '10.0.0.0/8'; behind a proxy every client has the proxy's address)
+# and to scrapers sending METRICS_TOKEN as a bearer token.
+METRICS_ALLOWED_IPS = []
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,7 +216,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'restaurant.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -137,6 +224,16 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # orjson-backed when orjson is installed, DRF's JSON classes otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'restaurant.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'restaurant.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # JWT Configuration
@@ -146,8 +243,29 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'restaurant.serializers.TokenObtainPairSerializer',
 }
 
+# Access tokens whose user is kept in memory by CachedJWTAuthentication,
+# per process
+JWT_AUTH_CACHE_SIZE = 4096
+# How long a process trusts its last look at a user's UserChange row: changes
+# made through another worker apply to cached users and claims within this
+JWT_AUTH_RECHECK_INTERVAL = 5  # seconds
+
+# Dining room layout used by the table availability engine
+# {table_number: seats}
+from datetime import time
+
+RESTAURANT_TABLES = {1: 2, 2: 2, 3: 4, 4: 4, 5: 4, 6: 4, 7: 6, 8: 6, 9: 8, 10: 10}
+RESTAURANT_OPENING_HOURS = (time(11, 0), time(23, 0))
+BOOKING_DURATION = timedelta(hours=2)
+BOOKING_SLOT_INTERVAL = timedelta(minutes=30)
+BOOKING_BULK_MAX_OPERATIONS = 500
+# Bookings that started longer ago move to BookingArchive (manage.py archive_bookings)
+BOOKING_ARCHIVE_AFTER = timedelta(days=90)
+BOOKING_ARCHIVE_BATCH_SIZE = 1000
+
 # CORS Configuration for Frontend Integration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React default
@@ -0,0 +1,15 @@
+"""
+URL configuration for requests served through the ASGI entry point, when
+``settings.ASGI_URLCONF`` points here.
+
+The hot read endpoints resolve to the async views in
+``restaurant.async_views``; everything else falls through to
+``littlelemon.urls``.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('restaurant/', include('restaurant.urls_async')),
+] + sync_urlpatterns
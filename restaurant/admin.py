@@ -1,14 +1,28 @@
+from django import forms
 from django.contrib import admin
-from .models import Menu, Booking
+from django.db import connection, transaction
+from .inventory import SlotUnavailable, move_reservation
+from .models import Category, Menu, Booking, BookingArchive
+from .search import match_expression, matching_ids, search_supported
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'sort_order']
+    list_editable = ['sort_order']
+    search_fields = ['name']
+    prepopulated_fields = {'slug': ('name',)}
+    ordering = ['sort_order', 'name']
 
 
 @admin.register(Menu)
 class MenuAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'price', 'available', 'featured', 'created_at']
+    list_select_related = ['category']
     list_filter = ['category', 'available', 'featured', 'created_at']
-    search_fields = ['name', 'description', 'category']
+    search_fields = ['name', 'description', 'category__name']
     list_editable = ['available', 'featured', 'price']
-    ordering = ['category', 'name']
+    ordering = ['category__name', 'name']
     readonly_fields = ['created_at', 'updated_at']
 
     fieldsets = (
@@ -27,10 +41,50 @@ class MenuAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_search_results(self, request, queryset, search_term):
+        # Search the FTS index instead of LIKE '%term%' scans of every row
+        if not search_supported(connection) or not match_expression(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(pk__in=matching_ids(search_term)), False
+
+
+class _DryRun(Exception):
+    pass
+
+
+class BookingAdminForm(forms.ModelForm):
+    class Meta:
+        model = Booking
+        fields = '__all__'
+
+    def clean(self):
+        """
+        Reject a booking its slots have no room for, instead of failing in
+        ``Booking.save``: the reservation is tried and rolled back. The admin
+        validates and saves in one transaction, so it still fits then.
+        """
+        cleaned_data = super().clean()
+        wanted = tuple(cleaned_data.get(name) for name in ('booking_date', 'table_number', 'no_of_guests'))
+        if wanted[0] is None or wanted[2] is None:
+            return cleaned_data
+        # The instance gets the form's values after clean()
+        held = None if self.instance._state.adding else self.instance.reservation()
+        try:
+            with transaction.atomic():
+                move_reservation(held, wanted)
+                raise _DryRun
+        except _DryRun:
+            pass
+        except SlotUnavailable as exc:
+            self.add_error('table_number' if wanted[1] is not None else 'booking_date', str(exc))
+        return cleaned_data
+
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
+    form = BookingAdminForm
     list_display = ['customer_name', 'customer_email', 'no_of_guests', 'booking_date', 'table_number', 'user', 'created_at']
+    list_select_related = ['user']
     list_filter = ['booking_date', 'no_of_guests', 'table_number', 'created_at']
     search_fields = ['customer_name', 'customer_email', 'customer_phone']
     date_hierarchy = 'booking_date'
@@ -58,3 +112,26 @@ class BookingAdmin(admin.ModelAdmin):
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
+
+
+@admin.register(BookingArchive)
+class BookingArchiveAdmin(admin.ModelAdmin):
+    """Past bookings moved out of ``Booking``; read-only history."""
+    list_display = ['customer_name', 'customer_email', 'no_of_guests', 'booking_date', 'table_number', 'user', 'archived_at']
+    list_select_related = ['user']
+    list_filter = ['booking_date', 'table_number']
+    search_fields = ['customer_name', 'customer_email', 'customer_phone']
+    date_hierarchy = 'booking_date'
+    ordering = ['booking_date']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
@@ -0,0 +1,108 @@
+"""
+Archival of past bookings.
+
+Almost all traffic concerns the coming weeks, yet ``Booking`` kept every
+reservation forever, so the staff list, the admin's ``date_hierarchy`` and
+the indexes behind the availability checks grew with history.
+``archive_bookings`` moves bookings that started more than
+``BOOKING_ARCHIVE_AFTER`` ago into ``BookingArchive``, keeping their ids.
+
+It works in batches of ``BOOKING_ARCHIVE_BATCH_SIZE``: each batch is copied
+with one ``INSERT ... SELECT`` and deleted in its own short transaction, so
+bookings written meanwhile wait for one batch at most. Run it periodically,
+e.g. ``manage.py archive_bookings`` from cron.
+
+The copy bypasses the ``Booking`` signals: archived bookings are long over,
+so neither the availability index nor the slot inventory hold them any more,
+and the inventory rows of archived days are deleted instead.
+
+Archived bookings are read-only history. Reads over a date range add them
+only when the range reaches back to the newest archived booking, see
+``reaches_archive``.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .availability import booking_duration
+from .models import Booking, BookingArchive, SlotInventory
+
+DEFAULT_ARCHIVE_AFTER = timedelta(days=90)
+DEFAULT_BATCH_SIZE = 1000
+
+
+def archive_after():
+    return getattr(settings, 'BOOKING_ARCHIVE_AFTER', DEFAULT_ARCHIVE_AFTER)
+
+
+def archive_batch_size():
+    return getattr(settings, 'BOOKING_ARCHIVE_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+
+def _statements(connection):
+    """``INSERT ... SELECT`` and ``DELETE`` of a batch, with ``{}`` for the id placeholders."""
+    qn = connection.ops.quote_name
+    booking, archive = qn(Booking._meta.db_table), qn(BookingArchive._meta.db_table)
+    columns = ', '.join(qn(field.column) for field in Booking._meta.concrete_fields)
+    return (
+        f'INSERT INTO {archive} ({columns}, {qn("archived_at")}) '
+        f'SELECT {columns}, %s FROM {booking} WHERE {qn("id")} IN ({{}})',
+        f'DELETE FROM {booking} WHERE {qn("id")} IN ({{}})',
+    )
+
+
+def archive_bookings(before=None, batch_size=None, pause=0, using='default', progress=None):
+    """
+    Move the bookings that started before ``before`` (default:
+    ``BOOKING_ARCHIVE_AFTER`` ago) into ``BookingArchive``, oldest first,
+    sleeping ``pause`` seconds between batches to let other writers in.
+    Bookings that aren't over yet are never archived.
+
+    Returns the number of bookings archived; ``progress(archived)`` is called
+    after every batch.
+    """
+    now = timezone.now()
+    before = min(before or now - archive_after(), now - booking_duration())
+    batch_size = batch_size or archive_batch_size()
+    connection = connections[using]
+    insert, delete = _statements(connection)
+    archived_at = connection.ops.adapt_datetimefield_value(now)
+    pending = (
+        Booking.objects.using(using)
+        .filter(booking_date__lt=before)
+        .order_by('booking_date', 'id')
+        .values_list('id', flat=True)
+    )
+
+    archived = 0
+    while True:
+        with transaction.atomic(using=using):
+            ids = list(pending[:batch_size])
+            if ids:
+                placeholders = ', '.join(['%s'] * len(ids))
+                with connection.cursor() as cursor:
+                    cursor.execute(insert.format(placeholders), [archived_at, *ids])
+                    cursor.execute(delete.format(placeholders), ids)
+        archived += len(ids)
+        if progress is not None and ids:
+            progress(archived)
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause)
+
+    SlotInventory.objects.using(using).filter(slot__lt=before).delete()
+    return archived
+
+
+def reaches_archive(start, using='default'):
+    """Whether bookings from ``start`` on may include archived ones."""
+    newest = (
+        BookingArchive.objects.using(using)
+        .order_by('-booking_date')
+        .values_list('booking_date', flat=True)
+        .first()
+    )
+    return newest is not None and start <= newest
@@ -0,0 +1,161 @@
+"""
+Async versions of the hot read endpoints, served by the ASGI entry point.
+
+Under ASGI every sync DRF view runs through ``sync_to_async`` in a worker
+thread. These views answer GET/HEAD on the event loop instead: the menu
+endpoints read the in-process snapshot and the response cache, and booking
+detail goes through the async ORM. They return exactly what the DRF views
+return (same JSON renderer, validators and error bodies); any other method is
+handed to the matching DRF view.
+
+They are routed by ``littlelemon.urls_asgi``, which
+``restaurant.middleware.asgi_urlconf_middleware`` selects for ASGI requests.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.text import slugify
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from . import views
+from .authentication import AsyncJWTAuthentication, aauthenticate
+from .cache import acached_menu_data, get_menu_version
+from .compiled import compiled
+from .compression import compress_once
+from .conditional import collection_etag, not_modified_response, object_etag, set_validators
+from .models import Booking
+from .pagination import MenuPagination, canonical_url
+from .renderers import FastJSONRenderer
+from .serializers import BookingSerializer, MenuSerializer
+from .snapshot import aget_menu_snapshot
+from .sparse import FIELDS_PARAM, fields_variant, prune, requested_fields
+
+_renderer = FastJSONRenderer()
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(_renderer.render(data), status=status_code, content_type=_renderer.media_type)
+
+
+async def cached_menu_response(endpoint, variant, build):
+    """``acached_menu_data`` as a response whose gzipped body is cached as well."""
+    version = get_menu_version()
+    data = await acached_menu_data(endpoint, variant, build)
+    return compress_once(json_response(data), version, f'{endpoint}|{variant}')
+
+
+def error_response(exc):
+    """Render an ``APIException`` the way DRF's exception handler does."""
+    if isinstance(exc.detail, (list, dict)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+    response = json_response(data, exc.status_code)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response['WWW-Authenticate'] = AsyncJWTAuthentication().authenticate_header(None)
+    return response
+
+
+def read_only(sync_view):
+    """
+    Serve GET/HEAD with the decorated coroutine and every other method with
+    ``sync_view``, so writes keep DRF's parsing, permissions and CSRF checks.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            try:
+                return await view(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+        return wrapper
+    return decorator
+
+
+# Menu
+
+@read_only(views.MenuListCreateView.as_view())
+async def menu_list(request):
+    snapshot = await aget_menu_snapshot()
+    etag = collection_etag([request.get_full_path()], snapshot.last_modified, snapshot.count)
+    not_modified = not_modified_response(request, etag, None)
+    if not_modified is not None:
+        return not_modified
+
+    fields = requested_fields(request, MenuSerializer)
+    drf_request, paginator = Request(request), MenuPagination()
+    # Other query parameters don't change the page, nor get a cache entry of their own
+    paginator.base_url = canonical_url(request, [
+        *paginator.query_params(drf_request), (FIELDS_PARAM, fields_variant(fields) or None),
+    ])
+
+    async def build():
+        page = paginator.paginate_queryset(snapshot.items, drf_request)
+        return paginator.get_paginated_response(prune(page, fields)).data
+
+    response = await cached_menu_response('menu-list', paginator.base_url, build)
+    set_validators(response, etag, None)
+    return response
+
+
+@read_only(views.featured_menu_items)
+async def featured_menu_items(request):
+    fields = requested_fields(request, MenuSerializer)
+
+    async def build():
+        return prune((await aget_menu_snapshot()).featured, fields)
+
+    return await cached_menu_response('featured-menu', fields_variant(fields), build)
+
+
+@read_only(views.menu_by_category)
+async def menu_by_category(request, category):
+    fields = requested_fields(request, MenuSerializer)
+
+    async def build():
+        return prune((await aget_menu_snapshot()).category_items(category), fields)
+
+    return await cached_menu_response('menu-by-category', f'{slugify(category)}|{fields_variant(fields)}', build)
+
+
+@read_only(views.menu_categories)
+async def menu_categories(request):
+    async def build():
+        return (await aget_menu_snapshot()).categories
+
+    return await cached_menu_response('menu-categories', '', build)
+
+
+# Bookings
+
+@read_only(views.BookingDetailView.as_view())
+async def booking_detail(request, pk):
+    user = await aauthenticate(request)
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+
+    serializer = compiled(BookingSerializer, requested_fields(request, BookingSerializer))
+    # The validators need updated_at and the user, even when the fieldset leaves them out
+    etag_columns = views.BookingDetailView.etag_columns
+    extra = [column for column in ('updated_at', *etag_columns) if column not in serializer.columns]
+    queryset = Booking.objects.all()
+    if not user.is_staff:
+        queryset = queryset.filter(user=user)
+    booking = await serializer.rows(queryset.filter(pk=pk), *extra).afirst()
+    if booking is None:
+        raise exceptions.NotFound('No Booking matches the given query.')
+
+    etag = object_etag(request, booking.updated_at, [getattr(booking, column) for column in etag_columns])
+    not_modified = not_modified_response(request, etag, None)
+    if not_modified is not None:
+        return not_modified
+
+    response = json_response(serializer.serialize_one(booking))
+    set_validators(response, etag, None)
+    return response
@@ -0,0 +1,341 @@
+"""
+JWT authentication without a ``User`` lookup per request.
+
+``CachedJWTAuthentication`` keeps the user resolved for each access token in
+a bounded, per-process LRU whose entries live no longer than the token (and
+never longer than ``ACCESS_TOKEN_LIFETIME``). Tokens issued by
+``/api/token/`` also carry ``is_staff`` and ``claims_at`` claims, so even the
+first request with a token builds its user from the claims instead of
+reading the ``users`` row; the other columns are loaded on first access.
+
+Saving or deleting a ``User`` records the time of the change in the
+``UserChange`` table (see ``restaurant.signals``), which every worker reads
+and nothing evicts. Cached entries and claims older than that are ignored
+and the user is read from the database again. Each process looks a user's
+change up at most every ``JWT_AUTH_RECHECK_INTERVAL`` seconds, so a change
+made through another worker applies within that interval; when the table
+can't be read, nothing issued until then is trusted.
+
+``AsyncJWTAuthentication`` does the same for the async views in
+``restaurant.async_views``, reading the user through the async ORM.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserChange
+from .replicas import use_primary
+
+CLAIM_FIELDS = ('id', 'is_staff', 'is_active')
+
+
+def token_lifetime():
+    return api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+
+def recheck_interval():
+    return getattr(settings, 'JWT_AUTH_RECHECK_INTERVAL', 5)
+
+
+class UserChangeMemo:
+    """Thread-safe LRU of ``user id -> (checked_at, changed_at)`` read from ``UserChange``."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'JWT_AUTH_CACHE_SIZE', 1024)
+
+    def get(self, user_id, now):
+        """``(changed_at,)`` if it was read less than ``recheck_interval()`` ago, else ``None``."""
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= now - recheck_interval():
+                return None
+            self._entries.move_to_end(user_id)
+            return (entry[1],)
+
+    def set(self, user_id, checked_at, changed_at):
+        # Tokens carry the id as a string
+        user_id = str(user_id)
+        with self._lock:
+            self._entries[user_id] = (checked_at, changed_at)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.get_max_size():
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+user_change_memo = UserChangeMemo()
+
+
+def user_changed(user_id):
+    """Stop trusting cached users and claims for ``user_id`` issued until now, in every process."""
+    now = time.time()
+    UserChange.objects.bulk_create(
+        [UserChange(user_id=user_id, changed_at=now)],
+        update_conflicts=True, unique_fields=['user_id'], update_fields=['changed_at'],
+    )
+    user_change_memo.set(user_id, now, now)
+
+
+def _user_change(user_id):
+    return UserChange.objects.filter(user_id=user_id).values_list('changed_at', flat=True)
+
+
+def user_changed_at(user_id):
+    """When ``user_id`` last changed, ``None`` if never; now if that can't be read."""
+    now = time.time()
+    memo = user_change_memo.get(user_id, now)
+    if memo is not None:
+        return memo[0]
+    try:
+        # A replica may not have the change yet
+        with use_primary():
+            changed = _user_change(user_id).first()
+    except DatabaseError:
+        return now
+    user_change_memo.set(user_id, now, changed)
+    return changed
+
+
+async def auser_changed_at(user_id):
+    """``user_changed_at`` through the async ORM."""
+    now = time.time()
+    memo = user_change_memo.get(user_id, now)
+    if memo is not None:
+        return memo[0]
+    try:
+        with use_primary():
+            changed = await _user_change(user_id).afirst()
+    except DatabaseError:
+        return now
+    user_change_memo.set(user_id, now, changed)
+    return changed
+
+
+class TokenUserCache:
+    """Thread-safe LRU of ``raw token -> (expires_at, cached_at, user, validated_token)``."""
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_max_size(self):
+        if self.max_size is not None:
+            return self.max_size
+        return getattr(settings, 'JWT_AUTH_CACHE_SIZE', 1024)
+
+    def _entry(self, raw_token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(raw_token)
+            if entry is None:
+                return None
+            if entry[0] <= now:
+                del self._entries[raw_token]
+                return None
+            self._entries.move_to_end(raw_token)
+        return entry
+
+    def _unless_changed(self, raw_token, entry, changed):
+        _, cached_at, user, validated_token = entry
+        if changed is not None and changed >= cached_at:
+            self.discard(raw_token)
+            return None
+        return user, validated_token
+
+    def get(self, raw_token):
+        entry = self._entry(raw_token)
+        if entry is None:
+            return None
+        return self._unless_changed(raw_token, entry, user_changed_at(entry[2].pk))
+
+    async def aget(self, raw_token):
+        entry = self._entry(raw_token)
+        if entry is None:
+            return None
+        return self._unless_changed(raw_token, entry, await auser_changed_at(entry[2].pk))
+
+    def set(self, raw_token, user, validated_token):
+        now = time.time()
+        expires_at = min(validated_token['exp'], now + token_lifetime())
+        with self._lock:
+            self._entries[raw_token] = (expires_at, now, user, validated_token)
+            self._entries.move_to_end(raw_token)
+            while len(self._entries) > self.get_max_size():
+                self._entries.popitem(last=False)
+
+    def discard(self, raw_token):
+        with self._lock:
+            self._entries.pop(raw_token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_user_cache = TokenUserCache()
+
+
+def _claims(validated_token):
+    """``(user_id, is_staff, claims_at)`` of a token whose claims can stand in for the user, else ``None``."""
+    if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != get_user_model()._meta.pk.attname:
+        return None
+    try:
+        claims = (
+            validated_token[api_settings.USER_ID_CLAIM], validated_token['is_staff'], validated_token['claims_at']
+        )
+    except KeyError:
+        return None
+    if claims[2] <= time.time() - token_lifetime():
+        return None
+    return claims
+
+
+def _claims_user(claims, changed):
+    user_id, is_staff, claims_at = claims
+    if changed is not None and changed >= claims_at:
+        return None
+    # Tokens are only issued to active users; deactivating one records a change
+    return get_user_model().from_db(DEFAULT_DB_ALIAS, CLAIM_FIELDS, [user_id, is_staff, True])
+
+
+def user_from_claims(validated_token):
+    """
+    Build the user from the token's ``is_staff``/``claims_at`` claims, or
+    return ``None`` when the token has none or they may be stale.
+
+    The instance has every column but ``id``, ``is_staff`` and ``is_active``
+    deferred, so it can be used for permission checks, queryset filtering
+    and foreign keys without a query.
+    """
+    claims = _claims(validated_token)
+    if claims is None:
+        return None
+    return _claims_user(claims, user_changed_at(claims[0]))
+
+
+async def auser_from_claims(validated_token):
+    """``user_from_claims`` through the async ORM."""
+    claims = _claims(validated_token)
+    if claims is None:
+        return None
+    return _claims_user(claims, await auser_changed_at(claims[0]))
+
+
+def load_user(user):
+    """
+    ``user`` with the columns a claims-built user left deferred loaded, in one
+    query. Returns a copy: ``user`` is shared by the requests with its token.
+    """
+    deferred = user.get_deferred_fields()
+    if deferred:
+        user = copy.copy(user)
+        user.refresh_from_db(fields=deferred)
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that resolves each token's user once per process."""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = token_user_cache.get(raw_token)
+        if cached is not None:
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user = user_from_claims(validated_token) or self.get_user(validated_token)
+        token_user_cache.set(raw_token, user, validated_token)
+        return user, validated_token
+
+    def get_user(self, validated_token):
+        # Cached with the token, so read where a just deactivated user is seen
+        with use_primary():
+            return super().get_user(validated_token)
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """``CachedJWTAuthentication`` with an async ``aauthenticate``."""
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        cached = await token_user_cache.aget(raw_token)
+        if cached is not None:
+            return cached
+
+        validated_token = self.get_validated_token(raw_token)
+        user = await auser_from_claims(validated_token) or await self.aget_user(validated_token)
+        token_user_cache.set(raw_token, user, validated_token)
+        return user, validated_token
+
+    async def aget_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            with use_primary():
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+async def aauthenticate(request):
+    """
+    Return the user for ``request`` the way the default DRF authentication
+    classes would: a bearer token first, then the session.
+
+    Raises ``AuthenticationFailed``/``InvalidToken`` for a bad token.
+    """
+    result = await AsyncJWTAuthentication().aauthenticate(request)
+    if result is not None:
+        return result[0]
+    return await request.auser()
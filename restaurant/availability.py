@@ -0,0 +1,293 @@
+"""
+In-memory interval index of table bookings.
+
+Every booking occupies its table from ``booking_date`` for ``BOOKING_DURATION``,
+rounded out to whole ``BOOKING_SLOT_INTERVAL`` slots as in the slot inventory
+(``restaurant.inventory``): two bookings of a table conflict when they share
+a slot. The index keeps, per table, the sorted start times of the bookings that are
+not over yet, so "is table 5 free at 19:30?" is a single bisect and a whole
+day or week of free slots is computed without touching the database.
+
+The index is loaded lazily from ``Booking`` and kept up to date by the
+``post_save``/``post_delete`` signals in ``restaurant.signals``, once the
+write commits so a rolled back booking never shows up. A shared
+version counter in the cache lets other processes notice writes they did not
+see and reload.
+"""
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import bump_version, get_version
+from .models import Booking
+from .replicas import use_primary
+
+VERSION_KEY = 'booking:version'
+
+DEFAULT_TABLES = {1: 2, 2: 2, 3: 4, 4: 4, 5: 4, 6: 4, 7: 6, 8: 6, 9: 8, 10: 10}
+DEFAULT_DURATION = timedelta(hours=2)
+DEFAULT_OPENING_HOURS = (time(11, 0), time(23, 0))
+DEFAULT_SLOT_INTERVAL = timedelta(minutes=30)
+
+
+def restaurant_tables():
+    """Return ``{table_number: seats}`` for the configured dining room."""
+    return getattr(settings, 'RESTAURANT_TABLES', DEFAULT_TABLES)
+
+
+def booking_duration():
+    return getattr(settings, 'BOOKING_DURATION', DEFAULT_DURATION)
+
+
+def opening_hours():
+    return getattr(settings, 'RESTAURANT_OPENING_HOURS', DEFAULT_OPENING_HOURS)
+
+
+def slot_interval():
+    return getattr(settings, 'BOOKING_SLOT_INTERVAL', DEFAULT_SLOT_INTERVAL)
+
+
+def conflict_window(start):
+    """
+    Return ``(low, high)``: a booking starting at timestamp ``start`` shares
+    a slot with the bookings of its table starting strictly between the two.
+    """
+    step = slot_interval().total_seconds()
+    duration = booking_duration().total_seconds()
+    return math.floor(start / step) * step - duration, math.ceil((start + duration) / step) * step
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._starts = {}
+        self._bookings = {}
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def bookings_changed(self):
+        """Reload after bulk writes that bypass the model signals."""
+        with self._lock:
+            bump_version(VERSION_KEY)
+            self._loaded = False
+
+    def _ensure_loaded(self):
+        version = get_version(VERSION_KEY)
+        if self._loaded and self._version == version:
+            return
+        with self._lock:
+            # Bookings hold the partial slot they start in
+            horizon = timezone.now() - booking_duration() - slot_interval()
+            # Kept until the next write, which a lagging replica may not have seen
+            with use_primary():
+                rows = list(
+                    Booking.objects
+                    .filter(table_number__isnull=False, booking_date__gte=horizon)
+                    .values_list('id', 'table_number', 'booking_date')
+                    .order_by()
+                )
+            starts = {}
+            bookings = {}
+            for pk, table, booking_date in rows:
+                start = booking_date.timestamp()
+                starts.setdefault(table, []).append(start)
+                bookings[pk] = (table, start)
+            for table_starts in starts.values():
+                table_starts.sort()
+            self._starts = starts
+            self._bookings = bookings
+            self._version = version
+            self._loaded = True
+
+    # Writes
+
+    def _discard(self, pk):
+        entry = self._bookings.pop(pk, None)
+        if entry is None:
+            return
+        table, start = entry
+        table_starts = self._starts[table]
+        del table_starts[bisect_left(table_starts, start)]
+
+    def _apply(self, change):
+        """On commit, apply ``change`` locally and publish a new version for other processes."""
+        transaction.on_commit(lambda: self._publish(change))
+
+    def _publish(self, change):
+        with self._lock:
+            if self._loaded:
+                change()
+            version = bump_version(VERSION_KEY)
+            if self._loaded and self._version is not None and version == self._version + 1:
+                self._version = version
+            else:
+                self._loaded = False
+
+    def booking_saved(self, booking):
+        # The instance may change again before the transaction commits
+        pk, table_number, start = booking.pk, booking.table_number, booking.booking_date.timestamp()
+
+        def change():
+            self._discard(pk)
+            if table_number is not None:
+                insort(self._starts.setdefault(table_number, []), start)
+                self._bookings[pk] = (table_number, start)
+
+        self._apply(change)
+
+    def booking_deleted(self, pk):
+        self._apply(lambda: self._discard(pk))
+
+    # Queries
+
+    def conflicts(self, table_number, booking_date, exclude_pk=None):
+        """Return True if ``table_number`` is taken at any point of a booking starting at ``booking_date``."""
+        self._ensure_loaded()
+        return self._conflicts(table_number, booking_date, exclude_pk)
+
+    def _conflicts(self, table_number, booking_date, exclude_pk=None):
+        low, high = conflict_window(booking_date.timestamp())
+        with self._lock:
+            excluded = self._bookings.get(exclude_pk)
+            table_starts = self._starts.get(table_number, ())
+            for position in range(bisect_right(table_starts, low), bisect_left(table_starts, high)):
+                if excluded is not None and excluded == (table_number, table_starts[position]):
+                    excluded = None
+                    continue
+                return True
+        return False
+
+    def free_tables(self, booking_date, guests):
+        """Return the table numbers that seat ``guests`` and are free at ``booking_date``."""
+        self._ensure_loaded()
+        return [
+            table for table, seats in sorted(restaurant_tables().items())
+            if seats >= guests and not self._conflicts(table, booking_date)
+        ]
+
+    def free_slots(self, day, guests, days=1):
+        """
+        Return ``[(slot_start, [table, ...]), ...]`` for every bookable slot
+        between ``day`` and ``day + days``.
+        """
+        self._ensure_loaded()
+        tz = timezone.get_current_timezone()
+        opens, closes = opening_hours()
+        duration = booking_duration().total_seconds()
+        step = slot_interval().total_seconds()
+        tables = [table for table, seats in sorted(restaurant_tables().items()) if seats >= guests]
+        now = timezone.now().timestamp()
+
+        result = []
+        with self._lock:
+            for offset in range(days):
+                date = day + timedelta(days=offset)
+                first = datetime.combine(date, opens, tzinfo=tz).timestamp()
+                last = datetime.combine(date, closes, tzinfo=tz).timestamp() - duration
+                if last < first:
+                    continue
+                count = int((last - first) // step) + 1
+                # Slot i's window is these shifted by i steps
+                window_low, window_high = conflict_window(first)
+
+                # Mark the slots each booking overlaps, using index arithmetic
+                # instead of probing every (slot, table) pair.
+                blocked = {}
+                for table in tables:
+                    table_starts = self._starts.get(table, ())
+                    low = bisect_right(table_starts, window_low)
+                    high = bisect_left(table_starts, window_high + (count - 1) * step)
+                    taken = set()
+                    for start in table_starts[low:high]:
+                        begin = max(0, int((start - window_high) // step) + 1)
+                        end = min(count, -int(-(start - window_low) // step))
+                        taken.update(range(begin, end))
+                    blocked[table] = taken
+
+                for index in range(count):
+                    slot = first + index * step
+                    if slot < now:
+                        continue
+                    free = [table for table in tables if index not in blocked[table]]
+                    result.append((datetime.fromtimestamp(slot, tz), free))
+        return result
+
+
+availability_index = AvailabilityIndex()
+
+
+def table_is_free(table_number, booking_date, exclude_pk=None):
+    """
+    Return True if ``table_number`` can take a booking at ``booking_date``.
+
+    A free answer comes straight from the index. A conflict is confirmed with
+    one indexed query, because the index may still hold a booking another
+    process has since moved or deleted; if the database disagrees the index
+    is reloaded on next use.
+    """
+    if not availability_index.conflicts(table_number, booking_date, exclude_pk):
+        return True
+    low, high = conflict_window(booking_date.timestamp())
+    overlapping = Booking.objects.filter(
+        table_number=table_number,
+        booking_date__gt=datetime.fromtimestamp(low, dt_timezone.utc),
+        booking_date__lt=datetime.fromtimestamp(high, dt_timezone.utc),
+    )
+    if exclude_pk is not None:
+        overlapping = overlapping.exclude(pk=exclude_pk)
+    if overlapping.exists():
+        return False
+    availability_index.invalidate()
+    return True
+
+
+def find_table_conflicts(candidates, exclude_pks=()):
+    """
+    Check many prospective bookings against the database and each other.
+
+    ``candidates`` is an iterable of ``(key, table_number, booking_date)``;
+    the keys of the candidates that overlap an existing booking or an earlier
+    candidate are returned. Existing bookings are read with one query
+    covering every involved table and the whole time span.
+    """
+    candidates = [candidate for candidate in candidates if candidate[1] is not None]
+    if not candidates:
+        return set()
+
+    starts = [booking_date.timestamp() for _, _, booking_date in candidates]
+    rows = (
+        Booking.objects
+        .filter(
+            table_number__in={table for _, table, _ in candidates},
+            booking_date__gt=datetime.fromtimestamp(conflict_window(min(starts))[0], dt_timezone.utc),
+            booking_date__lt=datetime.fromtimestamp(conflict_window(max(starts))[1], dt_timezone.utc),
+        )
+        .exclude(pk__in=list(exclude_pks))
+        .values_list('table_number', 'booking_date')
+        .order_by()
+    )
+    taken = {}
+    for table, booking_date in rows:
+        taken.setdefault(table, []).append(booking_date.timestamp())
+    for starts in taken.values():
+        starts.sort()
+
+    conflicts = set()
+    for key, table, booking_date in candidates:
+        starts = taken.setdefault(table, [])
+        start = booking_date.timestamp()
+        low, high = conflict_window(start)
+        if bisect_right(starts, low) < bisect_left(starts, high):
+            conflicts.add(key)
+        else:
+            insort(starts, start)
+    return conflicts
@@ -0,0 +1,210 @@
+"""
+Batch processing of booking create/update/cancel operations.
+
+All operations are validated in one pass, table conflicts for the whole batch
+are checked with a single query (``find_table_conflicts``) and the writes go
+through ``bulk_create``/``bulk_update``/one ``DELETE`` inside one transaction,
+after each operation has moved its slot inventory reservation. In partial
+mode, a batch that loses a race with a concurrent booking is written again
+one booking at a time, so only the conflicting ones fail.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .availability import availability_index, find_table_conflicts
+from .inventory import SlotUnavailable, move_reservation, release, reserve
+from .models import Booking
+from .occupancy import update_rollups
+from .serializers import BookingCreateSerializer, BookingOperationSerializer
+
+CONFLICT_ERROR = {'table_number': ['Table is already booked around that time.']}
+
+
+def _validated(serializer):
+    # Uniqueness and overlaps are checked for the whole batch at once instead
+    # of with one query per item.
+    serializer.validators = []
+    if serializer.is_valid():
+        return serializer.validated_data
+    return None
+
+
+def _save_each(items, results):
+    """
+    Save the ``(index, booking)`` items one at a time, each in a savepoint, and
+    record an error result for those that conflict; return the saved indexes.
+    """
+    saved = set()
+    for index, booking in items:
+        try:
+            with transaction.atomic():
+                booking.save()
+        except SlotUnavailable as exc:
+            results[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [str(exc)]}}
+        except IntegrityError:
+            results[index] = {'index': index, 'status': 'error', 'errors': CONFLICT_ERROR}
+        else:
+            saved.add(index)
+    return saved
+
+
+def process_booking_operations(operations, user, atomic=False):
+    """
+    Apply ``operations`` on behalf of ``user`` and return ``(results, applied)``.
+
+    ``results`` has one dict per operation with its ``status`` (``created``,
+    ``updated``, ``cancelled`` or ``error``). With ``atomic=True`` nothing is
+    written unless every operation is valid; ``applied`` tells whether the
+    valid operations were written.
+    """
+    context = {'check_table_availability': False}
+    results = [None] * len(operations)
+    parsed = []
+    for index, raw in enumerate(operations):
+        operation = BookingOperationSerializer(data=raw)
+        if operation.is_valid():
+            parsed.append((index, operation.validated_data))
+        else:
+            results[index] = {'index': index, 'status': 'error', 'errors': operation.errors}
+
+    visible = Booking.objects.all() if user.is_staff else Booking.objects.filter(user=user)
+    targets = visible.in_bulk([op['id'] for _, op in parsed if op['op'] != 'create'])
+
+    creates, updates, cancels = [], [], []
+    seen_ids = set()
+    for index, op in parsed:
+        if op['op'] != 'create':
+            instance = targets.get(op['id'])
+            if instance is None or op['id'] in seen_ids:
+                detail = 'Not found.' if instance is None else 'Booking appears more than once in the batch.'
+                results[index] = {'index': index, 'status': 'error', 'id': op['id'], 'errors': {'id': [detail]}}
+                continue
+            seen_ids.add(op['id'])
+
+        if op['op'] == 'cancel':
+            cancels.append((index, instance))
+            continue
+
+        if op['op'] == 'create':
+            serializer = BookingCreateSerializer(data=op['data'], context=context)
+        else:
+            serializer = BookingCreateSerializer(instance, data=op['data'], partial=True, context=context)
+        data = _validated(serializer)
+        if data is None:
+            results[index] = {'index': index, 'status': 'error', 'errors': serializer.errors}
+        elif op['op'] == 'create':
+            creates.append((index, data))
+        else:
+            updates.append((index, instance, data))
+
+    candidates = [
+        (index, data.get('table_number'), data['booking_date']) for index, data in creates
+    ] + [
+        (index, data.get('table_number', instance.table_number), data.get('booking_date', instance.booking_date))
+        for index, instance, data in updates
+    ]
+    conflicts = find_table_conflicts(candidates, exclude_pks=seen_ids)
+    for index in conflicts:
+        results[index] = {'index': index, 'status': 'error', 'errors': CONFLICT_ERROR}
+    creates = [item for item in creates if item[0] not in conflicts]
+    updates = [item for item in updates if item[0] not in conflicts]
+
+    if atomic and any(result is not None for result in results):
+        for index in range(len(results)):
+            if results[index] is None:
+                results[index] = {'index': index, 'status': 'skipped'}
+        return results, False
+
+    owner = user if user.is_authenticated else None
+    creates = [(index, Booking(user=owner, **data)) for index, data in creates]
+    now = timezone.now()
+    fields = {'updated_at'}
+    for _, instance, data in updates:
+        for field, value in data.items():
+            setattr(instance, field, value)
+            fields.add(field)
+        instance.updated_at = now
+
+    unavailable = {}
+
+    def hold(index, held, wanted):
+        """Move one reservation in the slot inventory; False if the slots are full."""
+        try:
+            with transaction.atomic():
+                move_reservation(held, wanted)
+        except SlotUnavailable as exc:
+            unavailable[index] = {'index': index, 'status': 'error', 'errors': {'non_field_errors': [str(exc)]}}
+            if atomic:
+                raise
+            return False
+        return True
+
+    def hold_all(moves):
+        """Move the reservations of ``(index, held, wanted)`` moves; return those that fit."""
+        try:
+            with transaction.atomic():
+                release([held for _, held, _ in moves if held is not None])
+                reserve([wanted for _, _, wanted in moves])
+            return moves
+        except SlotUnavailable:
+            # Some don't fit: find them one at a time
+            return [move for move in moves if hold(*move)]
+
+    try:
+        # Free slots before reusing them: cancels, then updates, then creates
+        with transaction.atomic():
+            if cancels:
+                Booking.objects.filter(pk__in=[instance.pk for _, instance in cancels]).delete()
+            # bulk_update() and bulk_create() bypass Booking.save(), which moves reservations
+            held = {index for index, _, _ in hold_all(
+                [(index, instance._held, instance.reservation()) for index, instance, _ in updates]
+                + [(index, None, booking.reservation()) for index, booking in creates]
+            )}
+            updates = [item for item in updates if item[0] in held]
+            creates = [item for item in creates if item[0] in held]
+            if updates:
+                Booking.objects.bulk_update([instance for _, instance, _ in updates], sorted(fields))
+            Booking.objects.bulk_create([booking for _, booking in creates])
+            # Nor do they send the signals that keep the occupancy rollups
+            update_rollups(
+                removed=[instance._held for _, instance, _ in updates],
+                added=[instance.reservation() for _, instance, _ in updates]
+                + [booking.reservation() for _, booking in creates],
+            )
+    except SlotUnavailable:
+        # Atomic mode: nothing was written
+        for index in range(len(results)):
+            if results[index] is None:
+                results[index] = unavailable.get(index, {'index': index, 'status': 'skipped'})
+        return results, False
+    except IntegrityError:
+        # Lost a race with a concurrent booking
+        if atomic:
+            for index, _ in creates:
+                results[index] = {'index': index, 'status': 'error', 'errors': CONFLICT_ERROR}
+            for index, _, _ in updates:
+                results[index] = {'index': index, 'status': 'error', 'errors': CONFLICT_ERROR}
+            for index, instance in cancels:
+                results[index] = {'index': index, 'status': 'skipped', 'id': instance.pk}
+            results = [unavailable.get(index, result) for index, result in enumerate(results)]
+            return results, False
+        # Nothing was written: start over one booking at a time, through
+        # Booking.save() and its signals, to fail only the ones that conflict
+        with transaction.atomic():
+            if cancels:
+                Booking.objects.filter(pk__in=[instance.pk for _, instance in cancels]).delete()
+            saved = _save_each([(index, instance) for index, instance, _ in updates] + creates, results)
+        updates = [item for item in updates if item[0] in saved]
+        creates = [item for item in creates if item[0] in saved]
+    finally:
+        availability_index.bookings_changed()
+
+    for index, result in unavailable.items():
+        results[index] = result
+    for index, booking in creates:
+        results[index] = {'index': index, 'status': 'created', 'id': booking.pk}
+    for index, instance, _ in updates:
+        results[index] = {'index': index, 'status': 'updated', 'id': instance.pk}
+    for index, instance in cancels:
+        results[index] = {'index': index, 'status': 'cancelled', 'id': instance.pk}
+    return results, True
@@ -0,0 +1,124 @@
+"""
+Versioned response cache for the public menu endpoints.
+
+Every cached payload is stored under a key that embeds the current menu
+version. Saving or deleting a ``Menu`` row bumps the version (see
+``restaurant.signals``), so stale entries are never read again and simply
+age out of the cache backend.
+"""
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .replicas import use_primary
+
+VERSION_KEY = 'menu:version'
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+
+def get_cache():
+    return caches[getattr(settings, 'MENU_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_version(key):
+    """Return the counter stored under ``key``, initialising it if it is missing."""
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so that a version evicted from the cache can
+        # never collide with keys written under an earlier version.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def get_menu_version():
+    return get_version(VERSION_KEY)
+
+
+def bump_menu_version():
+    """Invalidate every cached menu payload."""
+    return bump_version(VERSION_KEY)
+
+
+def _record(endpoint, outcome):
+    with _stats_lock:
+        _stats[endpoint][outcome] += 1
+
+
+def cache_stats():
+    """Return a snapshot of the per-endpoint hit/miss counters."""
+    with _stats_lock:
+        return {endpoint: dict(counts) for endpoint, counts in _stats.items()}
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _menu_data_key(endpoint, variant):
+    digest = hashlib.md5(variant.encode('utf-8')).hexdigest()
+    return f'menu:{endpoint}:{get_menu_version()}:{digest}'
+
+
+def cached_menu_data(endpoint, variant, build):
+    """
+    Return the payload for ``endpoint``/``variant`` from the cache, calling
+    ``build()`` and storing its result on a miss.
+
+    ``variant`` identifies everything the payload depends on besides the menu
+    itself (query string, URL kwargs, host for absolute pagination links).
+    """
+    key = _menu_data_key(endpoint, variant)
+    cache = get_cache()
+    data = cache.get(key)
+    if data is not None:
+        _record(endpoint, 'hits')
+        return data
+    _record(endpoint, 'misses')
+    # Cached for the whole version, so not from a replica that may predate it
+    with use_primary():
+        data = build()
+    cache.set(key, data, timeout=cache_timeout())
+    return data
+
+
+async def acached_menu_data(endpoint, variant, build):
+    """
+    ``cached_menu_data`` for async views, where ``build`` is a coroutine function.
+
+    The cache is read with its sync API: Django's async cache methods run the
+    sync ones in a worker thread, which costs more than a local memory lookup.
+    """
+    key = _menu_data_key(endpoint, variant)
+    cache = get_cache()
+    data = cache.get(key)
+    if data is not None:
+        _record(endpoint, 'hits')
+        return data
+    _record(endpoint, 'misses')
+    with use_primary():
+        data = await build()
+    cache.set(key, data, timeout=cache_timeout())
+    return data
@@ -0,0 +1,220 @@
+"""
+Compiled read path for model serializers.
+
+``ModelSerializer.data`` walks the serializer's fields for every object:
+``get_attribute``, ``SkipField`` handling and a ``to_representation`` call
+per field, on model instances that first had to be hydrated. For reads,
+``compiled(SerializerClass)`` introspects the fields once and generates one
+plain function turning a ``values_list()`` row into the same dict, so list
+and detail views never build model instances. The output is identical to
+the serializer's, down to the rendered bytes:
+
+- ``CharField``, ``IntegerField`` and ``BooleanField`` values are already
+  what the serializer would return and are copied as they are;
+- ``DecimalField`` and ``DateTimeField`` run DRF's formatting with the
+  context, exponent and timezone looked up once instead of per value;
+- a nested serializer becomes a nested dict, or ``None`` when the foreign
+  key is null;
+- a field whose representation is one column of a related model declares
+  it as ``read_column`` (see ``CategoryField``);
+- any other field falls back to its own ``to_representation``.
+
+``compiled(SerializerClass, fields)`` compiles a sparse fieldset (see
+``restaurant.sparse``), selecting only the columns those fields read.
+The serializers themselves stay in charge of writes.
+"""
+import decimal
+import functools
+import time
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured, ValidationError
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import fields, serializers
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .metrics import record_serializer_time
+from .sparse import requested_fields
+
+# Fields whose to_representation is the identity on what the database returns
+IDENTITY = {
+    fields.CharField.to_representation,
+    fields.IntegerField.to_representation,
+    fields.BooleanField.to_representation,
+}
+
+
+def _decimal_formatter(field):
+    if (
+        field.decimal_places is None
+        or field.normalize_output
+        or field.localize
+        or not getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    ):
+        return None
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def encode(value):
+        return f'{value.quantize(exponent, rounding=rounding, context=context):f}'
+    return encode
+
+
+def _datetime(value, tz):
+    text = value.astimezone(tz).isoformat()
+    if text.endswith('+00:00'):
+        return text[:-6] + 'Z'
+    return text
+
+
+def _uses_fast_datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    return (
+        settings.USE_TZ
+        and not hasattr(field, 'timezone')
+        and isinstance(output_format, str)
+        and output_format.lower() == fields.ISO_8601
+    )
+
+
+class CompiledSerializer:
+    """
+    The read path of ``serializer_class``, or of its top-level ``fields``
+    only: ``rows()`` selects, ``serialize()`` encodes.
+    """
+
+    def __init__(self, serializer_class, fields=None):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.model = serializer_class.Meta.model
+        self.columns = []
+        self.namespace = {'_datetime': _datetime}
+        body = self._compile_dict(serializer_class(), self.model, '', fields)
+        self.source = f'def encode(row, tz):\n    return {body}\n'
+        code = compile(self.source, f'<compiled {serializer_class.__name__}>', 'exec')
+        exec(code, self.namespace)
+        self.encode = self.namespace['encode']
+
+    def _column(self, path):
+        self.columns.append(path)
+        return f'row[{len(self.columns) - 1}]'
+
+    def _constant(self, value):
+        name = f'_f{len(self.namespace)}'
+        self.namespace[name] = value
+        return name
+
+    def _compile_dict(self, serializer, model, prefix, fields=None):
+        items = []
+        for field in serializer._readable_fields:
+            if fields is not None and field.field_name not in fields:
+                continue
+            if not field.source_attrs:
+                raise ImproperlyConfigured(f"{field.field_name}: source='*' can't be compiled")
+            path = prefix + '__'.join(field.source_attrs)
+            items.append(f'{field.field_name!r}: {self._compile_field(field, model, path)}')
+        return '{' + ', '.join(items) + '}'
+
+    def _compile_field(self, field, model, path):
+        model_field = None
+        if len(field.source_attrs) == 1:
+            try:
+                model_field = model._meta.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                raise ImproperlyConfigured(f'{field.field_name}: only model fields can be compiled')
+
+        if isinstance(field, serializers.BaseSerializer):
+            if isinstance(field, serializers.ListSerializer) or model_field is None or not model_field.many_to_one:
+                raise ImproperlyConfigured(f'{field.field_name}: only nested foreign keys can be compiled')
+            # The foreign key itself, without a join, tells a missing object
+            present = self._column(path)
+            nested = self._compile_dict(field, model_field.related_model, f'{path}__')
+            return f'(None if {present} is None else {nested})'
+
+        if model_field is not None and model_field.is_relation:
+            read_column = getattr(field, 'read_column', None)
+            if read_column is None:
+                raise ImproperlyConfigured(f'{field.field_name}: relations need a read_column to be compiled')
+            return self._column(f'{path}__{read_column}')
+
+        value = self._column(path)
+        to_representation = type(field).to_representation
+        if to_representation in IDENTITY:
+            return value
+        if to_representation is fields.DateTimeField.to_representation and _uses_fast_datetime(field):
+            return f'(None if {value} is None else _datetime({value}, tz))'
+        formatter = None
+        if to_representation is fields.DecimalField.to_representation:
+            formatter = _decimal_formatter(field)
+        formatter = self._constant(formatter or field.to_representation)
+        return f'(None if {value} is None else {formatter}({value}))'
+
+    # Reading
+
+    def rows(self, queryset, *extra):
+        """
+        ``queryset`` as rows ``serialize()`` takes, named after their lookups
+        for pagination. ``extra`` lookups are selected after the serialized
+        ones, for the caller's own use.
+        """
+        return queryset.values_list(*self.columns, *extra, named=True)
+
+    def serialize(self, rows):
+        """Encode ``rows`` like ``serializer_class(instances, many=True).data``."""
+        rows = list(rows)
+        started = time.perf_counter()
+        encode, tz = self.encode, timezone.get_current_timezone()
+        data = [encode(row, tz) for row in rows]
+        record_serializer_time(time.perf_counter() - started)
+        return data
+
+    def serialize_one(self, row):
+        return self.serialize([row])[0]
+
+
+# Bounded: every sparse fieldset requested compiles its own function
+@functools.lru_cache(maxsize=256)
+def compiled(serializer_class, fields=None):
+    """The ``CompiledSerializer`` of ``serializer_class`` (and ``fields``), built on first use."""
+    return CompiledSerializer(serializer_class, fields)
+
+
+class CompiledListMixin:
+    """
+    ``list()`` that reads rows for ``get_serializer_class()``'s compiled
+    serializer, restricted to the request's sparse fieldset.
+    """
+
+    def list(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        serializer = compiled(serializer_class, requested_fields(request, serializer_class))
+        # Keyset pagination reads its ordering from the rows
+        ordering = getattr(self.paginator, 'keyset_ordering', ())
+        extra = [column for column in ordering if column not in serializer.columns]
+        rows = serializer.rows(self.filter_queryset(self.get_queryset()), *extra)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+
+class CompiledRetrieveMixin:
+    """``retrieve()`` through the compiled serializer, for views without object permissions."""
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        serializer = compiled(serializer_class, requested_fields(request, serializer_class))
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        try:
+            row = serializer.rows(queryset.filter(**lookup)).first()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        return Response(serializer.serialize_one(row))
@@ -0,0 +1,120 @@
+"""
+gzip compression of responses, negotiated through ``Accept-Encoding``.
+
+``compression_middleware`` (see ``restaurant.middleware``) gzips JSON
+responses of at least ``RESPONSE_COMPRESSION_MIN_SIZE`` bytes at
+``RESPONSE_COMPRESSION_LEVEL`` for clients that accept it; smaller payloads
+aren't worth the CPU. HTML pages (the admin and the browsable API) are left
+alone: they carry CSRF tokens next to reflected input, which compression
+would expose to BREACH.
+
+Most large responses are the same menu payloads over and over. Views mark
+those with ``compress_once(response, version)``, passing the menu version
+read before building the payload and its cache variant, and their
+compressed bodies are kept in the menu cache under those, the content
+type and the requested indent. So each payload is compressed once per menu
+change. Everything else, like a user's booking list, is compressed per request.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from .cache import cache_timeout, get_cache
+
+DEFAULT_LEVEL = 6
+DEFAULT_MIN_SIZE = 1024
+
+
+def compression_level():
+    return getattr(settings, 'RESPONSE_COMPRESSION_LEVEL', DEFAULT_LEVEL)
+
+
+def compression_min_size():
+    return getattr(settings, 'RESPONSE_COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+
+
+def accepts_gzip(request):
+    """Whether ``Accept-Encoding`` allows gzip, directly or through ``*``, with a non-zero q."""
+    qualities = {}
+    for coding in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, *params = coding.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+    for name in ('gzip', 'x-gzip', '*'):
+        if name in qualities:
+            return qualities[name] > 0
+    return False
+
+
+def compress_once(response, version, variant):
+    """Cache the compressed body of ``response`` for ``version`` of its content and ``variant`` of the payload."""
+    response.content_version = version
+    response.content_variant = variant
+    return response
+
+
+def _is_json(response):
+    media_type = response.get('Content-Type', '').partition(';')[0].strip().lower()
+    return media_type == 'application/json' or media_type.endswith('+json')
+
+
+def _indent(response):
+    """The indent the client asked for with ``Accept: application/json; indent=N``, if any."""
+    renderer = getattr(response, 'accepted_renderer', None)
+    if not hasattr(renderer, 'get_indent'):
+        return None
+    return renderer.get_indent(response.accepted_media_type, getattr(response, 'renderer_context', None) or {})
+
+
+def _cache_key(response, level):
+    variant = (
+        f"{response.content_variant}|{response.get('Content-Type', '')}|{_indent(response)}"
+        f"|{response.content_version}"
+    )
+    return f"gzip:{level}:{hashlib.md5(variant.encode('utf-8')).hexdigest()}"
+
+
+def compress_response(request, response):
+    """gzip ``response`` in place if the client accepts it and it is worth it."""
+    if (
+        response.streaming
+        or response.status_code != 200
+        or response.has_header('Content-Encoding')
+        or not _is_json(response)
+        or len(response.content) < compression_min_size()
+    ):
+        return response
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if not accepts_gzip(request):
+        return response
+
+    level = compression_level()
+    if getattr(response, 'content_version', None) is None:
+        compressed = gzip.compress(response.content, compresslevel=level, mtime=0)
+    else:
+        key = _cache_key(response, level)
+        cache = get_cache()
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = gzip.compress(response.content, compresslevel=level, mtime=0)
+            cache.set(key, compressed, timeout=cache_timeout())
+    if len(compressed) >= len(response.content):
+        return response
+
+    response.content = compressed
+    response['Content-Length'] = str(len(compressed))
+    response['Content-Encoding'] = 'gzip'
+    # The compressed body is a different representation of the same version
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
@@ -0,0 +1,109 @@
+"""
+Conditional GET support (ETag / Last-Modified / 304) for DRF views.
+
+Views describe the freshness of the resource they are about to return with a
+cheap query on ``updated_at``; when the client already holds that version the
+request is answered with ``304 Not Modified`` before any serialization runs.
+
+Collections only get an ``ETag``: deleting a row leaves ``MAX(updated_at)``
+where it was, so it can't serve as their ``Last-Modified``. Neither can an
+object's ``updated_at`` when the response includes related rows.
+"""
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+def collection_freshness(queryset):
+    """Return ``(MAX(updated_at), COUNT(*))`` for ``queryset`` in one query."""
+    result = queryset.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+    return result['last_modified'], result['count']
+
+
+def collection_etag(parts, last_modified, count):
+    return make_etag(*parts, last_modified and last_modified.isoformat(), count)
+
+
+def object_etag(request, last_modified, related=()):
+    # The query string selects a fieldset (see restaurant.sparse)
+    return make_etag(request.get_full_path(), last_modified.isoformat(), *related)
+
+
+def not_modified_response(request, etag, last_modified):
+    """Return a 304 response if the client already holds this version, else ``None``."""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+
+
+class ConditionalGetMixin:
+    """
+    Add ``ETag``/``Last-Modified`` headers to GET responses and answer
+    ``If-None-Match``/``If-Modified-Since`` with a 304.
+
+    Subclasses implement ``get_freshness()`` returning ``(etag, last_modified)``
+    or ``None`` when no validator can be computed (e.g. the object does not
+    exist), in which case the request is handled normally.
+    """
+
+    def get_freshness(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        freshness = self.get_freshness(request, *args, **kwargs)
+        if freshness is None:
+            return super().get(request, *args, **kwargs)
+
+        etag, last_modified = freshness
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = super().get(request, *args, **kwargs)
+        set_validators(response, etag, last_modified)
+        return response
+
+
+class CollectionConditionalGetMixin(ConditionalGetMixin):
+    """Validators for list views, derived from an aggregate over the queryset."""
+
+    def get_collection_freshness(self):
+        return collection_freshness(self.filter_queryset(self.get_queryset()))
+
+    def get_etag_parts(self, request):
+        return [request.get_full_path()]
+
+    def get_freshness(self, request, *args, **kwargs):
+        last_modified, count = self.get_collection_freshness()
+        return collection_etag(self.get_etag_parts(request), last_modified, count), None
+
+
+class ObjectConditionalGetMixin(ConditionalGetMixin):
+    """Validators for detail views, read from the object's ``updated_at``."""
+    # Lookups of related rows the response includes, whose changes don't
+    # touch the object's updated_at; views with any only get an ETag
+    etag_columns = ()
+
+    def get_freshness(self, request, *args, **kwargs):
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        row = (
+            self.get_queryset().filter(**lookup)
+            .values_list('updated_at', *self.etag_columns).first()
+        )
+        if row is None:
+            return None
+        last_modified, *related = row
+        return object_etag(request, last_modified, related), None if related else last_modified
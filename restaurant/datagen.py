@@ -0,0 +1,287 @@
+"""
+Deterministic synthetic data for development and capacity planning.
+
+Everything is drawn from one ``random.Random(seed)``, so the same seed, sizes
+and end date always produce the same rows; rerunning them on the same
+database skips the rows that already exist. Meant for an empty database:
+generated bookings are only checked against each other.
+
+Rows are generated as tuples of database values and inserted in batches,
+one transaction and one ``executemany`` per batch. ``bulk_create`` spends
+about 150 µs per booking preparing field values, which caps it at around
+6k rows/s; this path loads a million bookings in well under a minute.
+
+Bookings are laid out table by table and day by day, walking back from the
+end date, so they never overlap on a table (and so respect the
+``(booking_date, table_number)`` uniqueness). Whether a table is booked at a
+slot follows a lunch and a dinner peak and busier weekends; party sizes fit
+the table they are seated at. How far back the bookings reach follows from
+their number and the dining room in ``RESTAURANT_TABLES``.
+"""
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from .availability import availability_index, booking_duration, opening_hours, restaurant_tables, slot_interval
+from .inventory import rebuild_inventory
+from .models import Booking, Category, Menu
+from .occupancy import rebuild_rollups
+from .snapshot import invalidate_menu_on_commit
+
+DEFAULT_BATCH_SIZE = 20000
+DEFAULT_PASSWORD = 'temppass123'
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+    'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Sofia', 'Mark', 'Maria', 'Ahmed', 'Yuki',
+    'Omar', 'Elena', 'Nikos', 'Priya', 'Wei', 'Fatima', 'Luca', 'Amara', 'Mateo', 'Ingrid',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Perez', 'Thompson', 'White', 'Harris', 'Clark', 'Lewis', 'Robinson', 'Walker', 'Young',
+    'Papadopoulos', 'Rossi', 'Nakamura', 'Kowalski', 'Okafor', 'Nguyen', 'Haddad', 'Silva', 'Novak', 'Berg',
+]
+EMAIL_DOMAINS = ['example.com', 'example.org', 'example.net', 'mail.example.com']
+SPECIAL_REQUESTS = [
+    'Window seat please', 'Birthday celebration', 'Anniversary dinner', 'Vegetarian options',
+    'Gluten-free options', 'High chair needed', 'Wheelchair access', 'Quiet table please', 'Nut allergy',
+]
+
+# (category, price range, dish names)
+MENU_CATEGORIES = [
+    ('Appetizers', (5, 14), ['Bruschetta', 'Hummus', 'Dolmades', 'Calamari', 'Falafel', 'Tzatziki', 'Arancini']),
+    ('Salads', (8, 16), ['Greek Salad', 'Caesar Salad', 'Fattoush', 'Caprese', 'Tabbouleh', 'Panzanella']),
+    ('Main Course', (16, 38), ['Grilled Salmon', 'Lamb Kleftiko', 'Moussaka', 'Souvlaki', 'Chicken Tagine']),
+    ('Pizza', (12, 22), ['Margherita', 'Marinara', 'Quattro Formaggi', 'Diavola', 'Capricciosa']),
+    ('Pasta', (13, 26), ['Linguine', 'Pappardelle', 'Orzo', 'Ravioli', 'Gnocchi', 'Penne']),
+    ('Desserts', (5, 12), ['Baklava', 'Tiramisu', 'Lemon Tart', 'Panna Cotta', 'Loukoumades', 'Galaktoboureko']),
+    ('Drinks', (3, 10), ['Lemonade', 'Iced Tea', 'Espresso', 'Frappe', 'Ayran', 'Mint Tea']),
+]
+STYLES = [
+    'Classic', 'Rustic', 'Spicy', 'Smoky', 'Grilled', 'Roasted', 'House', 'Village', 'Coastal', 'Garden',
+    'Sicilian', 'Cretan', 'Lebanese', 'Moroccan', 'Andalusian', 'Chef\'s', 'Seasonal', 'Charred',
+]
+INGREDIENTS = [
+    'basil', 'feta', 'tomato', 'garlic', 'olives', 'lemon', 'oregano', 'mozzarella', 'parmesan', 'spinach',
+    'mushrooms', 'chickpeas', 'lamb', 'chicken', 'salmon', 'shrimp', 'pistachio', 'honey', 'yogurt', 'mint',
+    'cucumber', 'eggplant', 'zucchini', 'peppers', 'red onion', 'capers', 'saffron', 'thyme', 'walnuts', 'tahini',
+]
+
+# Share of parties by size; a party sits at a table with at most twice its seats
+PARTY_SIZES = {1: 8, 2: 42, 3: 13, 4: 20, 5: 6, 6: 6, 7: 2, 8: 2, 9: 0.5, 10: 0.5}
+# Demand by day of the week, Monday first
+WEEKDAY_DEMAND = [0.65, 0.7, 0.8, 0.9, 1.25, 1.35, 1.1]
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert(model, fields, rows, total, batch_size, progress=None):
+    """
+    Insert ``rows``, tuples of database values for ``fields``, in batches of
+    ``batch_size``. Rows that would break a unique constraint are skipped.
+    Returns the number of rows inserted.
+    """
+    ops = connection.ops
+    sql = '{} {} ({}) VALUES ({})'.format(
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        ops.quote_name(model._meta.db_table),
+        ', '.join(ops.quote_name(model._meta.get_field(field).column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    done = inserted = 0
+    started = time.perf_counter()
+    for batch in batches(rows, batch_size):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, batch)
+            inserted += cursor.rowcount
+        done += len(batch)
+        if progress:
+            progress(model._meta.verbose_name_plural, done, total, time.perf_counter() - started)
+    return inserted
+
+
+def db_datetime(value):
+    return connection.ops.adapt_datetimefield_value(value)
+
+
+# Menu
+
+MENU_FIELDS = ['name', 'description', 'price', 'category', 'available', 'featured', 'created_at', 'updated_at']
+
+
+def menu_rows(rng, count, categories):
+    """Unique dish names: a style, a dish and, past the first combinations, a number."""
+    now = db_datetime(timezone.now())
+    for i in range(count):
+        category, (low, high), dishes = MENU_CATEGORIES[i % len(MENU_CATEGORIES)]
+        round_, position = divmod(i // len(MENU_CATEGORIES), len(STYLES) * len(dishes))
+        style, dish = STYLES[position % len(STYLES)], dishes[position // len(STYLES)]
+        name = f'{style} {dish}' if round_ == 0 else f'{style} {dish} No. {round_ + 1}'
+        ingredients = rng.sample(INGREDIENTS, rng.randint(2, 4))
+        yield (
+            name,
+            f"{', '.join(ingredients[:-1]).capitalize()} and {ingredients[-1]}",
+            Decimal(rng.randint(low * 100, high * 100)) / 100,
+            categories[category].pk,
+            rng.random() < 0.95,
+            rng.random() < 0.05,
+            now,
+            now,
+        )
+
+
+def generate_menu(rng, count, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    categories = Category.objects.for_names([category for category, _, _ in MENU_CATEGORIES])
+    created = insert(Menu, MENU_FIELDS, menu_rows(rng, count, categories), count, batch_size, progress)
+    invalidate_menu_on_commit()
+    return created
+
+
+# Users
+
+def person(rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return first, last
+
+
+USER_FIELDS = [
+    'username', 'first_name', 'last_name', 'email', 'password',
+    'is_superuser', 'is_staff', 'is_active', 'date_joined',
+]
+
+
+def user_rows(rng, count, password):
+    now = db_datetime(timezone.now())
+    for i in range(count):
+        first, last = person(rng)
+        username = f'{first.lower()}.{last.lower()}{i}'
+        email = f'{username}@{rng.choice(EMAIL_DOMAINS)}'
+        yield username, first, last, email, password, False, False, True, now
+
+
+def generate_users(rng, count, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    # Hashing is deliberately slow, so every user shares one hash
+    password = make_password(DEFAULT_PASSWORD)
+    return insert(User, USER_FIELDS, user_rows(rng, count, password), count, batch_size, progress)
+
+
+# Bookings
+
+def demand(moment):
+    """Relative demand for a table at ``moment``: a lunch and a dinner peak."""
+    hour = moment.hour + moment.minute / 60
+    lunch = math.exp(-((hour - 12.75) / 0.9) ** 2)
+    dinner = 1.1 * math.exp(-((hour - 19.25) / 1.2) ** 2)
+    return 0.06 + lunch + dinner
+
+
+def party_sizes(seats):
+    """Party sizes and weights for a table of ``seats``."""
+    sizes = [size for size in PARTY_SIZES if (seats + 1) // 2 <= size <= seats]
+    return sizes, [PARTY_SIZES[size] for size in sizes]
+
+
+def day_bookings(rng, day, tables, occupancy):
+    """``(booking_date, table_number, guests)`` for one day, no two overlapping on a table."""
+    opens, closes = opening_hours()
+    duration, interval = booking_duration(), slot_interval()
+    start = timezone.make_aware(datetime.combine(day, opens))
+    last_start = timezone.make_aware(datetime.combine(day, closes)) - duration
+    weekday = WEEKDAY_DEMAND[day.weekday()]
+    slots = []
+    moment = start
+    while moment <= last_start:
+        slots.append((db_datetime(moment), min(1.0, occupancy * weekday * demand(moment))))
+        moment += interval
+    step = max(1, round(duration / interval))
+
+    for table, (sizes, weights) in tables:
+        i = 0
+        while i < len(slots):
+            moment, chance = slots[i]
+            if rng.random() < chance:
+                yield moment, table, rng.choices(sizes, weights)[0]
+                i += step
+            else:
+                i += 1
+
+
+BOOKING_FIELDS = [
+    'customer_name', 'customer_email', 'customer_phone', 'no_of_guests', 'booking_date', 'table_number',
+    'special_requests', 'user', 'created_at', 'updated_at',
+]
+
+
+def booking_rows(rng, count, end, occupancy, customers):
+    tables = [(table, party_sizes(seats)) for table, seats in sorted(restaurant_tables().items())]
+    now = db_datetime(timezone.now())
+    produced = 0
+    day = end
+    while produced < count:
+        for booking_date, table, guests in day_bookings(rng, day, tables, occupancy):
+            if customers and rng.random() < 0.6:
+                user_id, first, last, email = rng.choice(customers)
+            else:
+                user_id = None
+                first, last = person(rng)
+                email = f'{first.lower()}.{last.lower()}@{rng.choice(EMAIL_DOMAINS)}'
+            yield (
+                f'{first} {last}',
+                email,
+                f'555-{rng.randrange(10000):04d}',
+                guests,
+                booking_date,
+                table,
+                rng.choice(SPECIAL_REQUESTS) if rng.random() < 0.15 else '',
+                user_id,
+                now,
+                now,
+            )
+            produced += 1
+            if produced == count:
+                return
+        day -= timedelta(days=1)
+
+
+def generate_bookings(rng, count, end=None, occupancy=0.6, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Create ``count`` bookings on the days up to and including ``end``, latest first."""
+    if end is None:
+        end = timezone.localdate() + timedelta(days=30)
+    customers = list(User.objects.order_by('pk').values_list('pk', 'first_name', 'last_name', 'email'))
+    customers = [customer for customer in customers if customer[1] and customer[2]]
+    rows = booking_rows(rng, count, end, occupancy, customers)
+    created = insert(Booking, BOOKING_FIELDS, rows, count, batch_size, progress)
+    availability_index.bookings_changed()
+    rebuild_inventory()
+    rebuild_rollups()
+    return created
+
+
+def generate(seed=0, menu_items=0, users=0, bookings=0, end=None, occupancy=0.6,
+             batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Generate the menu, then users, then bookings (which reference users)."""
+    rng = random.Random(seed)
+    return {
+        'menu_items': generate_menu(random.Random(rng.random()), menu_items, batch_size, progress),
+        'users': generate_users(random.Random(rng.random()), users, batch_size, progress),
+        'bookings': generate_bookings(random.Random(rng.random()), bookings, end, occupancy, batch_size, progress),
+    }
@@ -0,0 +1,196 @@
+"""
+Slot inventory: covers and tables left per booking slot.
+
+Time is cut into ``BOOKING_SLOT_INTERVAL`` slots, and a booking holds every
+slot its ``BOOKING_DURATION`` overlaps. ``SlotInventory`` keeps one row per
+slot with the covers (seats) and tables still free and a bitmask of the
+tables taken. Bookings take their slots with one conditional ``UPDATE``::
+
+    UPDATE restaurant_slotinventory
+    SET covers_left = covers_left - n, tables_left = tables_left - 1, tables_taken = tables_taken | bit
+    WHERE slot IN (...) AND covers_left >= n AND tables_left >= 1 AND tables_taken & bit = 0
+
+(with ``CASE`` expressions when a batch of bookings needs different amounts
+per slot). If it matches fewer rows than there are slots, the caller's
+transaction or savepoint is rolled back and ``SlotUnavailable`` raised,
+which the views answer with 409. So concurrent requests for the last table
+of a slot never both succeed nor fail on the ``(booking_date,
+table_number)`` constraint, and bookings without a table count against the
+room as well.
+
+``Booking.save`` moves the reservation when a booking is created or its
+date, table or party size changes; deleting a booking releases it
+(``restaurant.signals``). Writes that bypass both, like ``bulk_create`` or
+raw SQL, must reserve themselves or run ``rebuild_inventory`` afterwards.
+
+Rows are created with the dining room of ``RESTAURANT_TABLES`` when a slot
+is first booked; run ``manage.py rebuild_slot_inventory`` after changing it.
+Bookings that don't start on a slot boundary hold the partial slots at both
+ends; ``restaurant.availability`` applies the same rule, so a table it lists
+as free can be reserved. Each table has a bit of the 64-bit mask, so up to
+63 tables can be configured, and bookings of other tables are refused.
+"""
+import math
+from datetime import datetime
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.db.models.lookups import Exact, GreaterThanOrEqual
+from django.utils import timezone
+
+from .availability import booking_duration, restaurant_tables, slot_interval
+from .models import Booking, SlotInventory
+
+MAX_TRACKED_TABLES = 63
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+def dining_room():
+    """Return ``(covers, tables, {table_number: bit})`` for the configured tables."""
+    tables = sorted(restaurant_tables().items())
+    if len(tables) > MAX_TRACKED_TABLES:
+        raise ImproperlyConfigured(f'RESTAURANT_TABLES can hold at most {MAX_TRACKED_TABLES} tables.')
+    bits = {table: 1 << position for position, (table, _) in enumerate(tables)}
+    return sum(seats for _, seats in tables), len(tables), bits
+
+
+def slot_starts(booking_date):
+    """Return the starts of the slots a booking at ``booking_date`` holds."""
+    step = int(slot_interval().total_seconds())
+    start = booking_date.timestamp()
+    end = start + booking_duration().total_seconds()
+    tz = timezone.get_current_timezone()
+    return [datetime.fromtimestamp(moment, tz) for moment in range(int(start // step) * step, math.ceil(end), step)]
+
+
+def _demand(reservations, bits, exclusive=True):
+    """``{slot: [covers, tables, table bits]}`` held by ``reservations``."""
+    demand = {}
+    for booking_date, table_number, guests in reservations:
+        if exclusive and table_number is not None and table_number not in bits:
+            raise SlotUnavailable(f'Table {table_number} does not exist.')
+        bit = bits.get(table_number, 0)
+        for slot in slot_starts(booking_date):
+            counters = demand.setdefault(slot, [0, 0, 0])
+            if exclusive and counters[2] & bit:
+                raise SlotUnavailable(f'Table {table_number} is booked twice around the same time.')
+            counters[0] += guests
+            counters[1] += 1
+            counters[2] |= bit
+    return demand
+
+
+def _per_slot(values):
+    """``values[slot]`` for every row's slot, as a constant when all slots take the same value."""
+    distinct = set(values.values())
+    if len(distinct) == 1:
+        return Value(distinct.pop())
+    return Case(
+        *[When(slot=slot, then=Value(value)) for slot, value in values.items()], output_field=BigIntegerField()
+    )
+
+
+def reserve(reservations, using='default'):
+    """
+    Take the slots of ``reservations``, ``(booking_date, table_number, guests)``
+    tuples, or raise ``SlotUnavailable`` if any of them doesn't fit. Call it
+    in an atomic block and roll that back on ``SlotUnavailable``: some slots
+    may have been taken.
+    """
+    covers, tables, bits = dining_room()
+    demand = _demand(reservations, bits)
+    if not demand:
+        return
+    inventory = SlotInventory.objects.db_manager(using)
+    # Slots nobody has booked yet have no row
+    inventory.bulk_create(
+        [SlotInventory(slot=slot, covers_left=covers, tables_left=tables) for slot in demand],
+        ignore_conflicts=True,
+    )
+    guests = _per_slot({slot: counters[0] for slot, counters in demand.items()})
+    count = _per_slot({slot: counters[1] for slot, counters in demand.items()})
+    taken = _per_slot({slot: counters[2] for slot, counters in demand.items()})
+    updated = (
+        inventory
+        .filter(
+            GreaterThanOrEqual(F('covers_left'), guests),
+            GreaterThanOrEqual(F('tables_left'), count),
+            Exact(F('tables_taken').bitand(taken), 0),
+            slot__in=demand,
+        )
+        .update(
+            covers_left=F('covers_left') - guests,
+            tables_left=F('tables_left') - count,
+            tables_taken=F('tables_taken').bitor(taken),
+        )
+    )
+    if updated != len(demand):
+        if len(reservations) == 1 and reservations[0][1] is not None:
+            raise SlotUnavailable(f'Table {reservations[0][1]} is no longer available around that time.')
+        raise SlotUnavailable('No table is left around that time.')
+
+
+def release(reservations, using='default'):
+    """Give the slots of ``reservations`` back."""
+    demand = _demand(reservations, dining_room()[2], exclusive=False)
+    if not demand:
+        return
+    SlotInventory.objects.db_manager(using).filter(slot__in=demand).update(
+        covers_left=F('covers_left') + _per_slot({slot: counters[0] for slot, counters in demand.items()}),
+        tables_left=F('tables_left') + _per_slot({slot: counters[1] for slot, counters in demand.items()}),
+        tables_taken=F('tables_taken').bitand(_per_slot({slot: ~counters[2] for slot, counters in demand.items()})),
+    )
+
+
+def move_reservation(held, wanted, using='default'):
+    """
+    Release reservation ``held`` and take ``wanted``, either of which may be
+    None, under the same rules as ``reserve``.
+    """
+    if held == wanted:
+        return
+    if held is not None:
+        release([held], using)
+    if wanted is not None:
+        reserve([wanted], using)
+
+
+def rebuild_inventory(since=None, using='default'):
+    """
+    Recompute the inventory of the slots from ``since`` (default: now) on
+    from the bookings, e.g. after changing the dining room. Returns the
+    number of slots with bookings.
+    """
+    covers, tables, bits = dining_room()
+    step = int(slot_interval().total_seconds())
+    since = since or timezone.now()
+    since = datetime.fromtimestamp(int(since.timestamp() // step) * step, timezone.get_current_timezone())
+    bookings = (
+        Booking.objects.using(using)
+        .filter(booking_date__gt=since - booking_duration())
+        .values_list('booking_date', 'table_number', 'no_of_guests')
+        .order_by()
+    )
+    slots = {}
+    for booking_date, table_number, guests in bookings.iterator(chunk_size=10000):
+        bit = bits.get(table_number, 0)
+        for slot in slot_starts(booking_date):
+            if slot >= since:
+                counters = slots.setdefault(slot, [covers, tables, 0])
+                counters[0] -= guests
+                counters[1] -= 1
+                counters[2] |= bit
+    with transaction.atomic(using=using):
+        SlotInventory.objects.using(using).filter(slot__gte=since).delete()
+        SlotInventory.objects.using(using).bulk_create(
+            [
+                SlotInventory(slot=slot, covers_left=covers_left, tables_left=tables_left, tables_taken=taken)
+                for slot, (covers_left, tables_left, taken) in slots.items()
+            ],
+            batch_size=5000,
+        )
+    return len(slots)
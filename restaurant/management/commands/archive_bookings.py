@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from restaurant.archive import archive_after, archive_batch_size, archive_bookings
+
+
+class Command(BaseCommand):
+    help = (
+        'Move bookings that started more than BOOKING_ARCHIVE_AFTER ago into the booking archive, '
+        'in short batched transactions. Meant to run periodically, e.g. nightly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help=f'Archive bookings older than this many days (default: {archive_after().days})',
+        )
+        parser.add_argument('--batch-size', type=int, default=archive_batch_size())
+        parser.add_argument(
+            '--pause', type=float, default=0.05,
+            help='Seconds to sleep between batches, letting bookings through',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        self.verbosity = options['verbosity']
+        after = archive_after() if options['days'] is None else timedelta(days=options['days'])
+        before = timezone.now() - after
+        archived = archive_bookings(
+            before=before,
+            batch_size=options['batch_size'],
+            pause=options['pause'],
+            progress=self.progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived} bookings that started before {before:%Y-%m-%d %H:%M}'
+        ))
+
+    def progress(self, archived):
+        if self.verbosity >= 2:
+            self.stdout.write(f'{archived} archived')
@@ -0,0 +1,27 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from restaurant.menu_io import FORMATS, export_menu
+
+
+class Command(BaseCommand):
+    help = 'Stream the menu to a CSV or NDJSON file (or stdout).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', help='Output file, defaults to stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the output file extension, or csv')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        file_format = options['format'] or (output.rsplit('.', 1)[-1] if output and output.endswith(FORMATS) else 'csv')
+        chunks = export_menu(file_format, chunk_size=options['chunk_size'])
+        if not output:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
+            return
+        with open(output, 'w', encoding='utf-8', newline='') as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f'Exported menu to {output}'))
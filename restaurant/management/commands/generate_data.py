@@ -0,0 +1,54 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.datagen import DEFAULT_BATCH_SIZE, DEFAULT_PASSWORD, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic dataset: menu items, users and bookings. '
+        'The same --seed and sizes always produce the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--menu-items', type=int, default=50)
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--bookings', type=int, default=500)
+        parser.add_argument(
+            '--end', type=date.fromisoformat,
+            help='Last day with bookings, YYYY-MM-DD (default: 30 days from today)',
+        )
+        parser.add_argument(
+            '--occupancy', type=float, default=0.6,
+            help='Chance that a table is booked at the busiest slot, before the weekday factor',
+        )
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not 0 < options['occupancy'] <= 1:
+            raise CommandError('--occupancy must be in (0, 1]')
+        if min(options['menu_items'], options['users'], options['bookings']) < 0:
+            raise CommandError('Sizes must not be negative')
+
+        self.verbosity = options['verbosity']
+        created = generate(
+            seed=options['seed'],
+            menu_items=options['menu_items'],
+            users=options['users'],
+            bookings=options['bookings'],
+            end=options['end'],
+            occupancy=options['occupancy'],
+            batch_size=options['batch_size'],
+            progress=self.progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {created['menu_items']} menu items, {created['users']} users "
+            f"(password {DEFAULT_PASSWORD!r}) and {created['bookings']} bookings"
+        ))
+
+    def progress(self, label, done, total, elapsed):
+        if self.verbosity >= 1:
+            rate = done / elapsed if elapsed else 0
+            self.stdout.write(f'{label}: {done}/{total} ({done * 100 // total}%), {rate:,.0f} rows/s')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.menu_io import DEFAULT_BATCH_SIZE, FORMATS, import_menu, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Upsert menu items from a CSV or NDJSON file, keyed on the item name.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1]
+        if file_format not in FORMATS:
+            raise CommandError(f'Cannot tell the format of {path}, pass --format')
+
+        with open(path, encoding='utf-8-sig', newline='') as handle:
+            summary = import_menu(read_rows(handle, file_format), batch_size=options['batch_size'])
+
+        for error in summary['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {summary['processed']} rows: {summary['imported']} imported, {summary['failed']} failed"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from restaurant.cache import bump_menu_version
+from restaurant.snapshot import rebuild_menu_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the pre-serialized menu snapshot served by the public menu endpoints.'
+
+    def handle(self, *args, **options):
+        # A new version also drops every response cached from the old snapshot
+        snapshot = rebuild_menu_snapshot(bump_menu_version())
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt menu snapshot v{snapshot.version}: {snapshot.count} items in '
+            f'{len(snapshot.categories)} categories, {len(snapshot.raw)} bytes '
+            f'({len(snapshot.gzip)} gzipped)'
+        ))
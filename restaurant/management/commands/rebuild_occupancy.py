@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from restaurant.occupancy import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the occupancy rollups from the bookings and the booking archive, all of them '
+        'or those of the last --days days and the days ahead (a periodic delta job), e.g. after '
+        'writing bookings with raw SQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Only rebuild the days from this many days ago on (default: every day)',
+        )
+
+    def handle(self, *args, **options):
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        start = None
+        if options['days'] is not None:
+            start = timezone.localdate() - timedelta(days=options['days'])
+        rows = rebuild_rollups(start=start)
+        since = '' if start is None else f' from {start} on'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the occupancy rollups{since}: {rows} rows'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from restaurant.inventory import rebuild_inventory
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the covers and tables left per booking slot from the bookings, '
+        'e.g. after changing RESTAURANT_TABLES or writing bookings with raw SQL.'
+    )
+
+    def handle(self, *args, **options):
+        slots = rebuild_inventory()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the slot inventory: {slots} upcoming slots booked'))
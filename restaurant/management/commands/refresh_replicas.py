@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.replicas import refresh_replicas, replica_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the primary database into every SQLite read replica with the online backup API, '
+        'once or every --interval seconds until interrupted.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Refresh the replicas every this many seconds (default: once)',
+        )
+
+    def handle(self, *args, **options):
+        if not replica_aliases():
+            raise CommandError('No read replicas configured (DATABASE_REPLICAS, or SQLITE_REPLICAS=n)')
+        if options['interval'] is not None and options['interval'] <= 0:
+            raise CommandError('--interval must be positive')
+        while True:
+            timings = refresh_replicas()
+            summary = ', '.join(f'{alias} in {seconds * 1000:.0f}ms' for alias, seconds in timings.items())
+            self.stdout.write(self.style.SUCCESS(f'Refreshed {summary or "no SQLite replicas"}'))
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
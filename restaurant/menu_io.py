@@ -0,0 +1,154 @@
+"""
+Streaming menu import/export in CSV and NDJSON.
+
+Imports read the input line by line and upsert it in chunks keyed on the
+unique ``name`` with ``bulk_create(update_conflicts=True)``, so memory stays
+bounded by the chunk size whatever the file size. Existing items only get
+the columns a row has; the others keep their values. Exports stream rows from
+``values_list().iterator()`` without building model instances.
+"""
+import codecs
+import csv
+import json
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .models import Category, Menu
+from .serializers import MenuSerializer
+from .snapshot import invalidate_menu_on_commit
+
+FORMATS = ('csv', 'ndjson')
+FIELDS = ['name', 'description', 'price', 'category', 'available', 'featured']
+EXPORT_COLUMNS = ['name', 'description', 'price', 'category__name', 'available', 'featured']
+UPDATE_FIELDS = ['description', 'price', 'category', 'available', 'featured']
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+class MenuImportSerializer(MenuSerializer):
+    """Validates one imported row; uniqueness is resolved by the upsert itself."""
+
+    class Meta(MenuSerializer.Meta):
+        fields = FIELDS
+        extra_kwargs = {'name': {'validators': []}}
+
+
+# Export
+
+class _Echo:
+    """File-like object whose ``write`` returns the line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def export_menu(file_format, chunk_size=2000):
+    """Yield the menu as ``file_format`` text, one chunk of rows at a time."""
+    rows = (
+        Menu.objects.order_by('category__name', 'name')
+        .values_list(*EXPORT_COLUMNS)
+        .iterator(chunk_size=chunk_size)
+    )
+    buffer = []
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        buffer.append(writer.writerow(FIELDS))
+        encode = writer.writerow
+    else:
+        def encode(row):
+            name, description, price, category, available, featured = row
+            return json.dumps({
+                'name': name, 'description': description, 'price': str(price),
+                'category': category, 'available': available, 'featured': featured,
+            }) + '\n'
+
+    for row in rows:
+        buffer.append(encode(row))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+# Import
+
+def read_rows(stream, file_format):
+    """Yield ``(line_number, row_dict)`` from a text stream."""
+    if file_format == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            row = exc
+        yield line_number, row
+
+
+def text_stream(binary):
+    """Decode a binary file-like object (upload or request body) lazily."""
+    return codecs.getreader('utf-8-sig')(binary)
+
+
+def _upsert(batch):
+    categories = Category.objects.for_names({data['category'] for data in batch.values()})
+    # One statement per set of columns present
+    groups = {}
+    for data in batch.values():
+        groups.setdefault(tuple(field for field in UPDATE_FIELDS if field in data), []).append(data)
+    with transaction.atomic():
+        for fields, rows in groups.items():
+            Menu.objects.bulk_create(
+                [Menu(**{**data, 'category': categories[data['category']]}) for data in rows],
+                update_conflicts=True,
+                unique_fields=['name'],
+                update_fields=[*fields, 'updated_at'],
+            )
+
+
+def import_menu(rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Upsert ``(line_number, row)`` pairs into ``Menu`` and return a summary.
+
+    Invalid rows are skipped and reported (the first ``MAX_REPORTED_ERRORS``
+    of them); valid rows are written every ``batch_size`` rows.
+    """
+    summary = {'processed': 0, 'imported': 0, 'failed': 0, 'errors': []}
+    # One serializer for every row: building the fields dominates the cost
+    # of validating a single row.
+    validator = MenuImportSerializer()
+    batch = {}
+    try:
+        for line_number, row in rows:
+            summary['processed'] += 1
+            try:
+                if not isinstance(row, dict):
+                    raise ValidationError({'non_field_errors': ['Each line must be a JSON object.']})
+                data = validator.run_validation(row)
+            except ValidationError as exc:
+                summary['failed'] += 1
+                if len(summary['errors']) < MAX_REPORTED_ERRORS:
+                    summary['errors'].append({'line': line_number, 'errors': exc.detail})
+                continue
+
+            # Last occurrence of a name wins; an upsert can't touch a row twice
+            batch[data['name']] = data
+            if len(batch) >= batch_size:
+                _upsert(batch)
+                summary['imported'] += len(batch)
+                batch = {}
+        if batch:
+            _upsert(batch)
+            summary['imported'] += len(batch)
+    finally:
+        if summary['imported']:
+            # bulk_create sends no signals
+            invalidate_menu_on_commit()
+    return summary
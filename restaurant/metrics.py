@@ -0,0 +1,323 @@
+"""
+Per-route request metrics in Prometheus text format.
+
+``restaurant.middleware.metrics_middleware`` times every request and files
+it under the name of the URL pattern it resolved to (``menu-list-create``,
+``admin:restaurant_menu_changelist``, ...), together with its status code,
+response size, the number and total time of its database queries and the
+time spent building serializer ``.data``.
+
+Counters are lock-free: every thread updates its own shard, and shards are
+only summed when ``/metrics`` is scraped. Threads that have exited are
+folded into one retired shard on the next scrape or flush.
+
+With ``METRICS_MULTIPROC_DIR`` (or the ``PROMETHEUS_MULTIPROC_DIR``
+environment variable) set, each process also writes its totals to a file in
+that directory at most every ``METRICS_FLUSH_INTERVAL`` seconds and when it
+exits, and ``/metrics`` adds up the files of all processes, so any gunicorn
+worker answers for the whole server. Files of exited workers are kept, as
+their counts are part of the totals.
+
+``/metrics`` is only served to staff users, to clients connecting from
+``METRICS_ALLOWED_IPS`` and to scrapers sending ``METRICS_TOKEN`` as a
+bearer token.
+"""
+import atexit
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+# Any other method is counted as OTHER_METHOD, or clients could add series at will
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+OTHER_METHOD = 'other'
+
+
+class Metric:
+    def __init__(self, name, kind, documentation, labels, buckets=()):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+
+    def zero(self):
+        # Histograms: one count per bucket, one for +Inf, then the sum
+        return [0] * (len(self.buckets) + 2) if self.kind == 'histogram' else [0]
+
+
+REQUESTS = Metric(
+    'http_requests_total', 'counter', 'Requests by route, method and status code.', ('route', 'method', 'status'),
+)
+LATENCY = Metric(
+    'http_request_duration_seconds', 'histogram', 'Request latency by route.', ('route', 'method'), LATENCY_BUCKETS,
+)
+RESPONSE_SIZE = Metric(
+    'http_response_size_bytes', 'histogram', 'Response body size by route.', ('route',), SIZE_BUCKETS,
+)
+DB_QUERIES = Metric(
+    'db_queries_per_request', 'histogram', 'Database queries per request by route.', ('route',), QUERY_BUCKETS,
+)
+DB_TIME = Metric(
+    'db_query_duration_seconds', 'histogram', 'Database time per request by route.', ('route',), LATENCY_BUCKETS,
+)
+SERIALIZER_TIME = Metric(
+    'serializer_duration_seconds', 'histogram', 'Serializer time per request by route.', ('route',), LATENCY_BUCKETS,
+)
+METRICS = {metric.name: metric for metric in (REQUESTS, LATENCY, RESPONSE_SIZE, DB_QUERIES, DB_TIME, SERIALIZER_TIME)}
+
+
+class RequestMetrics:
+    """What one request spent on queries and serializers so far."""
+    __slots__ = ('queries', 'db_time', 'serializer_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+
+
+current_request = ContextVar('current_request', default=None)
+
+
+def merge(into, samples):
+    for key, values in samples:
+        total = into.get(key)
+        if total is None:
+            into[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                total[i] += value
+    return into
+
+
+class Registry:
+    """Sharded per-process totals, keyed by ``(metric name, label values)``."""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()  # shard registration and merging only
+        self._shards = []
+        self._retired = {}
+        self._pid = None
+        self.next_flush = 0.0
+
+    def shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def observe(self, shard, metric, labels, value):
+        key = (metric.name, labels)
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = metric.zero()
+        values[bisect_left(metric.buckets, value)] += 1
+        values[-1] += value
+
+    def inc(self, shard, metric, labels):
+        values = shard.get((metric.name, labels))
+        if values is None:
+            shard[(metric.name, labels)] = [1]
+        else:
+            values[0] += 1
+
+    def local_samples(self):
+        """Totals of this process, retiring the shards of exited threads."""
+        with self._lock:
+            alive = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    alive.append((thread, shard))
+                else:
+                    merge(self._retired, shard.copy().items())
+            self._shards = alive
+            totals = {key: list(values) for key, values in self._retired.items()}
+        for _, shard in alive:
+            # dict.copy() is atomic under the GIL, iterating the live dict is not
+            merge(totals, shard.copy().items())
+        return totals
+
+    def reset(self):
+        with self._lock:
+            for _, shard in self._shards:
+                shard.clear()
+            self._retired.clear()
+
+    # Multiprocess
+
+    def _file_name(self):
+        if self._pid != os.getpid():
+            # Also after a fork: the child starts its own file
+            self._pid = os.getpid()
+            self._file = f'metrics-{self._pid}-{time.time_ns()}.json'
+        return self._file
+
+    def flush(self):
+        """Write this process's totals to the multiprocess directory, if any."""
+        directory = multiproc_dir()
+        if not directory:
+            return
+        self.next_flush = time.perf_counter() + flush_interval()
+        path = os.path.join(directory, self._file_name())
+        samples = [[name, list(labels), values] for (name, labels), values in self.local_samples().items()]
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(samples, file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self):
+        """Totals of every process sharing the multiprocess directory."""
+        totals = self.local_samples()
+        directory = multiproc_dir()
+        if not directory:
+            return totals
+        own = self._file_name()
+        for file_name in os.listdir(directory):
+            if not file_name.startswith('metrics-') or not file_name.endswith('.json') or file_name == own:
+                continue
+            try:
+                with open(os.path.join(directory, file_name)) as file:
+                    samples = json.load(file)
+            except (OSError, ValueError):
+                continue
+            merge(totals, (((name, tuple(labels)), values) for name, labels, values in samples))
+        return totals
+
+
+registry = Registry()
+
+
+def multiproc_dir():
+    return getattr(settings, 'METRICS_MULTIPROC_DIR', None) or os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def flush_interval():
+    return getattr(settings, 'METRICS_FLUSH_INTERVAL', 5)
+
+
+def allowed_networks():
+    return [ipaddress.ip_network(network) for network in getattr(settings, 'METRICS_ALLOWED_IPS', [])]
+
+
+def scrape_allowed(request):
+    """Whether ``request`` may read the metrics."""
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        address = None
+    if address is not None and any(address in network for network in allowed_networks()):
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', None)
+    scheme, _, credentials = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if token and scheme.lower() == 'bearer' and hmac.compare_digest(credentials.encode(), token.encode()):
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_active and user.is_staff
+
+
+atexit.register(registry.flush)
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.view_name
+
+
+def method_name(request):
+    return request.method if request.method in METHODS else OTHER_METHOD
+
+
+def record_request(request, response, record, duration):
+    route = route_name(request)
+    method = method_name(request)
+    shard = registry.shard()
+    registry.inc(shard, REQUESTS, (route, method, str(response.status_code)))
+    registry.observe(shard, LATENCY, (route, method), duration)
+    size = response.get('Content-Length')
+    if size is None and not response.streaming:
+        size = len(response.content)
+    if size is not None:
+        registry.observe(shard, RESPONSE_SIZE, (route,), int(size))
+    registry.observe(shard, DB_QUERIES, (route,), record.queries)
+    registry.observe(shard, DB_TIME, (route,), record.db_time)
+    registry.observe(shard, SERIALIZER_TIME, (route,), record.serializer_time)
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrappers`` entry adding query counts and time to the current request."""
+    record = current_request.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record.queries += 1
+        record.db_time += time.perf_counter() - started
+
+
+def record_serializer_time(duration):
+    record = current_request.get()
+    if record is not None:
+        record.serializer_time += duration
+
+
+# Exposition
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def render(samples):
+    """Format ``{(metric name, labels): values}`` in the Prometheus text format."""
+    by_metric = {}
+    for (name, labels), values in samples.items():
+        by_metric.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, metric in METRICS.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, values in sorted(by_metric.get(name, ())):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(metric.labels, labels)} {_number(values[0])}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*metric.buckets, '+Inf'), values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{name}_bucket{_labels(metric.labels, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labels, labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(metric.labels, labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
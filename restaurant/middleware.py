@@ -0,0 +1,114 @@
+"""
+Middleware for the restaurant project.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+from .compression import compress_response
+from .metrics import RequestMetrics, current_request, record_request, registry
+from .replicas import pin_writer, reset_route, route_request
+
+
+@sync_and_async_middleware
+def asgi_urlconf_middleware(get_response):
+    """
+    Resolve ASGI requests against ``settings.ASGI_URLCONF``, when set, which
+    routes the hot read endpoints to the async views. WSGI requests, and all
+    requests when it isn't set, pass through untouched.
+
+    Written as a native async middleware: ``MiddlewareMixin`` would run it in
+    a worker thread on every ASGI request.
+    """
+    urlconf = getattr(settings, 'ASGI_URLCONF', None)
+    if not urlconf or not iscoroutinefunction(get_response):
+        return get_response
+
+    async def middleware(request):
+        request.urlconf = urlconf
+        return await get_response(request)
+
+    return middleware
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record latency, status, response size, query count/time and serializer
+    time of every request under its route name (see ``restaurant.metrics``).
+
+    Goes first in ``MIDDLEWARE`` so the other middleware are timed too.
+    """
+    def finish(request, response, record, token, started):
+        finished = time.perf_counter()
+        current_request.reset(token)
+        record_request(request, response, record, finished - started)
+        if finished >= registry.next_flush:
+            registry.flush()
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            started = time.perf_counter()
+            record = RequestMetrics()
+            token = current_request.set(record)
+            response = await get_response(request)
+            finish(request, response, record, token, started)
+            return response
+    else:
+        def middleware(request):
+            started = time.perf_counter()
+            record = RequestMetrics()
+            token = current_request.set(record)
+            response = get_response(request)
+            finish(request, response, record, token, started)
+            return response
+
+    return middleware
+
+
+@sync_and_async_middleware
+def compression_middleware(get_response):
+    """
+    gzip responses for clients that accept it (see ``restaurant.compression``).
+
+    Goes right after ``metrics_middleware``, which then records the size sent.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return compress_response(request, await get_response(request))
+    else:
+        def middleware(request):
+            return compress_response(request, get_response(request))
+
+    return middleware
+
+
+@sync_and_async_middleware
+def replica_middleware(get_response):
+    """
+    Send the reads of safe-method API requests to a read replica and pin
+    clients that wrote to the primary (see ``restaurant.replicas``).
+
+    Async ORM calls run in threads that copy the request's context, so they
+    read from the same database.
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = route_request(request)
+            try:
+                response = await get_response(request)
+            finally:
+                reset_route(token)
+            return pin_writer(request, response)
+    else:
+        def middleware(request):
+            token = route_request(request)
+            try:
+                response = get_response(request)
+            finally:
+                reset_route(token)
+            return pin_writer(request, response)
+
+    return middleware
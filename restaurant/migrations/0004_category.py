@@ -0,0 +1,96 @@
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils.text import slugify
+
+
+def create_categories(apps, schema_editor):
+    Category = apps.get_model('restaurant', 'Category')
+    Menu = apps.get_model('restaurant', 'Menu')
+    categories = {}
+    names = Menu.objects.order_by('category').values_list('category', flat=True).distinct()
+    for name in names:
+        # Names differing only in case or punctuation become one category
+        slug = slugify(name) or 'uncategorized'
+        if slug not in categories:
+            categories[slug] = Category.objects.create(
+                name=name or 'Uncategorized', slug=slug, sort_order=len(categories)
+            )
+        Menu.objects.filter(category=name).update(category_ref=categories[slug])
+
+
+def restore_category_names(apps, schema_editor):
+    Category = apps.get_model('restaurant', 'Category')
+    Menu = apps.get_model('restaurant', 'Menu')
+    for category in Category.objects.all():
+        Menu.objects.filter(category_ref=category).update(category=category.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0003_booking_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('slug', models.SlugField(max_length=100, unique=True)),
+                ('sort_order', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'ordering': ['sort_order', 'name'],
+                'indexes': [models.Index(fields=['sort_order', 'name'], name='category_order_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='menu',
+            name='category_ref',
+            field=models.ForeignKey(
+                db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT,
+                related_name='+', to='restaurant.category',
+            ),
+        ),
+        migrations.RunPython(create_categories, restore_category_names),
+        # Lets the column be re-added with a default when migrating backwards
+        migrations.AlterField(
+            model_name='menu',
+            name='category',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='menu',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='menu',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='menu',
+            name='category',
+            field=models.ForeignKey(
+                db_index=False, on_delete=django.db.models.deletion.PROTECT,
+                related_name='items', to='restaurant.category',
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name='menu',
+            options={'ordering': ['category__name', 'name']},
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(fields=['category', 'available'], name='menu_category_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='menu',
+            index=models.Index(
+                condition=models.Q(('available', True), ('featured', True)),
+                fields=['name'], name='menu_featured_available_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,89 @@
+from django.db import migrations
+
+# restaurant.search as of this migration
+TABLE = 'restaurant_menu_fts'
+
+CREATE_TABLE = """
+CREATE VIRTUAL TABLE IF NOT EXISTS restaurant_menu_fts USING fts5(
+    name, description, category,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+TRIGGERS = {
+    'restaurant_menu_fts_insert': """
+        CREATE TRIGGER IF NOT EXISTS restaurant_menu_fts_insert
+        AFTER INSERT ON restaurant_menu BEGIN
+            INSERT INTO restaurant_menu_fts (rowid, name, description, category)
+            SELECT NEW.id, NEW.name, NEW.description, name
+            FROM restaurant_category WHERE id = NEW.category_id;
+        END
+    """,
+    'restaurant_menu_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS restaurant_menu_fts_update
+        AFTER UPDATE OF name, description, category_id ON restaurant_menu
+        WHEN OLD.name IS NOT NEW.name
+            OR OLD.description IS NOT NEW.description
+            OR OLD.category_id IS NOT NEW.category_id
+        BEGIN
+            DELETE FROM restaurant_menu_fts WHERE rowid = OLD.id;
+            INSERT INTO restaurant_menu_fts (rowid, name, description, category)
+            SELECT NEW.id, NEW.name, NEW.description, name
+            FROM restaurant_category WHERE id = NEW.category_id;
+        END
+    """,
+    'restaurant_menu_fts_delete': """
+        CREATE TRIGGER IF NOT EXISTS restaurant_menu_fts_delete
+        AFTER DELETE ON restaurant_menu BEGIN
+            DELETE FROM restaurant_menu_fts WHERE rowid = OLD.id;
+        END
+    """,
+    'restaurant_category_fts_update': """
+        CREATE TRIGGER IF NOT EXISTS restaurant_category_fts_update
+        AFTER UPDATE OF name ON restaurant_category
+        WHEN OLD.name IS NOT NEW.name
+        BEGIN
+            UPDATE restaurant_menu_fts SET category = NEW.name
+            WHERE rowid IN (SELECT id FROM restaurant_menu WHERE category_id = NEW.id);
+        END
+    """,
+}
+
+REBUILD = """
+INSERT INTO restaurant_menu_fts (rowid, name, description, category)
+SELECT menu.id, menu.name, menu.description, category.name
+FROM restaurant_menu AS menu JOIN restaurant_category AS category ON category.id = menu.category_id
+"""
+
+
+def install(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(REBUILD)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0004_category'),
+    ]
+
+    operations = [
+        # FTS5 virtual table and sync triggers, see restaurant.search
+        migrations.RunPython(install, uninstall),
+    ]
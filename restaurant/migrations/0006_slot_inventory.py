@@ -0,0 +1,73 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:13
+
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_inventory(apps, schema_editor):
+    # restaurant.inventory.rebuild_inventory as of this migration, over the
+    # historical models
+    using = schema_editor.connection.alias
+    Booking = apps.get_model('restaurant', 'Booking')
+    SlotInventory = apps.get_model('restaurant', 'SlotInventory')
+    tables = sorted(getattr(settings, 'RESTAURANT_TABLES', {1: 2, 2: 2, 3: 4, 4: 4, 5: 4, 6: 4, 7: 6, 8: 6, 9: 8, 10: 10}).items())
+    bits = {table: 1 << position for position, (table, _) in enumerate(tables[:63])}
+    covers = sum(seats for _, seats in tables)
+    duration = getattr(settings, 'BOOKING_DURATION', timedelta(hours=2)).total_seconds()
+    step = int(getattr(settings, 'BOOKING_SLOT_INTERVAL', timedelta(minutes=30)).total_seconds())
+    tz = timezone.get_current_timezone()
+    since = datetime.fromtimestamp(int(timezone.now().timestamp() // step) * step, tz)
+
+    bookings = (
+        Booking.objects.using(using)
+        .filter(booking_date__gt=since - timedelta(seconds=duration))
+        .values_list('booking_date', 'table_number', 'no_of_guests')
+        .order_by()
+    )
+    slots = {}
+    for booking_date, table_number, guests in bookings.iterator(chunk_size=10000):
+        start = booking_date.timestamp()
+        for moment in range(int(start // step) * step, math.ceil(start + duration), step):
+            slot = datetime.fromtimestamp(moment, tz)
+            if slot >= since:
+                counters = slots.setdefault(slot, [covers, len(tables), 0])
+                counters[0] -= guests
+                counters[1] -= 1
+                counters[2] |= bits.get(table_number, 0)
+    SlotInventory.objects.using(using).bulk_create(
+        [
+            SlotInventory(slot=slot, covers_left=covers_left, tables_left=tables_left, tables_taken=taken)
+            for slot, (covers_left, tables_left, taken) in slots.items()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_menu_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotInventory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.DateTimeField(unique=True)),
+                ('covers_left', models.IntegerField()),
+                ('tables_left', models.IntegerField()),
+                ('tables_taken', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'slot inventories',
+                'ordering': ['slot'],
+            },
+        ),
+        # Upcoming bookings take their slots, see restaurant.inventory
+        migrations.RunPython(build_inventory, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.6 on 2026-10-18 02:50
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+
+
+def build_rollups(apps, schema_editor):
+    # restaurant.occupancy.rebuild_rollups as of this migration, over the
+    # historical models
+    using = schema_editor.connection.alias
+    counts = Counter()
+    for name in ('Booking', 'BookingArchive'):
+        rows = (
+            apps.get_model('restaurant', name).objects.using(using).order_by()
+            .annotate(day=TruncDate('booking_date'), hour=ExtractHour('booking_date'), table=Coalesce('table_number', 0))
+            .values_list('day', 'hour', 'table', 'no_of_guests')
+            .annotate(bookings=Count('id'))
+        )
+        for day, hour, table, guests, bookings in rows:
+            counts[day, hour, table, guests] += bookings
+    OccupancyRollup = apps.get_model('restaurant', 'OccupancyRollup')
+    OccupancyRollup.objects.using(using).bulk_create(
+        [
+            OccupancyRollup(date=day, hour=hour, table_number=table, guests=guests, bookings=bookings)
+            for (day, hour, table, guests), bookings in counts.items()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0007_booking_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OccupancyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('table_number', models.PositiveIntegerField()),
+                ('guests', models.PositiveIntegerField()),
+                ('bookings', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'hour', 'table_number', 'guests'],
+                'unique_together': {('date', 'hour', 'table_number', 'guests')},
+            },
+        ),
+        # Existing and archived bookings, see restaurant.occupancy
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
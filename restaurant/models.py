@@ -1,19 +1,91 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Q
 from django.contrib.auth.models import User
+from django.utils.text import slugify
+
+
+class CategoryManager(models.Manager):
+    def for_names(self, names):
+        """
+        Return ``{name: Category}`` for ``names``, creating missing categories
+        at the end of the sort order.
+
+        Names are also matched through their slug, so "pizza" and "Pizza" are
+        the same category.
+        """
+        slugs = {name: slugify(name) for name in names}
+
+        def lookup():
+            found = {}
+            for category in self.filter(Q(name__in=slugs) | Q(slug__in=slugs.values())):
+                found[category.name] = found[category.slug] = category
+            return {name: found.get(name) or found.get(slug) for name, slug in slugs.items()}
+
+        categories = lookup()
+        missing = {slugs[name]: name for name, category in categories.items() if category is None}
+        if missing:
+            last = self.aggregate(last=models.Max('sort_order'))['last']
+            start = 0 if last is None else last + 1
+            # A concurrent import may have created some of them meanwhile
+            self.bulk_create(
+                [
+                    self.model(name=name, slug=slug, sort_order=start + offset)
+                    for offset, (slug, name) in enumerate(sorted(missing.items()))
+                ],
+                ignore_conflicts=True,
+            )
+            categories = lookup()
+        return categories
+
+    def for_name(self, name):
+        return self.for_names([name])[name]
+
+
+class Category(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    slug = models.SlugField(max_length=100, unique=True)
+    sort_order = models.PositiveIntegerField(default=0)
+
+    objects = CategoryManager()
+
+    class Meta:
+        ordering = ['sort_order', 'name']
+        verbose_name_plural = 'categories'
+        indexes = [
+            # The category list is read from this index alone
+            models.Index(fields=['sort_order', 'name'], name='category_order_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = slugify(self.name)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return self.name
 
 
 class Menu(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
-    category = models.CharField(max_length=100)
+    # Indexed through menu_category_available_idx
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='items', db_index=False)
     available = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
-        ordering = ['category', 'name']
+        ordering = ['category__name', 'name']
+        indexes = [
+            models.Index(fields=['category', 'available'], name='menu_category_available_idx'),
+            # Partial: Django filters booleans as bare `WHERE "featured"`
+            # terms, which SQLite can't look up in a (featured, available) index
+            models.Index(
+                fields=['name'], condition=Q(featured=True, available=True), name='menu_featured_available_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} - ${self.price}"
@@ -28,12 +100,127 @@ class Booking(models.Model):
     table_number = models.PositiveIntegerField(null=True, blank=True)
     special_requests = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
 
     class Meta:
         ordering = ['booking_date']
         unique_together = ['booking_date', 'table_number']
+        indexes = [
+            # Keyset pagination over the booking list
+            models.Index(fields=['booking_date', 'id'], name='booking_date_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_name} - {self.booking_date.strftime('%Y-%m-%d %H:%M')} ({self.no_of_guests} guests)"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the booking holds in the slot inventory, released when it moves
+        if not instance.get_deferred_fields() & {'booking_date', 'table_number', 'no_of_guests'}:
+            instance._held = instance.reservation()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        if fields is None or {'booking_date', 'table_number', 'no_of_guests'} & set(fields):
+            self.__dict__.pop('_held', None)
+
+    def reservation(self):
+        return (self.booking_date, self.table_number, self.no_of_guests)
+
+    def save(self, *args, **kwargs):
+        # Circular: the inventory needs the dining room settings of .availability
+        from .inventory import move_reservation
+
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        if self._state.adding:
+            held = None
+        elif hasattr(self, '_held'):
+            held = self._held
+        else:
+            held = type(self)._base_manager.using(using).filter(pk=self.pk).values_list(
+                'booking_date', 'table_number', 'no_of_guests'
+            ).first()
+        # Loads deferred fields, which forgets _held
+        wanted = self.reservation()
+        # Still what it holds until the save is done, and what post_save
+        # handlers move the occupancy rollups from
+        self._held = held
+        if held == wanted:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic(using=using):
+                move_reservation(held, wanted, using)
+                super().save(*args, **kwargs)
+        self._held = wanted
+
+
+class SlotInventory(models.Model):
+    """Covers and tables left in one booking slot, see ``restaurant.inventory``."""
+    slot = models.DateTimeField(unique=True)
+    covers_left = models.IntegerField()
+    tables_left = models.IntegerField()
+    # One bit per table, in RESTAURANT_TABLES order
+    tables_taken = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['slot']
+        verbose_name_plural = 'slot inventories'
+
+    def __str__(self):
+        return f"{self.slot:%Y-%m-%d %H:%M}: {self.covers_left} covers, {self.tables_left} tables left"
+
+
+class OccupancyRollup(models.Model):
+    """Bookings starting in one hour at one table, per party size, see ``restaurant.occupancy``."""
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    # 0 for bookings without a table
+    table_number = models.PositiveIntegerField()
+    guests = models.PositiveIntegerField()
+    bookings = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['date', 'hour', 'table_number', 'guests']
+        unique_together = ['date', 'hour', 'table_number', 'guests']
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02}h, table {self.table_number}: {self.bookings} x {self.guests} guests"
+
+
+class BookingArchive(models.Model):
+    """A past booking moved out of ``Booking``, see ``restaurant.archive``."""
+    # The id it had as a Booking, which SQLite never hands out again
+    id = models.BigIntegerField(primary_key=True)
+    customer_name = models.CharField(max_length=255)
+    customer_email = models.EmailField()
+    customer_phone = models.CharField(max_length=20, blank=True)
+    no_of_guests = models.PositiveIntegerField()
+    booking_date = models.DateTimeField()
+    table_number = models.PositiveIntegerField(null=True, blank=True)
+    special_requests = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='archived_bookings')
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['booking_date']
+        indexes = [
+            models.Index(fields=['booking_date', 'id'], name='booking_archive_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.customer_name} - {self.booking_date.strftime('%Y-%m-%d %H:%M')} ({self.no_of_guests} guests)"
+
+
+class UserChange(models.Model):
+    """When a user last changed, for revoking cached token users, see ``restaurant.authentication``."""
+    # Not a foreign key: deleting the user must not delete the record of it
+    user_id = models.BigIntegerField(primary_key=True)
+    changed_at = models.FloatField()
+
+    def __str__(self):
+        return f"user {self.user_id} changed at {self.changed_at}"
@@ -0,0 +1,177 @@
+"""
+Occupancy rollups for the staff reports.
+
+Covers per day and hour, table utilization and party sizes used to mean
+aggregating over every booking of the period. ``OccupancyRollup`` keeps one
+row per (date, hour, table, party size) with the number of bookings starting
+then, in the restaurant's time zone, so a report reads at most one row per
+hour, table and party size of its period however many bookings there are.
+
+The rollups follow every booking written through the ORM: ``post_save`` and
+``post_delete`` (``restaurant.signals``) move a booking's count from its old
+key to its new one, and the bulk endpoint, which bypasses both, does the
+same for its batch. Each change is one ``INSERT ... ON CONFLICT DO UPDATE``
+that adds to the counters, in the transaction of the booking write.
+
+Archiving bookings leaves their rollups alone, as the reports cover history
+too. Writes that bypass the ORM, like ``generate_data``'s, must run
+``rebuild_rollups`` afterwards (``manage.py rebuild_occupancy``, which also
+takes a date range for a periodic job re-checking recent days).
+"""
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+from django.db import connections, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, ExtractHour, TruncDate
+from django.utils import timezone
+
+from .availability import booking_duration, opening_hours, restaurant_tables
+from .models import Booking, BookingArchive, OccupancyRollup
+
+
+def rollup_key(reservation):
+    """``(date, hour, table_number, guests)`` of a ``(booking_date, table_number, guests)`` reservation."""
+    booking_date, table_number, guests = reservation
+    local = timezone.localtime(booking_date)
+    return local.date(), local.hour, table_number or 0, guests
+
+
+def update_rollups(removed=(), added=(), using='default'):
+    """Count the ``added`` reservations in the rollups and uncount the ``removed`` ones."""
+    deltas = Counter()
+    for reservation in removed:
+        if reservation is not None:
+            deltas[rollup_key(reservation)] -= 1
+    for reservation in added:
+        if reservation is not None:
+            deltas[rollup_key(reservation)] += 1
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    columns = ['date', 'hour', 'table_number', 'guests', 'bookings']
+    key = ', '.join(qn(column) for column in columns[:-1])
+    params = []
+    for (day, hour, table_number, guests), delta in deltas.items():
+        params += [connection.ops.adapt_datefield_value(day), hour, table_number, guests, delta]
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * len(deltas))
+    bookings = qn('bookings')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {qn(OccupancyRollup._meta.db_table)} ({key}, {bookings}) VALUES {values} '
+            f'ON CONFLICT ({key}) DO UPDATE SET {bookings} = {bookings} + excluded.{bookings}',
+            params,
+        )
+
+
+def move_rollup(held, wanted, using='default'):
+    """Move one booking's count from reservation ``held`` to ``wanted``, either of which may be None."""
+    if held != wanted:
+        update_rollups([held], [wanted], using)
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _counts(model, start, end, using):
+    bookings = model.objects.using(using).order_by()
+    if start is not None:
+        bookings = bookings.filter(booking_date__gte=_day_start(start))
+    if end is not None:
+        bookings = bookings.filter(booking_date__lt=_day_start(end + timedelta(days=1)))
+    rows = (
+        bookings
+        .annotate(day=TruncDate('booking_date'), hour=ExtractHour('booking_date'), table=Coalesce('table_number', 0))
+        .values_list('day', 'hour', 'table', 'no_of_guests')
+        .annotate(bookings=Count('id'))
+    )
+    return Counter({(day, hour, table, guests): count for day, hour, table, guests, count in rows})
+
+
+def rebuild_rollups(start=None, end=None, using='default'):
+    """
+    Recompute the rollups of the days from ``start`` to ``end`` (inclusive,
+    default: all of them) from the bookings and the booking archive. Returns
+    the number of rollup rows.
+    """
+    counts = _counts(Booking, start, end, using) + _counts(BookingArchive, start, end, using)
+    rollups = OccupancyRollup.objects.using(using)
+    with transaction.atomic(using=using):
+        stale = rollups.all()
+        if start is not None:
+            stale = stale.filter(date__gte=start)
+        if end is not None:
+            stale = stale.filter(date__lte=end)
+        stale.delete()
+        rollups.bulk_create(
+            [
+                OccupancyRollup(date=day, hour=hour, table_number=table, guests=guests, bookings=count)
+                for (day, hour, table, guests), count in counts.items()
+            ],
+            batch_size=5000,
+        )
+    return len(counts)
+
+
+def _open_hours_per_day():
+    opens, closes = opening_hours()
+    day = date(2000, 1, 1)
+    return (datetime.combine(day, closes) - datetime.combine(day, opens)).total_seconds() / 3600
+
+
+def occupancy_report(start, end, using='default'):
+    """
+    Covers per day and hour, table utilization and party sizes of the bookings
+    on the days from ``start`` to ``end``, read from the rollups only.
+
+    Utilization is the share of a table's opening hours its bookings held it
+    for, each booking counting ``BOOKING_DURATION``.
+    """
+    rollups = OccupancyRollup.objects.using(using).filter(date__gte=start, date__lte=end, bookings__gt=0)
+    # covers first: once annotated, 'bookings' names the sum
+    totals = {'covers': Sum(F('bookings') * F('guests')), 'bookings': Sum('bookings')}
+
+    days = {}
+    for row in rollups.values('date', 'hour').annotate(**totals).order_by('date', 'hour'):
+        day = days.setdefault(row['date'], {'date': row['date'].isoformat(), 'bookings': 0, 'covers': 0, 'hours': []})
+        day['bookings'] += row['bookings']
+        day['covers'] += row['covers']
+        day['hours'].append({'hour': row['hour'], 'bookings': row['bookings'], 'covers': row['covers']})
+
+    open_hours = ((end - start).days + 1) * _open_hours_per_day()
+    held_hours = booking_duration() / timedelta(hours=1)
+    seats = restaurant_tables()
+    booked = {
+        row['table_number']: row
+        for row in rollups.values('table_number').annotate(**totals).order_by('table_number')
+    }
+    tables = []
+    for table_number in sorted(set(seats) | (set(booked) - {0})):
+        row = booked.get(table_number, {'bookings': 0, 'covers': 0})
+        tables.append({
+            'table_number': table_number,
+            'seats': seats.get(table_number),
+            'bookings': row['bookings'],
+            'covers': row['covers'],
+            'utilization': round(row['bookings'] * held_hours / open_hours, 4) if open_hours else None,
+        })
+    unassigned = booked.get(0, {'bookings': 0, 'covers': 0})
+
+    party_sizes = [
+        {'guests': row['guests'], 'bookings': row['bookings']}
+        for row in rollups.values('guests').annotate(bookings=Sum('bookings')).order_by('guests')
+    ]
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'bookings': sum(day['bookings'] for day in days.values()),
+        'covers': sum(day['covers'] for day in days.values()),
+        'days': list(days.values()),
+        'tables': tables,
+        'unassigned': {'bookings': unassigned['bookings'], 'covers': unassigned['covers']},
+        'party_sizes': party_sizes,
+    }
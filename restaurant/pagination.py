@@ -0,0 +1,265 @@
+"""
+Keyset (cursor) pagination.
+
+Page number pagination needs a ``COUNT(*)`` and an ``OFFSET`` scan, so deep
+pages get slower as tables grow. Keyset pagination instead remembers the
+ordering key of the last row it returned and asks for the rows after it,
+which is one index range scan no matter how deep the page is.
+
+List endpoints keep page numbers by default; passing ``?cursor=`` (empty for
+the first page) switches to keyset mode.
+
+Pages cached beyond the request (the menu list) set ``base_url`` to a
+``canonical_url``, so their links don't carry whatever else the first
+client happened to put in the query string.
+"""
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.core.exceptions import ValidationError
+from django.db.models import Max, Min, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def canonical_url(request, params):
+    """
+    The absolute URL of ``request`` with its query string rebuilt from the
+    ``(name, value)`` pairs in ``params``, leaving out ``None`` values.
+    """
+    url = request.build_absolute_uri(request.path)
+    query = urlencode([(name, value) for name, value in params if value is not None])
+    return f'{url}?{query}' if query else url
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate on the tuple of ``ordering`` fields, whose last field must be unique.
+
+    Works on querysets and on lists of already serialized dicts sorted by
+    ``ordering`` (such as the menu snapshot).
+    """
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('id',)
+    cursor_query_param = 'cursor'
+    total_query_param = 'include_total'
+    invalid_cursor_message = 'Invalid cursor'
+    # The URL the links point at, the request's by default
+    base_url = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        if self.base_url is None:
+            self.base_url = request.build_absolute_uri()
+        self.reverse, position = self.decode_cursor(request)
+        if position is not None:
+            position = self.position_values(queryset, position)
+
+        if isinstance(queryset, list):
+            rows, self.total = self.slice_list(queryset, position)
+        else:
+            rows, self.total = self.slice_queryset(queryset, position)
+
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first_key = self.row_key(rows[0]) if rows else None
+        self.last_key = self.row_key(rows[-1]) if rows else None
+        return rows
+
+    def row_key(self, row):
+        if isinstance(row, dict):
+            return tuple(row[field] for field in self.ordering)
+        return tuple(getattr(row, field) for field in self.ordering)
+
+    # Page selection
+
+    def slice_queryset(self, queryset, position):
+        total = self.get_total(queryset)
+        descending = [f'-{field}' for field in self.ordering]
+        queryset = queryset.order_by(*(descending if self.reverse else self.ordering))
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        return list(queryset[:self.page_size + 1]), total
+
+    def keyset_filter(self, values):
+        """
+        Build ``(a, b, c) > (x, y, z)`` as ``a >= x AND (a > x OR (a = x AND ...))``.
+
+        The leading inequality on the first field lets SQLite turn the lookup
+        into an index range scan.
+        """
+        op = 'lt' if self.reverse else 'gt'
+        first = self.ordering[0]
+        expanded = Q()
+        for i, field in enumerate(self.ordering):
+            equal = {prefix: value for prefix, value in zip(self.ordering[:i], values[:i])}
+            expanded |= Q(**equal, **{f'{field}__{op}': values[i]})
+        return Q(**{f'{first}__{op}e': values[0]}) & expanded
+
+    def slice_list(self, items, position):
+        total = len(items) if self.include_total() else None
+        if self.reverse:
+            end = len(items) if position is None else bisect_left(items, tuple(position), key=self.row_key)
+            rows = items[max(0, end - self.page_size - 1):end]
+            rows.reverse()
+        else:
+            start = 0 if position is None else bisect_right(items, tuple(position), key=self.row_key)
+            rows = items[start:start + self.page_size + 1]
+        return rows, total
+
+    def include_total(self):
+        return self.request.query_params.get(self.total_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_total(self, queryset):
+        """
+        Return an approximate row count when ``?include_total=true`` is given.
+
+        An unfiltered table is estimated from its primary key range, which is
+        read from the ends of the rowid b-tree instead of counting every row.
+        """
+        if not self.include_total():
+            return None
+        if not queryset.query.where:
+            # Two queries: SQLite only applies its min/max optimisation when
+            # the aggregate is alone in the statement.
+            low = queryset.order_by().aggregate(low=Min('pk'))['low']
+            if low is None:
+                return 0
+            return queryset.order_by().aggregate(high=Max('pk'))['high'] - low + 1
+        return queryset.count()
+
+    # Cursors
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            direction, position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if direction not in ('n', 'p') or len(position) != len(self.ordering):
+                raise ValueError
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return direction == 'p', position
+
+    def position_values(self, rows, position):
+        """
+        Convert a decoded cursor position to the types of the ``ordering``
+        fields, raising ``NotFound`` for values that can't be compared to them.
+        """
+        try:
+            if isinstance(rows, list):
+                # Serialized rows: values must match the first row's key
+                if rows and any(type(value) is not type(key) for value, key in zip(position, self.row_key(rows[0]))):
+                    raise TypeError
+                return position
+            values = [
+                rows.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+            if None in values:
+                raise ValueError
+            return values
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _encode_value(value):
+        # Keep full microsecond precision, unlike DjangoJSONEncoder, or rows
+        # sharing a millisecond would be skipped.
+        if isinstance(value, (date, datetime, time)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f'Cannot encode {type(value).__name__} in a cursor')
+
+    def encode_cursor(self, direction, key):
+        payload = json.dumps([direction, list(key)], default=self._encode_value, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or self.last_key is None:
+            return None
+        return self.encode_cursor('n', self.last_key)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.first_key is None:
+            return replace_query_param(self.base_url, self.cursor_query_param, '')
+        return self.encode_cursor('p', self.first_key)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total is not None:
+            payload = {'count': self.total, **payload}
+        return Response(payload)
+
+
+class KeysetOrPageNumberPagination(PageNumberPagination):
+    """Page number pagination that switches to keyset mode when ``?cursor=`` is present."""
+    keyset_ordering = ('id',)
+    # The URL the links point at, the request's by default
+    base_url = None
+
+    def query_params(self, request):
+        """The ``(name, value)`` pairs of ``request``'s query string that select the page."""
+        return [
+            (name, request.query_params.get(name))
+            for name in (self.page_query_param, KeysetPagination.cursor_query_param, KeysetPagination.total_query_param)
+        ]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination()
+            self.keyset.ordering = self.keyset_ordering
+            self.keyset.page_size = self.get_page_size(request) or self.page_size
+            self.keyset.base_url = self.base_url
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_next_link(self):
+        if self.base_url is None or not self.page.has_next():
+            return super().get_next_link()
+        return replace_query_param(self.base_url, self.page_query_param, self.page.next_page_number())
+
+    def get_previous_link(self):
+        if self.base_url is None or not self.page.has_previous():
+            return super().get_previous_link()
+        page_number = self.page.previous_page_number()
+        if page_number == 1:
+            return remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(self.base_url, self.page_query_param, page_number)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class BookingPagination(KeysetOrPageNumberPagination):
+    keyset_ordering = ('booking_date', 'id')
+
+
+class MenuPagination(KeysetOrPageNumberPagination):
+    keyset_ordering = ('category', 'name')
@@ -0,0 +1,71 @@
+"""
+JSON renderer and parser backed by orjson, when it is installed.
+
+DRF's ``JSONRenderer`` and ``JSONParser`` go through the stdlib ``json``
+module, which calls back into Python for every ``Decimal`` and ``datetime``
+and decodes request bodies through a text stream. ``FastJSONRenderer`` and
+``FastJSONParser`` produce and accept exactly the same documents with orjson,
+which serializes dates natively (``Z`` for UTC, as DRF writes them) and
+reads bytes directly. Anything orjson can't do, such as integers beyond 64
+bits, indented output or non-UTF-8 bodies, goes through DRF's classes, and
+so does everything when orjson isn't installed (``pip install orjson``).
+
+Differences: floats Python writes in exponent form lose the ``+``
+(``1e16``, not ``1e+16``), and NaN and infinite floats render as ``null``
+where DRF raises ``ValueError``. The API itself sends no floats.
+"""
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Types orjson leaves to Python: Decimal (as a float, like DRF), lazy
+# strings, timedeltas, querysets...
+_default = JSONEncoder().default
+
+LINE_SEPARATOR, PARAGRAPH_SEPARATOR = '\u2028'.encode(), '\u2029'.encode()
+# orjson reads integers beyond 64 bits as floats; json keeps them exact
+LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like DRF does, to keep the output a JavaScript subset
+        if LINE_SEPARATOR in ret or PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028').replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if LONG_NUMBER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # DRF's error message, or lone surrogates json accepts
+            return super().parse(io.BytesIO(body), media_type, parser_context)
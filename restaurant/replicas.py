@@ -0,0 +1,244 @@
+"""
+Read replicas for the API's GET traffic.
+
+``DATABASE_REPLICAS`` lists database aliases holding copies of ``default``.
+``replica_middleware`` (see ``restaurant.middleware``) sends the reads of
+safe-method requests to the restaurant API to one of them, picked at random
+per request, through ``ReplicaRouter``. Only the restaurant's models are read
+there, and writes always go to ``default``.
+
+A replica lags behind, so:
+
+- a client that wrote anything is pinned to the primary for
+  ``REPLICA_PIN_SECONDS``, and reads its own writes: by a cookie, and by its
+  user in the default cache when it is authenticated, which also covers
+  token clients that don't keep cookies (with several workers, the cache
+  must be shared between them, like the menu cache);
+- whatever is cached beyond the request under a version bumped by writes
+  (menu payloads and snapshot, the availability index, token users) is
+  built from the primary inside ``use_primary()``, or a stale replica read
+  would be served for the whole version.
+
+For SQLite, ``SQLITE_REPLICAS`` in the environment adds file copies of the
+database (see settings), which ``refresh_replicas`` overwrites with the
+online backup API, e.g. every few seconds with
+``manage.py refresh_replicas --interval 5``. Each copy records when it was
+taken, and ``replica_lag`` reports its age, served by the replica health
+endpoint.
+"""
+import functools
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.urls import reverse
+
+DEFAULT_PIN_SECONDS = 15
+DEFAULT_MAX_LAG = 30
+PIN_COOKIE = 'pin_primary'
+PIN_KEY_PREFIX = 'replica-pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STATUS_TABLE = 'replica_status'
+REPLICATED_APPS = {'restaurant'}
+
+# Where the current request reads from, None for the primary
+_route = ContextVar('route', default=None)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', DEFAULT_PIN_SECONDS)
+
+
+def max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG', DEFAULT_MAX_LAG)
+
+
+class ReplicaRouter:
+    """Reads go where ``replica_middleware`` decided, writes and migrations to the primary."""
+
+    def db_for_read(self, model, **hints):
+        # Sessions and users stay on the primary: a client that just logged in
+        # would not be found on a replica yet
+        if model._meta.app_label not in REPLICATED_APPS:
+            return None
+        route = _route.get()
+        return None if route is None else route.read_alias()
+
+    def db_for_write(self, model, **hints):
+        # Not the instance's database: it may have been read from a replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+@contextmanager
+def use_primary():
+    """Read from the primary in this block, e.g. to fill a cache shared beyond the request."""
+    token = _route.set(None)
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+@functools.cache
+def _api_prefix():
+    return reverse('api-overview')
+
+
+def is_pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _pin_key(user):
+    return f'{PIN_KEY_PREFIX}:{user.pk}'
+
+
+def _authenticated_user(request):
+    user = getattr(request, 'user', None)
+    return user if user is not None and user.is_authenticated else None
+
+
+class _Route:
+    """
+    The replica a request reads from, unless its user turns out to be pinned.
+
+    Token users are only authenticated by DRF in the view, after
+    ``route_request``, so the user is looked at on the first read that finds
+    one on the request.
+    """
+
+    def __init__(self, request, alias):
+        self.request = request
+        self.alias = alias
+
+    def read_alias(self):
+        if self.request is not None:
+            user = _authenticated_user(self.request)
+            if user is not None:
+                if cache.get(_pin_key(user)) is not None:
+                    self.alias = None
+                self.request = None
+        return self.alias
+
+
+def route_request(request):
+    """Pick the database the request's reads go to; returns the token to ``reset_route`` with."""
+    replicas = replica_aliases()
+    route = None
+    if (
+        replicas
+        and request.method in SAFE_METHODS
+        and request.path_info.startswith(_api_prefix())
+        and not is_pinned(request)
+    ):
+        route = _Route(request, random.choice(replicas))
+    return _route.set(route)
+
+
+def reset_route(token):
+    _route.reset(token)
+
+
+def pin_writer(request, response):
+    """Pin a client that just wrote to the primary, so it reads its own writes."""
+    if replica_aliases() and request.method not in SAFE_METHODS and response.status_code < 400:
+        seconds = pin_seconds()
+        response.set_cookie(PIN_COOKIE, str(time.time() + seconds), max_age=seconds, httponly=True, samesite='Lax')
+        user = _authenticated_user(request)
+        if user is not None:
+            cache.set(_pin_key(user), True, timeout=seconds)
+    return response
+
+
+# SQLite file replicas
+
+def copy_database(target, using=DEFAULT_DB_ALIAS):
+    """
+    Overwrite the SQLite database file ``target`` with the database of
+    ``using``, through the online backup API, and record when in its
+    ``replica_status`` table. Runs outside transactions of ``using``, which
+    the backup would wait for.
+
+    The copy is staged in a temporary database, where the status is added,
+    and then backed up onto ``target`` in one step: connections reading
+    ``target`` see the previous copy or the new one with its status, from
+    their next transaction on. Not renamed over it, which would leave them
+    reading the old file (and pair the new one with the old one's WAL).
+    """
+    connection = connections[using]
+    connection.ensure_connection()
+    refreshed_at = time.time()
+    # An empty name is a private on-disk database, deleted when closed
+    staging = sqlite3.connect('')
+    try:
+        connection.connection.backup(staging)
+        with staging:
+            staging.execute(f'CREATE TABLE IF NOT EXISTS {STATUS_TABLE} (refreshed_at REAL NOT NULL)')
+            staging.execute(f'DELETE FROM {STATUS_TABLE}')
+            staging.execute(f'INSERT INTO {STATUS_TABLE} (refreshed_at) VALUES (?)', [refreshed_at])
+        destination = sqlite3.connect(target)
+        try:
+            staging.backup(destination)
+        finally:
+            destination.close()
+    finally:
+        staging.close()
+    return refreshed_at
+
+
+def refresh_replicas():
+    """Copy the primary into every SQLite replica; returns ``{alias: seconds taken}``."""
+    timings = {}
+    for alias in replica_aliases():
+        if connections[alias].vendor != 'sqlite':
+            continue
+        started = time.perf_counter()
+        copy_database(connections[alias].settings_dict['NAME'])
+        timings[alias] = time.perf_counter() - started
+    return timings
+
+
+def replica_lag(alias):
+    """Seconds since replica ``alias`` was copied, or ``None`` if it has no record of it."""
+    try:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(f'SELECT MAX(refreshed_at) FROM {STATUS_TABLE}')
+            refreshed_at = cursor.fetchone()[0]
+    except DatabaseError:
+        return None
+    if refreshed_at is None:
+        return None
+    return max(0.0, time.time() - refreshed_at)
+
+
+def replica_health():
+    """``(healthy, [per replica status])``: every replica is known and at most ``REPLICA_MAX_LAG`` behind."""
+    limit = max_lag()
+    replicas = []
+    for alias in replica_aliases():
+        lag = replica_lag(alias)
+        replicas.append({
+            'alias': alias,
+            'lag_seconds': None if lag is None else round(lag, 3),
+            'healthy': lag is not None and lag <= limit,
+        })
+    return all(replica['healthy'] for replica in replicas), replicas
@@ -1,31 +1,131 @@
+import time
+from datetime import timedelta
+
 from rest_framework import serializers
+from rest_framework_simplejwt import serializers as jwt_serializers
 from django.contrib.auth.models import User
-from .models import Menu, Booking
+from django.utils.text import slugify
+from .availability import restaurant_tables, table_is_free
+from .metrics import record_serializer_time
+from .models import Category, Menu, Booking
+from .search import match_expression
+
+
+class TimedDataMixin:
+    """Adds the time spent building ``.data`` to the current request's metrics."""
+
+    @property
+    def data(self):
+        started = time.perf_counter()
+        try:
+            return super().data
+        finally:
+            record_serializer_time(time.perf_counter() - started)
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    pass
 
 
-class UserSerializer(serializers.ModelSerializer):
+def validate_table_availability(serializer, attrs):
+    """
+    Reject bookings that overlap another booking of the same table.
+
+    Bulk callers pass ``check_table_availability=False`` in the context and
+    check the whole batch at once with ``find_table_conflicts``.
+    """
+    instance = serializer.instance
+    table_number = attrs.get('table_number', getattr(instance, 'table_number', None))
+    booking_date = attrs.get('booking_date', getattr(instance, 'booking_date', None))
+    if table_number is None or booking_date is None:
+        return attrs
+    if table_number not in restaurant_tables():
+        raise serializers.ValidationError({'table_number': f"Table {table_number} does not exist."})
+    if not serializer.context.get('check_table_availability', True):
+        return attrs
+    if not table_is_free(table_number, booking_date, exclude_pk=getattr(instance, 'pk', None)):
+        raise serializers.ValidationError({
+            'table_number': f"Table {table_number} is already booked around that time."
+        })
+    return attrs
+
+
+class UserSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = User
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
 
 
-class MenuSerializer(serializers.ModelSerializer):
+class TokenObtainPairSerializer(jwt_serializers.TokenObtainPairSerializer):
+    """Adds the claims ``CachedJWTAuthentication`` builds users from."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token['is_staff'] = user.is_staff
+        # Millisecond precision: whole seconds made tokens issued in the
+        # second their user changed look stale for their whole lifetime
+        token['claims_at'] = int(time.time() * 1000) / 1000
+        return token
+
+
+class CategoryField(serializers.CharField):
+    """A menu item's category, read and written by name."""
+    # What restaurant.compiled selects instead of the category object
+    read_column = 'name'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', Category._meta.get_field('name').max_length)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        name = super().to_internal_value(data)
+        if not slugify(name):
+            raise serializers.ValidationError("Category name must contain letters or digits.")
+        return name
+
+    def to_representation(self, value):
+        return value.name
+
+
+class MenuSerializer(TimedDataMixin, serializers.ModelSerializer):
+    category = CategoryField()
+
     class Meta:
         model = Menu
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name', 'description', 'price', 'category', 'available', 'featured', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Fetch the category, which is serialized by name, in the same query."""
+        return queryset.select_related('category')
+
     def validate_price(self, value):
         if value <= 0:
             raise serializers.ValidationError("Price must be greater than zero.")
         return value
 
+    def resolve_category(self, validated_data):
+        if 'category' in validated_data:
+            validated_data['category'] = Category.objects.for_name(validated_data['category'])
+        return validated_data
+
+    def create(self, validated_data):
+        return super().create(self.resolve_category(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, self.resolve_category(validated_data))
+
 
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(TimedDataMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = Booking
+        list_serializer_class = TimedListSerializer
         fields = [
             'id', 'customer_name', 'customer_email', 'customer_phone',
             'no_of_guests', 'booking_date', 'table_number', 'special_requests',
@@ -33,6 +133,15 @@ class BookingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'user']
 
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Fetch the nested user in the same query, reading only serialized columns."""
+        user_fields = [f'user__{field}' for field in UserSerializer.Meta.fields]
+        return queryset.select_related('user').only(*cls.Meta.fields, *user_fields)
+
+    def validate(self, attrs):
+        return validate_table_availability(self, attrs)
+
     def validate_no_of_guests(self, value):
         if value <= 0:
             raise serializers.ValidationError("Number of guests must be greater than zero.")
@@ -47,7 +156,7 @@ class BookingSerializer(serializers.ModelSerializer):
         return value
 
 
-class BookingCreateSerializer(serializers.ModelSerializer):
+class BookingCreateSerializer(TimedDataMixin, serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = [
@@ -55,6 +164,9 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             'no_of_guests', 'booking_date', 'table_number', 'special_requests'
         ]
 
+    def validate(self, attrs):
+        return validate_table_availability(self, attrs)
+
     def validate_no_of_guests(self, value):
         if value <= 0:
             raise serializers.ValidationError("Number of guests must be greater than zero.")
@@ -66,4 +178,64 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         from django.utils import timezone
         if value < timezone.now():
             raise serializers.ValidationError("Booking date cannot be in the past.")
-        return value
\ No newline at end of file
+        return value
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    date = serializers.DateField()
+    time = serializers.TimeField(required=False)
+    guests = serializers.IntegerField(min_value=1, max_value=20, default=2)
+    days = serializers.IntegerField(min_value=1, max_value=7, default=1)
+
+
+class MenuSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    offset = serializers.IntegerField(min_value=0, max_value=10000, default=0)
+
+    def validate_q(self, value):
+        if not match_expression(value):
+            raise serializers.ValidationError("Enter at least one word to search for.")
+        return value
+
+
+class BookingOperationSerializer(serializers.Serializer):
+    OPERATIONS = ['create', 'update', 'cancel']
+
+    op = serializers.ChoiceField(choices=OPERATIONS, default='create')
+    id = serializers.IntegerField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['op'] != 'create' and 'id' not in attrs:
+            raise serializers.ValidationError({'id': f"This field is required for {attrs['op']}."})
+        return attrs
+
+
+class OccupancyQuerySerializer(serializers.Serializer):
+    """A range of whole months, ``YYYY-MM`` to ``YYYY-MM``."""
+    MAX_MONTHS = 12
+
+    start = serializers.DateField(input_formats=['%Y-%m'])
+    end = serializers.DateField(input_formats=['%Y-%m'])
+
+    def validate(self, attrs):
+        start, end = attrs['start'], attrs['end']
+        months = (end.year - start.year) * 12 + end.month - start.month + 1
+        if months < 1:
+            raise serializers.ValidationError({'end': 'End month must not be before start month.'})
+        if months > self.MAX_MONTHS:
+            raise serializers.ValidationError({'end': f'At most {self.MAX_MONTHS} months at a time.'})
+        # The last day of the end month
+        attrs['end'] = (end.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return attrs
+
+
+class BookingExportQuerySerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    def validate(self, attrs):
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': 'End date must not be before start date.'})
+        return attrs
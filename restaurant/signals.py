@@ -0,0 +1,89 @@
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import user_changed
+from .availability import availability_index
+from .inventory import release
+from .metrics import record_query
+from .models import Booking, Category, Menu
+from .occupancy import move_rollup
+from .search import repair_search_index
+from .snapshot import invalidate_menu_on_commit
+
+
+@receiver(post_save, sender=Menu)
+@receiver(post_delete, sender=Menu)
+def invalidate_menu_cache(sender, **kwargs):
+    # Covers the API views as well as MenuAdmin, including list_editable
+    # changes, which are saved one instance at a time.
+    invalidate_menu_on_commit()
+
+
+@receiver(post_save, sender=Category)
+def touch_category_items(sender, instance, created, **kwargs):
+    # Items are served with their category's name, so renaming it changes
+    # them; bumping updated_at keeps their ETag/Last-Modified honest.
+    if not created:
+        Menu.objects.filter(category=instance).update(updated_at=timezone.now())
+    invalidate_menu_cache(sender)
+
+
+@receiver(post_delete, sender=Category)
+def invalidate_menu_on_category_delete(sender, **kwargs):
+    invalidate_menu_cache(sender)
+
+
+@receiver(post_migrate)
+def repair_menu_search(sender, app_config=None, using='default', **kwargs):
+    # Altering Menu can make Django rebuild its table, dropping the triggers
+    if app_config is not None and app_config.label == 'restaurant':
+        repair_search_index(connections[using])
+
+
+@receiver(connection_created)
+def instrument_queries(sender, connection, **kwargs):
+    # Installed once per connection object, which outlives reconnects
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(post_save, sender=Booking)
+def update_availability_on_save(sender, instance, **kwargs):
+    availability_index.booking_saved(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def update_availability_on_delete(sender, instance, **kwargs):
+    availability_index.booking_deleted(instance.pk)
+
+
+@receiver(post_delete, sender=Booking)
+def release_slots(sender, instance, using, **kwargs):
+    # Also for queryset and cascading deletes, which don't call Booking.delete()
+    release([getattr(instance, '_held', instance.reservation())], using)
+
+
+@receiver(post_save, sender=Booking)
+def update_occupancy_on_save(sender, instance, created, raw, using, **kwargs):
+    # Booking.save() sets _held to the reservation being replaced; fixtures
+    # are loaded without it
+    if not raw:
+        move_rollup(None if created else instance._held, instance.reservation(), using)
+
+
+@receiver(post_delete, sender=Booking)
+def update_occupancy_on_delete(sender, instance, using, **kwargs):
+    move_rollup(getattr(instance, '_held', instance.reservation()), None, using)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_token_users(sender, instance, update_fields=None, **kwargs):
+    # Logging in only touches last_login, which tokens don't depend on
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    user_changed(instance.pk)
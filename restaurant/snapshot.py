@@ -0,0 +1,200 @@
+"""
+Pre-serialized snapshot of the whole menu.
+
+The snapshot is one canonical JSON document, grouped by category, built with
+the compiled ``MenuSerializer`` read path (``restaurant.compiled``) so every
+item is byte-for-byte what the API used to return.
+It is stored in the cache backend as raw and gzip-compressed bytes under the
+current menu version, and each process keeps the parsed document plus the
+lookup tables the public menu endpoints are served from.
+"""
+import gzip
+import json
+import threading
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils.text import slugify
+
+from .cache import bump_menu_version, cache_timeout, get_cache, get_menu_version
+from .compiled import compiled
+from .models import Menu
+from .replicas import use_primary
+from .serializers import MenuSerializer
+
+_memo_lock = threading.Lock()
+_memo = None
+
+
+class MenuSnapshot:
+    """Parsed snapshot document with precomputed indexes."""
+
+    def __init__(self, version, raw, compressed):
+        self.version = version
+        self.raw = raw
+        self.gzip = compressed
+        self.document = json.loads(raw)
+
+        # Groups follow the categories' sort order; the flat list keeps the
+        # (category, name) order the menu list paginates on.
+        groups = self.document['categories']
+        self.items = sorted(
+            (item for group in groups for item in group['items']),
+            key=lambda item: (item['category'], item['name'])
+        )
+        self.categories = [group['name'] for group in groups]
+        self.featured = [item for item in self.items if item['featured'] and item['available']]
+        self.by_category = {}
+        for group in groups:
+            available = [item for item in group['items'] if item['available']]
+            if available:
+                self.by_category[group['slug']] = available
+
+        last_modified = self.document['last_modified']
+        self.last_modified = datetime.fromisoformat(last_modified) if last_modified else None
+        self.count = self.document['count']
+
+    def category_items(self, category):
+        """Available items of ``category``, given by name or slug in any case."""
+        return self.by_category.get(slugify(category), [])
+
+
+def _snapshot_queryset():
+    return MenuSerializer.setup_eager_loading(Menu.objects.order_by('category__name', 'name'))
+
+
+# Besides category__name, which MenuSerializer's category field reads
+CATEGORY_COLUMNS = ('category__slug', 'category__sort_order')
+
+
+def _categories(rows):
+    """``(name, slug)`` of the categories used by ``rows``, in display order."""
+    categories = sorted({(row.category__sort_order, row.category__name, row.category__slug) for row in rows})
+    return [(name, slug) for _, name, slug in categories]
+
+
+def build_document(version):
+    serializer = compiled(MenuSerializer)
+    queryset = _snapshot_queryset()
+    # Stored as the snapshot of ``version``, which a replica may not have caught up with
+    with use_primary():
+        rows = list(serializer.rows(queryset, *CATEGORY_COLUMNS))
+        last_modified = queryset.aggregate(last_modified=Max('updated_at'))['last_modified']
+    return assemble_document(version, serializer.serialize(rows), last_modified, _categories(rows))
+
+
+async def abuild_document(version):
+    """``build_document`` for async views, reading through the async ORM."""
+    serializer = compiled(MenuSerializer)
+    queryset = _snapshot_queryset()
+    with use_primary():
+        rows = [row async for row in serializer.rows(queryset, *CATEGORY_COLUMNS)]
+        last_modified = (await queryset.aaggregate(last_modified=Max('updated_at')))['last_modified']
+    return assemble_document(version, serializer.serialize(rows), last_modified, _categories(rows))
+
+
+def assemble_document(version, items, last_modified, categories):
+    """Group ``items`` under ``categories``, a list of ``(name, slug)`` in display order."""
+    groups = {name: {'name': name, 'slug': slug, 'items': []} for name, slug in categories}
+    for item in items:
+        groups[item['category']]['items'].append(item)
+
+    return {
+        'version': version,
+        'last_modified': last_modified.isoformat() if last_modified else None,
+        'count': len(items),
+        'categories': list(groups.values()),
+    }
+
+
+def encode_document(document):
+    raw = json.dumps(document, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return raw, gzip.compress(raw, mtime=0)
+
+
+def _store_key(version):
+    return f'menu:snapshot:{version}'
+
+
+def _remember(version, raw, compressed):
+    global _memo
+    snapshot = MenuSnapshot(version, raw, compressed)
+    with _memo_lock:
+        _memo = snapshot
+    return snapshot
+
+
+def _store(version, document):
+    raw, compressed = encode_document(document)
+    get_cache().set(_store_key(version), (raw, compressed), timeout=cache_timeout())
+    return _remember(version, raw, compressed)
+
+
+def _current(version):
+    """The memoized or stored snapshot for ``version``, or ``None``."""
+    snapshot = _memo
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    stored = get_cache().get(_store_key(version))
+    if stored is None:
+        return None
+    return _remember(version, *stored)
+
+
+def rebuild_menu_snapshot(version=None):
+    """Build the snapshot from the database and store it for ``version``."""
+    if version is None:
+        version = get_menu_version()
+    return _store(version, build_document(version))
+
+
+def get_menu_snapshot():
+    """Return the snapshot for the current menu version, building it if needed."""
+    version = get_menu_version()
+    snapshot = _current(version)
+    if snapshot is None:
+        snapshot = rebuild_menu_snapshot(version)
+    return snapshot
+
+
+async def aget_menu_snapshot():
+    """
+    ``get_menu_snapshot`` for async views.
+
+    Memo and cache hits never leave the event loop; only a rebuild touches
+    the database, through the async ORM.
+    """
+    version = get_menu_version()
+    snapshot = _current(version)
+    if snapshot is None:
+        snapshot = _store(version, await abuild_document(version))
+    return snapshot
+
+
+class _MenuChanged:
+    """The on-commit callback of ``invalidate_menu_on_commit``."""
+
+    ran = False
+
+    def __call__(self):
+        self.ran = True
+        bump_menu_version()
+        get_menu_snapshot()
+
+
+def invalidate_menu_on_commit(using=None):
+    """
+    Bump the menu version and warm the snapshot once the current transaction
+    commits (right away outside one).
+
+    Not before: a reader seeing the new version earlier would build its
+    payloads and the snapshot from the rows the transaction hasn't committed
+    yet, and cache them under that version until the next menu write. Several
+    saves inside one transaction (e.g. MenuAdmin ``list_editable``) share one
+    callback; one queued in a savepoint that rolls back is dropped with it.
+    """
+    connection = transaction.get_connection(using)
+    if any(isinstance(func, _MenuChanged) and not func.ran for _, func, _ in connection.run_on_commit):
+        return
+    transaction.on_commit(_MenuChanged(), using=using)
@@ -0,0 +1,61 @@
+"""
+Sparse fieldsets: ``?fields=`` and ``?omit=`` on the list and detail reads.
+
+``?fields=id,name,price`` keeps only the listed fields of every item and
+``?omit=description`` drops the listed ones; both may be combined. Names are
+the serializer's top-level fields, a nested object (a booking's ``user``)
+being kept or omitted as a whole. Items keep the serializer's field order.
+
+Reads through ``restaurant.compiled`` compile a serializer for the selected
+fields, which selects only their columns and joins only the relations they
+need. Payloads served from the menu snapshot are already serialized and are
+pruned instead.
+"""
+import functools
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _names(query_params, param, known):
+    names = [name.strip() for name in query_params.get(param, '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValidationError({param: [f"Unknown field: {name}." for name in unknown]})
+    return set(names)
+
+
+@functools.cache
+def field_names(serializer_class):
+    return tuple(field.field_name for field in serializer_class()._readable_fields)
+
+
+def requested_fields(request, serializer_class):
+    """
+    The fields of ``serializer_class`` selected by ``request``, in serializer
+    order, or ``None`` for all of them.
+    """
+    query_params = getattr(request, 'query_params', request.GET)
+    if not query_params.get(FIELDS_PARAM) and not query_params.get(OMIT_PARAM):
+        return None
+    known = field_names(serializer_class)
+    selected = _names(query_params, FIELDS_PARAM, known) or set(known)
+    selected -= _names(query_params, OMIT_PARAM, known)
+    fields = tuple(name for name in known if name in selected)
+    return None if fields == known else fields
+
+
+def fields_variant(fields):
+    """Part of a cache variant telling the fieldsets of a payload apart."""
+    return '' if fields is None else ','.join(fields)
+
+
+def prune(data, fields):
+    """``data``, one serialized item or a list of them, restricted to ``fields``."""
+    if fields is None:
+        return data
+    if isinstance(data, dict):
+        return {name: data[name] for name in fields}
+    return [{name: item[name] for name in fields} for item in data]
@@ -1,13 +1,59 @@
-from django.test import TestCase
-from django.contrib.auth.models import User
-from django.urls import reverse
+import base64
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time as time_module
+import uuid
+import zoneinfo
+from io import BytesIO, StringIO
+from unittest import mock
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User, update_last_login
+from django.urls import resolve, reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from decimal import Decimal
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.utils import timezone
-from .models import Menu, Booking
+from django.utils.http import http_date
+from django.conf import settings
+from django.http import HttpResponse
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from .archive import archive_bookings
+from .authentication import (
+    CachedJWTAuthentication, TokenUserCache, load_user, token_user_cache, user_change_memo, user_from_claims,
+)
+from .availability import availability_index, table_is_free
+from .booking_export import bookings_between
+from .cache import cache_stats, cached_menu_data, get_menu_version, reset_cache_stats
+from .compiled import CompiledSerializer, compiled
+from .datagen import generate
+from .inventory import SlotUnavailable, dining_room, rebuild_inventory, reserve
+from .menu_io import import_menu, read_rows
+from .metrics import REQUESTS, registry, render
+from .middleware import replica_middleware
+from .occupancy import rebuild_rollups
+from .models import Booking, BookingArchive, Category, Menu, OccupancyRollup, SlotInventory, UserChange
+from .renderers import FastJSONParser, FastJSONRenderer
+from .replicas import PIN_COOKIE, ReplicaRouter, copy_database, route_request, reset_route, use_primary
+from .search import repair_search_index, search_menu
+from .serializers import BookingSerializer, MenuSerializer, UserSerializer
+from .snapshot import get_menu_snapshot
 
 
 class MenuModelTest(TestCase):
@@ -16,7 +62,7 @@ class MenuModelTest(TestCase):
             name="Grilled Salmon",
             description="Fresh Atlantic salmon with herbs",
             price=Decimal('24.99'),
-            category="Main Course",
+            category=Category.objects.for_name("Main Course"),
             available=True,
             featured=True
         )
@@ -74,14 +120,15 @@ class MenuAPITest(APITestCase):
             password='staffpass123',
             is_staff=True
         )
-        self.menu_item = Menu.objects.create(
-            name="Test Pizza",
-            description="Delicious test pizza",
-            price=Decimal('15.99'),
-            category="Pizza",
-            available=True,
-            featured=False
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item = Menu.objects.create(
+                name="Test Pizza",
+                description="Delicious test pizza",
+                price=Decimal('15.99'),
+                category=Category.objects.for_name("Pizza"),
+                available=True,
+                featured=False
+            )
 
     def get_jwt_token(self, user):
         refresh = RefreshToken.for_user(user)
@@ -126,14 +173,15 @@ class MenuAPITest(APITestCase):
         self.assertEqual(response.data['name'], 'Test Pizza')
 
     def test_featured_menu_items(self):
-        Menu.objects.create(
-            name="Featured Pizza",
-            description="Featured test pizza",
-            price=Decimal('19.99'),
-            category="Pizza",
-            available=True,
-            featured=True
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.create(
+                name="Featured Pizza",
+                description="Featured test pizza",
+                price=Decimal('19.99'),
+                category=Category.objects.for_name("Pizza"),
+                available=True,
+                featured=True
+            )
         url = reverse('featured-menu')
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -247,3 +295,2214 @@ class AuthenticationTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('access', response.data)
         self.assertIn('refresh', response.data)
+
+
+class CachedJWTAuthenticationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        token_user_cache.clear()
+        user_change_memo.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123'
+        )
+        self.booking = Booking.objects.create(
+            customer_name="John Doe",
+            customer_email="john@example.com",
+            no_of_guests=4,
+            booking_date=timezone.now() + timedelta(days=1),
+            user=self.user
+        )
+
+    def obtain_token(self, username='testuser', password='testpass123'):
+        response = self.client.post(
+            reverse('token_obtain_pair'), {'username': username, 'password': password}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['access']
+
+    def test_token_carries_claims(self):
+        token = AccessToken(self.obtain_token())
+        self.assertIs(token['is_staff'], False)
+        self.assertIn('claims_at', token)
+
+    def test_claims_token_needs_no_user_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        # Freshness check, count and page; no auth_user lookup
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('booking-list-create'))
+        self.assertEqual(response.data['count'], 1)
+
+    def test_profile_loads_user_in_one_query(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse('user-profile'))
+            self.assertEqual(response.data['username'], 'testuser')
+            self.assertEqual(response.data['email'], 'test@test.com')
+
+    def test_load_user_leaves_shared_user_alone(self):
+        user = user_from_claims(AccessToken(self.obtain_token()))
+        self.assertEqual(load_user(user).email, 'test@test.com')
+        self.assertIn('email', user.get_deferred_fields())
+
+    def test_token_without_claims_is_looked_up_once(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        url = reverse('user-profile')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_staff_change_applies_to_existing_tokens(self):
+        other = User.objects.create_user(username='other', password='otherpass123')
+        Booking.objects.create(
+            customer_name="Jane Doe",
+            customer_email="jane@example.com",
+            no_of_guests=2,
+            booking_date=timezone.now() + timedelta(days=2),
+            user=other
+        )
+        self.user.is_staff = True
+        self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        url = reverse('booking-list-create')
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        # Recorded in the database, not in an evictable per-process cache
+        cache.clear()
+        token_user_cache.clear()
+        user_change_memo.clear()
+        self.assertEqual(self.client.get(url).data['count'], 1)
+
+    def test_change_through_another_process_applies(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        url = reverse('user-profile')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        # Another worker deactivated the user: this one only sees the table
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        UserChange.objects.filter(user_id=self.user.pk).update(changed_at=time_module.time())
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with override_settings(JWT_AUTH_RECHECK_INTERVAL=0):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_claims_not_trusted_when_changes_unreadable(self):
+        token = AccessToken(self.obtain_token())
+        user_change_memo.clear()
+        with mock.patch.object(UserChange.objects, 'filter', side_effect=DatabaseError):
+            self.assertIsNone(user_from_claims(token))
+
+    def test_login_does_not_invalidate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION='Bearer ' + self.obtain_token())
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate(request)
+        update_last_login(None, self.user)
+        with self.assertNumQueries(0):
+            authentication.authenticate(request)
+
+    def test_cache_is_bounded(self):
+        lru = TokenUserCache(max_size=2)
+        tokens = [RefreshToken.for_user(self.user).access_token for _ in range(3)]
+        for index, token in enumerate(tokens):
+            lru.set(f'token-{index}'.encode(), self.user, token)
+        self.assertEqual(len(lru), 2)
+        self.assertIsNone(lru.get(b'token-0'))
+        self.assertIsNotNone(lru.get(b'token-2'))
+
+    def test_expired_entries_are_dropped(self):
+        token = RefreshToken.for_user(self.user).access_token
+        token['exp'] = int(time_module.time()) - 1
+        token_user_cache.set(b'expired', self.user, token)
+        self.assertIsNone(token_user_cache.get(b'expired'))
+
+
+class CategoryTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.pizza = Category.objects.for_name("Pizza")
+        self.mains = Category.objects.for_name("Main Course")
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.create(name="Margherita", price=Decimal('16.99'), category=self.pizza, featured=True)
+            Menu.objects.create(name="Grilled Salmon", price=Decimal('24.99'), category=self.mains)
+
+    def test_names_match_case_insensitively(self):
+        self.assertEqual(Category.objects.for_name("pizza"), self.pizza)
+        self.assertEqual(self.mains.slug, 'main-course')
+
+    def test_new_categories_sort_last(self):
+        desserts = Category.objects.for_name("Desserts")
+        self.assertGreater(desserts.sort_order, self.mains.sort_order)
+
+    def test_create_item_with_existing_category_name(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('menu-list-create'), {
+            'name': 'Calzone', 'price': '14.99', 'category': 'PIZZA'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['category'], 'Pizza')
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_category_name_needs_letters_or_digits(self):
+        self.client.force_authenticate(self.user)
+        response = self.client.post(reverse('menu-list-create'), {
+            'name': 'Mystery', 'price': '9.99', 'category': '!!!'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('category', response.data)
+
+    def test_by_category_accepts_slug(self):
+        response = self.client.get(reverse('menu-by-category', kwargs={'category': 'main-course'}))
+        self.assertEqual([item['name'] for item in response.data], ['Grilled Salmon'])
+
+    def test_categories_follow_sort_order(self):
+        self.assertEqual(self.client.get(reverse('menu-categories')).data, ['Pizza', 'Main Course'])
+        self.pizza.sort_order = self.mains.sort_order + 1
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.save()
+        self.assertEqual(self.client.get(reverse('menu-categories')).data, ['Main Course', 'Pizza'])
+
+    def test_menu_list_keeps_name_order(self):
+        names = [item['name'] for item in self.client.get(reverse('menu-list-create')).data['results']]
+        self.assertEqual(names, ['Grilled Salmon', 'Margherita'])
+
+    def test_rename_updates_items(self):
+        url = reverse('menu-list-create')
+        etag = self.client.get(url)['ETag']
+        self.pizza.name = "Pizzas"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pizza.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Pizzas', [item['category'] for item in response.data['results']])
+
+    def test_lookups_use_indexes(self):
+        plan = Menu.objects.filter(featured=True, available=True).explain()
+        self.assertIn('menu_featured_available_idx', plan)
+        plan = Menu.objects.filter(category__slug='pizza', available=True).explain()
+        self.assertIn('menu_category_available_idx', plan)
+        plan = Category.objects.order_by('sort_order', 'name').values_list('name', flat=True).explain()
+        self.assertIn('COVERING INDEX category_order_idx', plan)
+
+
+class MenuSearchTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username='admin', password='adminpass123')
+        pizza = Category.objects.for_name("Pizza")
+        salads = Category.objects.for_name("Salads")
+        self.margherita = Menu.objects.create(
+            name="Margherita", description="Tomato, mozzarella & <fresh> basil", price=Decimal('16.99'), category=pizza
+        )
+        self.greek = Menu.objects.create(
+            name="Greek Salad", description="Cucumber, olives and feta", price=Decimal('11.99'), category=salads
+        )
+        self.pesto = Menu.objects.create(
+            name="Basil Pesto Pasta", description="Linguine with pine nuts", price=Decimal('14.99'),
+            category=Category.objects.for_name("Pasta")
+        )
+
+    def search(self, **params):
+        return self.client.get(reverse('menu-search'), params)
+
+    def test_name_matches_rank_first(self):
+        response = self.search(q='basil')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Basil Pesto Pasta', 'Margherita'])
+        self.assertEqual(response.data['results'][1]['category'], 'Pizza')
+
+    def test_prefix_and_all_words_match(self):
+        self.assertEqual([item['name'] for item in self.search(q='fet cucum').data['results']], ['Greek Salad'])
+        self.assertEqual(self.search(q='feta basil').data['results'], [])
+
+    def test_category_is_searched(self):
+        self.assertEqual([item['name'] for item in self.search(q='salads').data['results']], ['Greek Salad'])
+
+    def test_highlight_is_escaped(self):
+        highlight = self.search(q='basil').data['results'][1]['highlight']
+        self.assertEqual(highlight['name'], 'Margherita')
+        self.assertEqual(highlight['description'], 'Tomato, mozzarella &amp; &lt;fresh&gt; <mark>basil</mark>')
+
+    def test_falls_back_to_substring_matches_without_fts(self):
+        with mock.patch('restaurant.search.search_supported', return_value=False):
+            response = self.search(q='basil')
+            self.assertEqual([item['name'] for item in response.data['results']], ['Basil Pesto Pasta', 'Margherita'])
+            self.assertEqual(
+                response.data['results'][1]['highlight']['description'],
+                'Tomato, mozzarella &amp; &lt;fresh&gt; <mark>basil</mark>'
+            )
+            self.assertEqual([item['name'] for item in self.search(q='fet cucum').data['results']], ['Greek Salad'])
+            self.assertEqual([item['name'] for item in self.search(q='salads').data['results']], ['Greek Salad'])
+            self.assertEqual(self.search(q='feta basil').data['results'], [])
+
+    def test_query_syntax_is_plain_text(self):
+        response = self.search(q='basil OR "feta" NEAR(*')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(self.search(q='  ?! ').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search().status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pagination(self):
+        response = self.search(q='basil', limit=1)
+        self.assertEqual([item['name'] for item in response.data['results']], ['Basil Pesto Pasta'])
+        self.assertIsNone(response.data['previous'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['name'] for item in response.data['results']], ['Margherita'])
+        self.assertIsNone(response.data['next'])
+
+        reset_cache_stats()
+        response = self.search(q='basil', limit=1, utm_source='mail')
+        self.assertEqual(
+            response.data['next'], 'http://testserver' + reverse('menu-search') + '?limit=1&offset=1&q=basil'
+        )
+        self.assertEqual(self.search(q='basil', limit=1, offset=0, _='1').data, response.data)
+        self.assertEqual(cache_stats()['menu-search'], {'hits': 2, 'misses': 0})
+
+    def test_index_follows_writes(self):
+        self.greek.description = "Cucumber, olives and halloumi"
+        self.greek.save()
+        self.assertEqual([item['name'] for item in self.search(q='halloumi').data['results']], ['Greek Salad'])
+        self.assertEqual(self.search(q='feta').data['results'], [])
+
+        Category.objects.filter(name="Salads").update(name="Greens")
+        self.assertEqual([pk for pk, _, _ in search_menu('greens')], [self.greek.pk])
+
+        import_menu(read_rows(StringIO('{"name": "Margherita", "price": "17.99", "category": "Pizza", '
+                                       '"description": "Tomato and oregano"}\n'), 'ndjson'))
+        self.assertEqual([pk for pk, _, _ in search_menu('basil')], [self.pesto.pk])
+
+        self.pesto.delete()
+        self.assertEqual(search_menu('basil'), [])
+
+    def test_repair_restores_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER restaurant_menu_fts_insert')
+        Menu.objects.create(name="Caprese", description="Basil and tomato", price=Decimal('9.99'),
+                            category=Category.objects.for_name("Salads"))
+        repair_search_index(connection)
+        self.assertIn('Caprese', [item['name'] for item in self.search(q='basil').data['results']])
+
+    def test_admin_search_uses_index(self):
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:restaurant_menu_changelist'), {'q': 'basil'})
+        self.assertContains(response, 'Basil Pesto Pasta')
+        self.assertContains(response, 'Margherita')
+        self.assertNotContains(response, 'Greek Salad')
+        self.assertTrue(any('restaurant_menu_fts' in query['sql'] for query in queries.captured_queries))
+
+
+class MenuCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item = Menu.objects.create(
+                name="Test Pizza",
+                description="Delicious test pizza",
+                price=Decimal('15.99'),
+                category=Category.objects.for_name("Pizza"),
+                available=True,
+                featured=True
+            )
+
+    def test_warm_cache_serves_without_queries(self):
+        urls = [
+            reverse('menu-list-create'),
+            reverse('featured-menu'),
+            reverse('menu-categories'),
+            reverse('menu-by-category', kwargs={'category': 'pizza'}),
+        ]
+        for url in urls:
+            self.client.get(url)
+        for url in urls:
+            with self.assertNumQueries(0):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        stats = cache_stats()
+        for endpoint in ['menu-list', 'featured-menu', 'menu-categories', 'menu-by-category']:
+            self.assertEqual(stats[endpoint], {'hits': 1, 'misses': 1})
+
+    def test_save_invalidates_cache(self):
+        url = reverse('menu-list-create')
+        self.client.get(url)
+        self.menu_item.price = Decimal('17.50')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['results'][0]['price'], '17.50')
+
+    def test_delete_invalidates_cache(self):
+        url = reverse('featured-menu')
+        self.assertEqual(len(self.client.get(url).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.delete()
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+    def test_unknown_params_share_the_cache_entry(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(20):
+                Menu.objects.create(name=f"Pizza {number}", price=Decimal('12.50'), category=self.menu_item.category)
+        url = reverse('menu-list-create')
+        first = self.client.get(url, {'utm_source': 'mail', 'page': 1})
+        self.assertEqual(first.data['next'], 'http://testserver' + url + '?page=2')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {'page': 1, '_': '1700000000'})
+        self.assertEqual(response.data, first.data)
+
+        self.client.get(url, {'fields': 'price,name'})
+        response = self.client.get(url, {'fields': 'name,price', 'omit': 'id', 'debug': 1})
+        self.assertEqual(response.data['next'], 'http://testserver' + url + '?fields=name%2Cprice&page=2')
+        self.assertEqual(cache_stats()['menu-list'], {'hits': 2, 'misses': 2})
+
+    def test_invalidates_once_committed(self):
+        url = reverse('featured-menu')
+        self.assertEqual(len(self.client.get(url).data), 1)
+        version = get_menu_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                self.menu_item.featured = False
+                self.menu_item.save()
+                Menu.objects.create(name="Calzone", price=Decimal('14.99'), category=self.menu_item.category)
+                # Other requests keep reading the committed menu meanwhile
+                self.assertEqual(get_menu_version(), version)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(get_menu_version(), version)
+
+        callbacks[0]()
+        self.assertNotEqual(get_menu_version(), version)
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                self.menu_item.save()
+                try:
+                    with transaction.atomic():
+                        self.menu_item.save()
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+        self.assertEqual(len(callbacks), 1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                try:
+                    with transaction.atomic():
+                        self.menu_item.save()
+                        raise DatabaseError
+                except DatabaseError:
+                    pass
+                self.menu_item.save()
+        self.assertEqual(len(callbacks), 1)
+
+    def test_admin_list_editable_invalidates_cache(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'adminpass123')
+        self.client.force_login(admin_user)
+        url = reverse('featured-menu')
+        self.assertEqual(len(self.client.get(url).data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('admin:restaurant_menu_changelist'), {
+                'form-TOTAL_FORMS': '1',
+                'form-INITIAL_FORMS': '1',
+                'form-0-id': str(self.menu_item.pk),
+                'form-0-price': '15.99',
+                'form-0-available': 'on',
+                '_save': 'Save',
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(self.client.get(url).data), 0)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item = Menu.objects.create(
+                name="Test Pizza",
+                description="Delicious test pizza",
+                price=Decimal('15.99'),
+                category=Category.objects.for_name("Pizza")
+            )
+        self.booking = Booking.objects.create(
+            customer_name="John Doe",
+            customer_email="john@example.com",
+            no_of_guests=4,
+            booking_date=timezone.now() + timedelta(days=1),
+            user=self.user
+        )
+
+    def authenticate(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + str(refresh.access_token))
+
+    def test_menu_list_not_modified(self):
+        url = reverse('menu-list-create')
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_collection_ignores_if_modified_since(self):
+        url = reverse('menu-list-create')
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.create(name="Test Calzone", price=Decimal('13.99'), category=self.menu_item.category)
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Menu.objects.get(name="Test Calzone").delete()
+        # Later than any updated_at left in the table
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time_module.time() + 60))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_menu_list_etag_changes_on_update(self):
+        url = reverse('menu-list-create')
+        etag = self.client.get(url)['ETag']
+        self.menu_item.featured = True
+        with self.captureOnCommitCallbacks(execute=True):
+            self.menu_item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_menu_detail_if_modified_since(self):
+        url = reverse('menu-detail', kwargs={'pk': self.menu_item.pk})
+        response = self.client.get(url)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_booking_detail_not_modified_skips_serialization(self):
+        self.authenticate()
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        etag = self.client.get(url)['ETag']
+        # The token's user is cached, so only the freshness check runs
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_booking_detail_etag_covers_user(self):
+        self.authenticate()
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        User.objects.filter(pk=self.user.pk).update(first_name='Jane')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['first_name'], 'Jane')
+
+    def test_booking_list_not_modified(self):
+        self.authenticate()
+        url = reverse('booking-list-create')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_booking_still_404(self):
+        self.authenticate()
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk + 100})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MenuSnapshotTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Menu.objects.create(name="Greek Salad", price=Decimal('12.99'), category=Category.objects.for_name("Appetizers"), featured=True)
+        Menu.objects.create(name="Bruschetta", price=Decimal('9.99'), category=Category.objects.for_name("Appetizers"), available=False)
+        Menu.objects.create(name="Margherita", price=Decimal('16.99'), category=Category.objects.for_name("Pizza"), featured=True)
+
+    def test_snapshot_matches_serializer(self):
+        snapshot = get_menu_snapshot()
+        expected = MenuSerializer(Menu.objects.all(), many=True).data
+        self.assertEqual(snapshot.items, json.loads(json.dumps(expected)))
+        self.assertEqual(snapshot.categories, ['Appetizers', 'Pizza'])
+        self.assertEqual(gzip.decompress(snapshot.gzip), snapshot.raw)
+
+    def test_endpoints_served_from_snapshot(self):
+        response = self.client.get(reverse('menu-by-category', kwargs={'category': 'APPETIZERS'}))
+        self.assertEqual([item['name'] for item in response.data], ['Greek Salad'])
+        response = self.client.get(reverse('featured-menu'))
+        self.assertEqual([item['name'] for item in response.data], ['Greek Salad', 'Margherita'])
+        response = self.client.get(reverse('menu-list-create'))
+        self.assertEqual(response.data['count'], 3)
+
+    def test_snapshot_endpoint_gzip(self):
+        url = reverse('menu-snapshot')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        document = json.loads(gzip.decompress(response.content))
+        self.assertEqual([group['name'] for group in document['categories']], ['Appetizers', 'Pizza'])
+
+        response = self.client.get(url)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(json.loads(response.content)['count'], 3)
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        call_command('rebuild_menu_snapshot', stdout=out)
+        self.assertIn('3 items in 2 categories', out.getvalue())
+
+
+class TableAvailabilityTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        availability_index.invalidate()
+        self.day = (timezone.now() + timedelta(days=3)).date()
+        self.dinner = timezone.make_aware(datetime.combine(self.day, time(19, 30)))
+        Booking.objects.create(
+            customer_name="John Doe",
+            customer_email="john@example.com",
+            no_of_guests=4,
+            booking_date=self.dinner,
+            table_number=3
+        )
+
+    def booking_data(self, booking_date, table_number, guests=2):
+        return {
+            'customer_name': 'Jane Smith',
+            'customer_email': 'jane@example.com',
+            'no_of_guests': guests,
+            'booking_date': booking_date.isoformat(),
+            'table_number': table_number,
+        }
+
+    def test_free_tables_at_time(self):
+        url = reverse('table-availability')
+        response = self.client.get(url, {'date': self.day.isoformat(), 'time': '20:30', 'guests': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn(3, response.data['tables'])
+        self.assertIn(4, response.data['tables'])
+        self.assertNotIn(1, response.data['tables'])
+
+        response = self.client.get(url, {'date': self.day.isoformat(), 'time': '21:30', 'guests': 4})
+        self.assertIn(3, response.data['tables'])
+
+    def test_free_slots_for_day(self):
+        response = self.client.get(reverse('table-availability'), {'date': self.day.isoformat(), 'guests': 4})
+        slots = {slot['booking_date'][11:16]: slot['tables'] for slot in response.data['slots']}
+        self.assertEqual(slots['11:00'][0], 3)
+        self.assertIn(3, slots['17:30'])
+        self.assertNotIn(3, slots['18:00'])
+        self.assertNotIn(3, slots['21:00'])
+        self.assertNotIn('21:30', slots)
+
+    def test_index_sees_writes_without_reload(self):
+        availability_index.free_tables(self.dinner, 2)
+        later = self.dinner + timedelta(hours=1)
+        with self.assertNumQueries(0):
+            self.assertFalse(availability_index.conflicts(5, later))
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                customer_name="Jane Smith",
+                customer_email="jane@example.com",
+                no_of_guests=2,
+                booking_date=later,
+                table_number=5
+            )
+        with self.assertNumQueries(0):
+            self.assertTrue(availability_index.conflicts(5, later - timedelta(minutes=90)))
+
+    def test_rolled_back_booking_not_indexed(self):
+        self.assertFalse(availability_index.conflicts(5, self.dinner))
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ValueError):
+            with transaction.atomic():
+                Booking.objects.create(
+                    customer_name="Jane Smith",
+                    customer_email="jane@example.com",
+                    no_of_guests=2,
+                    booking_date=self.dinner,
+                    table_number=5
+                )
+                raise ValueError
+        self.assertFalse(availability_index.conflicts(5, self.dinner))
+
+    def test_overlapping_booking_rejected(self):
+        url = reverse('booking-list-create')
+        response = self.client.post(url, self.booking_data(self.dinner + timedelta(minutes=45), 3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('table_number', response.data)
+
+        response = self.client.post(url, self.booking_data(self.dinner + timedelta(hours=2), 3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_stale_index_entry_is_ignored(self):
+        booking = Booking.objects.get()
+        availability_index.conflicts(3, self.dinner)
+        # Remove the row behind the index's back, as another process would
+        Booking.objects.filter(pk=booking.pk).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            availability_index.booking_saved(booking)
+        self.assertTrue(table_is_free(3, self.dinner))
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@test.com',
+            password='staffpass123',
+            is_staff=True
+        )
+        start = timezone.now() + timedelta(days=1)
+        # Several bookings share each timestamp so the id tiebreaker matters
+        Booking.objects.bulk_create(
+            Booking(
+                customer_name=f"Guest {i}",
+                customer_email=f"guest{i}@example.com",
+                no_of_guests=2,
+                booking_date=start + timedelta(hours=i // 3),
+                table_number=i % 3 + 1
+            )
+            for i in range(45)
+        )
+
+    def walk(self, url, params):
+        seen = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(response.data['results'])
+            if not response.data['next']:
+                return seen, response
+            response = self.client.get(response.data['next'])
+
+    def test_booking_cursor_walk(self):
+        self.client.force_authenticate(self.staff_user)
+        seen, last_page = self.walk(reverse('booking-list-create'), {'cursor': ''})
+        expected = list(Booking.objects.order_by('booking_date', 'id').values_list('id', flat=True))
+        self.assertEqual([booking['id'] for booking in seen], expected)
+        self.assertNotIn('count', last_page.data)
+
+        previous = self.client.get(last_page.data['previous'])
+        self.assertEqual([booking['id'] for booking in previous.data['results']], expected[20:40])
+
+    def test_booking_cursor_total(self):
+        self.client.force_authenticate(self.staff_user)
+        response = self.client.get(reverse('booking-list-create'), {'cursor': '', 'include_total': 'true'})
+        self.assertEqual(response.data['count'], 45)
+
+    def test_invalid_cursor(self):
+        self.client.force_authenticate(self.staff_user)
+        response = self.client.get(reverse('booking-list-create'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def cursor(self, position):
+        return base64.urlsafe_b64encode(json.dumps(['n', position]).encode()).decode()
+
+    def test_cursor_with_invalid_values(self):
+        self.client.force_authenticate(self.staff_user)
+        for position in (['abc', 1], [None, None], [{'a': 1}, 1], ['2030-01-01T00:00:00', 'x']):
+            with self.subTest(position=position):
+                response = self.client.get(reverse('booking-list-create'), {'cursor': self.cursor(position)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+                self.assertEqual(response.data, {'detail': 'Invalid cursor'})
+
+        Menu.objects.create(name="Dish", price=Decimal('9.99'), category=Category.objects.for_name("Pizza"))
+        for position in ([1, 2], [None, None], ['Pizza', ['Dish']]):
+            with self.subTest(position=position):
+                response = self.client.get(reverse('menu-list-create'), {'cursor': self.cursor(position)})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_numbers_still_default(self):
+        self.client.force_authenticate(self.staff_user)
+        response = self.client.get(reverse('booking-list-create'), {'page': 3})
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_menu_cursor_walk(self):
+        for i in range(25):
+            Menu.objects.create(name=f"Dish {i:02d}", price=Decimal('9.99'), category=Category.objects.for_name(["Pizza", "Desserts"][i % 2]))
+        seen, _ = self.walk(reverse('menu-list-create'), {'cursor': ''})
+        self.assertEqual([item['name'] for item in seen], list(Menu.objects.values_list('name', flat=True)))
+
+
+class QueryBudgetMixin:
+    """
+    Assert that an endpoint issues a fixed number of queries whatever the
+    size of the dataset behind it.
+
+    ``populate(size)`` adds rows to the database before each measurement, so
+    any per-row query (an N+1) makes one of the larger sizes blow the budget.
+    """
+    budget_sizes = (1, 5, 25)
+
+    def assertQueryBudget(self, url, budget, populate, params=None):
+        created = 0
+        for size in self.budget_sizes:
+            populate(size - created)
+            created = size
+            cache.clear()
+            with self.subTest(url=url, size=size):
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url, params or {})
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class QueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@test.com',
+            password='staffpass123',
+            is_staff=True
+        )
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123'
+        )
+        self.counter = 0
+
+    def add_bookings(self, count):
+        start = timezone.now() + timedelta(days=1)
+        for _ in range(count):
+            self.counter += 1
+            owner = User.objects.create(username=f'guest{self.counter}')
+            Booking.objects.create(
+                customer_name=f"Guest {self.counter}",
+                customer_email=f"guest{self.counter}@example.com",
+                no_of_guests=2,
+                booking_date=start + timedelta(hours=3 * self.counter),
+                table_number=1,
+                user=self.user if self.counter % 2 else owner
+            )
+
+    def add_menu_items(self, count):
+        for _ in range(count):
+            self.counter += 1
+            Menu.objects.create(
+                name=f"Dish {self.counter}",
+                price=Decimal('9.99'),
+                category=Category.objects.for_name("Pizza"),
+                featured=True
+            )
+
+    def test_staff_booking_list(self):
+        self.client.force_authenticate(self.staff_user)
+        # freshness aggregate, COUNT(*), page
+        self.assertQueryBudget(reverse('booking-list-create'), 3, self.add_bookings)
+
+    def test_staff_booking_list_cursor(self):
+        self.client.force_authenticate(self.staff_user)
+        self.assertQueryBudget(reverse('booking-list-create'), 2, self.add_bookings, {'cursor': ''})
+
+    def test_user_booking_list(self):
+        self.client.force_authenticate(self.user)
+        self.assertQueryBudget(reverse('booking-list-create'), 3, self.add_bookings)
+
+    def test_booking_detail(self):
+        self.client.force_authenticate(self.staff_user)
+        self.add_bookings(1)
+        booking = Booking.objects.first()
+        # freshness check, object
+        self.assertQueryBudget(reverse('booking-detail', kwargs={'pk': booking.pk}), 2, self.add_bookings)
+
+    def test_menu_endpoints(self):
+        # A cold cache rebuilds the snapshot with one SELECT and one MAX(updated_at)
+        for url in [
+            reverse('menu-list-create'),
+            reverse('featured-menu'),
+            reverse('menu-categories'),
+            reverse('menu-by-category', kwargs={'category': 'pizza'}),
+        ]:
+            self.assertQueryBudget(url, 2, self.add_menu_items)
+
+    def test_admin_booking_changelist(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@test.com', 'adminpass123')
+        self.client.force_login(admin_user)
+        url = reverse('admin:restaurant_booking_changelist')
+        counts = []
+        for size in self.budget_sizes:
+            self.add_bookings(size)
+            with CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            counts.append(len(context.captured_queries))
+        self.assertEqual(len(set(counts)), 1, counts)
+
+
+class BookingBulkTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        availability_index.invalidate()
+        self.user = User.objects.create_user(
+            username='partner',
+            email='partner@test.com',
+            password='partnerpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.start = timezone.now() + timedelta(days=2)
+        self.existing = Booking.objects.create(
+            customer_name="John Doe",
+            customer_email="john@example.com",
+            no_of_guests=2,
+            booking_date=self.start,
+            table_number=1,
+            user=self.user
+        )
+        self.url = reverse('booking-bulk')
+
+    def booking_data(self, hours, table_number, guests=2):
+        return {
+            'customer_name': f'Guest {hours}',
+            'customer_email': 'guest@example.com',
+            'no_of_guests': guests,
+            'booking_date': (self.start + timedelta(hours=hours)).isoformat(),
+            'table_number': table_number,
+        }
+
+    def test_bulk_create_list(self):
+        payload = [self.booking_data(hours, table) for hours in (3, 6) for table in (1, 2, 3)]
+        # session/auth user lookup is skipped by force_authenticate: 1 conflict
+        # query, then savepoint + INSERT + release, around a savepoint with
+        # the slot inventory's INSERT OR IGNORE + UPDATE for the whole batch,
+        # and one upsert of the occupancy rollups
+        with self.assertNumQueries(9):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created'] * 6)
+        self.assertEqual(Booking.objects.filter(user=self.user).count(), 7)
+
+    def test_partial_mode_reports_conflicts(self):
+        payload = {'mode': 'partial', 'operations': [
+            {'op': 'create', 'data': self.booking_data(1, 1)},
+            {'op': 'create', 'data': self.booking_data(4, 2)},
+            {'op': 'create', 'data': self.booking_data(5, 2)},
+            {'op': 'create', 'data': self.booking_data(4, 3, guests=0)},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['error', 'created', 'error', 'error'])
+        self.assertIn('no_of_guests', response.data['results'][3]['errors'])
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_partial_mode_retries_a_lost_race_one_by_one(self):
+        payload = {'mode': 'partial', 'operations': [
+            {'op': 'create', 'data': self.booking_data(0, 1)},
+            {'op': 'create', 'data': self.booking_data(3, 2)},
+        ]}
+        # The existing booking committed after this batch's checks, so the INSERT hits the unique constraint
+        with mock.patch('restaurant.bulk.find_table_conflicts', return_value=set()), \
+                mock.patch('restaurant.bulk.reserve'):
+            response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.data['results']], ['error', 'created'])
+        self.assertEqual(Booking.objects.count(), 2)
+        self.assertTrue(availability_index.conflicts(2, self.start + timedelta(hours=3)))
+
+    def test_atomic_mode_writes_nothing_on_error(self):
+        payload = {'mode': 'atomic', 'operations': [
+            {'op': 'create', 'data': self.booking_data(4, 2)},
+            {'op': 'create', 'data': self.booking_data(1, 1)},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.data['applied'])
+        self.assertEqual([result['status'] for result in response.data['results']], ['skipped', 'error'])
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_update_and_cancel(self):
+        other = Booking.objects.create(
+            customer_name="Jane Smith",
+            customer_email="jane@example.com",
+            no_of_guests=2,
+            booking_date=self.start + timedelta(hours=5),
+            table_number=2,
+            user=self.user
+        )
+        # Moving table 1 onto table 2's slot is fine because table 2's booking is cancelled
+        payload = {'mode': 'atomic', 'operations': [
+            {'op': 'update', 'id': self.existing.pk, 'data': {
+                'table_number': 2, 'booking_date': other.booking_date.isoformat()
+            }},
+            {'op': 'cancel', 'id': other.pk},
+        ]}
+        response = self.client.post(self.url, payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.table_number, 2)
+        self.assertFalse(Booking.objects.filter(pk=other.pk).exists())
+        self.assertTrue(availability_index.conflicts(2, other.booking_date))
+        self.assertFalse(availability_index.conflicts(1, self.start))
+
+    def test_cannot_touch_other_users_bookings(self):
+        stranger = User.objects.create_user(username='stranger', password='strangerpass123')
+        self.client.force_authenticate(stranger)
+        response = self.client.post(self.url, {'operations': [{'op': 'cancel', 'id': self.existing.pk}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Booking.objects.filter(pk=self.existing.pk).exists())
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(self.url, [self.booking_data(3, 1)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class MenuImportExportTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        Menu.objects.create(name="Greek Salad", price=Decimal('12.99'), category=Category.objects.for_name("Appetizers"))
+
+    def test_csv_import_upserts_on_name(self):
+        body = (
+            "name,description,price,category,available,featured\n"
+            "Greek Salad,Updated,13.50,Appetizers,true,true\n"
+            "Tiramisu,Coffee dessert,7.99,Desserts,true,false\n"
+            "Broken,,-1,Desserts,true,false\n"
+        )
+        response = self.client.post(
+            reverse('menu-import', kwargs={'file_format': 'csv'}), body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['imported'], 2)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 4)
+        salad = Menu.objects.get(name="Greek Salad")
+        self.assertEqual(salad.price, Decimal('13.50'))
+        self.assertTrue(salad.featured)
+        # The public endpoints see the import despite bulk_create sending no signals
+        response = self.client.get(reverse('menu-categories'))
+        self.assertEqual(response.data, ['Appetizers', 'Desserts'])
+
+    def test_missing_columns_keep_their_values(self):
+        Menu.objects.filter(name="Greek Salad").update(available=False, featured=True, description="Feta")
+        body = "name,price,category\nGreek Salad,13.50,Appetizers\n"
+        response = self.client.post(
+            reverse('menu-import', kwargs={'file_format': 'csv'}), body, content_type='text/csv'
+        )
+        self.assertEqual(response.data['imported'], 1)
+        salad = Menu.objects.get(name="Greek Salad")
+        self.assertEqual(salad.price, Decimal('13.50'))
+        self.assertEqual((salad.available, salad.featured, salad.description), (False, True, "Feta"))
+
+        lines = [{'name': 'Greek Salad', 'price': '14.00', 'category': 'Appetizers', 'available': True},
+                 {'name': 'Tiramisu', 'price': '7.99', 'category': 'Desserts'}]
+        summary = import_menu(read_rows(StringIO('\n'.join(json.dumps(line) for line in lines)), 'ndjson'))
+        self.assertEqual(summary['imported'], 2)
+        salad.refresh_from_db()
+        self.assertEqual((salad.price, salad.available, salad.featured), (Decimal('14.00'), True, True))
+        self.assertTrue(Menu.objects.get(name='Tiramisu').available)
+
+    def test_ndjson_multipart_import(self):
+        lines = [
+            {'name': f'Dish {i}', 'price': '9.99', 'category': 'Pizza'} for i in range(5)
+        ] + [{'name': 'Dish 0', 'price': '10.99', 'category': 'Pizza'}]
+        upload = SimpleUploadedFile('menu.ndjson', '\n'.join(json.dumps(line) for line in lines).encode())
+        response = self.client.post(
+            reverse('menu-import', kwargs={'file_format': 'ndjson'}), {'file': upload}, format='multipart'
+        )
+        self.assertEqual(response.data['failed'], 0)
+        self.assertEqual(Menu.objects.filter(category__name='Pizza').count(), 5)
+        self.assertEqual(Menu.objects.get(name='Dish 0').price, Decimal('10.99'))
+
+    def test_export_round_trip(self):
+        Menu.objects.create(name="Tiramisu", description="Coffee, cream", price=Decimal('7.99'), category=Category.objects.for_name("Desserts"))
+        response = self.client.get(reverse('menu-export', kwargs={'file_format': 'csv'}))
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([row['name'] for row in rows], ['Greek Salad', 'Tiramisu'])
+        self.assertEqual(rows[1]['description'], 'Coffee, cream')
+
+        response = self.client.get(reverse('menu-export', kwargs={'file_format': 'ndjson'}))
+        items = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(items[0]['price'], '12.99')
+
+        Menu.objects.all().delete()
+        summary = import_menu(read_rows(StringIO(content), 'csv'), batch_size=1)
+        self.assertEqual(summary['imported'], 2)
+        self.assertEqual(Menu.objects.get(name='Tiramisu').description, 'Coffee, cream')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('menu-export', kwargs={'file_format': 'xml'}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(reverse('menu-export', kwargs={'file_format': 'csv'}))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_management_commands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'menu.ndjson')
+            call_command('export_menu', path, stderr=StringIO())
+            Menu.objects.all().delete()
+            out = StringIO()
+            call_command('import_menu', path, stdout=out)
+        self.assertIn('1 imported', out.getvalue())
+        self.assertTrue(Menu.objects.filter(name='Greek Salad').exists())
+
+
+class BookingExportTest(APITestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(
+            username='staffuser',
+            email='staff@test.com',
+            password='staffpass123',
+            is_staff=True
+        )
+        self.day = (timezone.now() + timedelta(days=5)).date()
+        tz = timezone.get_current_timezone()
+        for offset, name in [(-1, 'Before'), (0, 'First'), (1, 'Second'), (2, 'After')]:
+            Booking.objects.create(
+                customer_name=name,
+                customer_email=f"{name.lower()}@example.com",
+                no_of_guests=2,
+                booking_date=datetime.combine(self.day + timedelta(days=offset), time(19, 30), tzinfo=tz),
+                special_requests='Window, please',
+                user=self.staff_user if name == 'First' else None
+            )
+        self.client.force_authenticate(self.staff_user)
+        self.params = {'start': self.day.isoformat(), 'end': (self.day + timedelta(days=1)).isoformat()}
+
+    def test_ndjson_matches_serializer(self):
+        response = self.client.get(reverse('booking-export', kwargs={'file_format': 'ndjson'}), self.params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['customer_name'] for row in rows], ['First', 'Second'])
+
+        booking = Booking.objects.get(customer_name='First')
+        expected = BookingSerializer(booking).data
+        for field in ['id', 'booking_date', 'created_at', 'updated_at', 'special_requests', 'table_number']:
+            self.assertEqual(rows[0][field], expected[field])
+        self.assertEqual(rows[0]['user_id'], self.staff_user.pk)
+
+    def test_csv_export(self):
+        response = self.client.get(reverse('booking-export', kwargs={'file_format': 'csv'}), self.params)
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['customer_name'] for row in rows], ['First', 'Second'])
+        self.assertEqual(rows[0]['special_requests'], 'Window, please')
+
+    def test_invalid_range(self):
+        response = self.client.get(
+            reverse('booking-export', kwargs={'file_format': 'csv'}),
+            {'start': self.params['end'], 'end': self.params['start']}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_staff_only(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('booking-export', kwargs={'file_format': 'csv'}), self.params)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(ASGI_URLCONF='littlelemon.urls_asgi')
+class AsyncViewsTest(APITestCase):
+    """With ``ASGI_URLCONF`` set, the ASGI entry point serves the hot read endpoints from async views."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        Menu.objects.create(name="Test Pizza", price=Decimal('15.99'), category=Category.objects.for_name("Pizza"), featured=True)
+        Menu.objects.create(name="Caesar Salad", price=Decimal('8.50'), category=Category.objects.for_name("Salads"))
+        self.booking = Booking.objects.create(
+            customer_name="John Doe",
+            customer_email="john@example.com",
+            no_of_guests=4,
+            booking_date=timezone.now() + timedelta(days=1),
+            user=self.user
+        )
+        self.token = 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)
+
+    def test_routes_resolve_to_coroutines(self):
+        for name, kwargs in [
+            ('menu-list-create', {}), ('featured-menu', {}), ('menu-categories', {}),
+            ('menu-by-category', {'category': 'pizza'}), ('booking-detail', {'pk': 1}),
+        ]:
+            match = resolve(reverse(name, kwargs=kwargs), urlconf='littlelemon.urls_asgi')
+            self.assertTrue(iscoroutinefunction(match.func), name)
+        # Everything else falls through to the sync views
+        match = resolve(reverse('menu-detail', kwargs={'pk': 1}), urlconf='littlelemon.urls_asgi')
+        self.assertFalse(iscoroutinefunction(match.func))
+
+    async def test_menu_endpoints_match_sync_views(self):
+        for url in [
+            reverse('menu-list-create'),
+            reverse('menu-list-create') + '?cursor=',
+            reverse('featured-menu'),
+            reverse('menu-categories'),
+            reverse('menu-by-category', kwargs={'category': 'pizza'}),
+        ]:
+            sync_response = await sync_to_async(self.client.get)(url)
+            async_response = await self.async_client.get(url)
+            self.assertEqual(async_response.status_code, 200, url)
+            self.assertEqual(async_response['Content-Type'], sync_response['Content-Type'])
+            self.assertEqual(async_response.content, sync_response.content, url)
+            # Only DRF views add an Allow header
+            self.assertIn('Allow', sync_response)
+            self.assertNotIn('Allow', async_response)
+
+    @override_settings(ASGI_URLCONF=None)
+    async def test_sync_views_by_default(self):
+        response = await self.async_client.get(reverse('menu-list-create'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Allow', response)
+
+    async def test_menu_list_conditional_get(self):
+        url = reverse('menu-list-create')
+        response = await self.async_client.get(url)
+        self.assertEqual(response['ETag'], (await sync_to_async(self.client.get)(url))['ETag'])
+
+        response = await self.async_client.get(url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_menu_list_invalid_page(self):
+        response = await self.async_client.get(reverse('menu-list-create') + '?page=99')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(json.loads(response.content), {'detail': 'Invalid page.'})
+
+    async def test_menu_create_is_handled_by_sync_view(self):
+        response = await self.async_client.post(
+            reverse('menu-list-create'),
+            {'name': 'New Item', 'price': '9.99', 'category': 'Pizza'},
+            content_type='application/json',
+            headers={'authorization': self.token}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(await Menu.objects.filter(name='New Item').aexists())
+
+        response = await self.async_client.get(reverse('menu-by-category', kwargs={'category': 'pizza'}))
+        self.assertEqual(len(json.loads(response.content)), 2)
+
+    async def test_booking_detail_matches_sync_view(self):
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+        sync_response = await sync_to_async(self.client.get)(url)
+        response = await self.async_client.get(url, headers={'authorization': self.token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, sync_response.content)
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+
+        response = await self.async_client.get(
+            url, headers={'authorization': self.token, 'if-none-match': response['ETag']}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_booking_detail_after_user_change_memo_expires(self):
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        response = await self.async_client.get(url, headers={'authorization': self.token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Both the cached token user and a fresh token's claims re-read user changes
+        user_change_memo.clear()
+        response = await self.async_client.get(url, headers={'authorization': self.token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        token_user_cache.clear()
+        user_change_memo.clear()
+        response = await self.async_client.get(url, headers={'authorization': self.token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_booking_detail_session_auth(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('booking-detail', kwargs={'pk': self.booking.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_booking_detail_requires_authentication(self):
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+
+        response = await self.async_client.get(url, headers={'authorization': 'Bearer not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    async def test_booking_detail_hides_other_users_bookings(self):
+        token = 'Bearer ' + str(RefreshToken.for_user(self.other).access_token)
+        response = await self.async_client.get(
+            reverse('booking-detail', kwargs={'pk': self.booking.pk}), headers={'authorization': token}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SQLiteProfileTest(TransactionTestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_booking_create_takes_write_lock_up_front(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(reverse('booking-list-create'), {
+                'customer_name': 'Jane Doe',
+                'customer_email': 'jane@example.com',
+                'no_of_guests': 2,
+                'booking_date': (timezone.now() + timedelta(days=1)).isoformat(),
+                'table_number': 1,
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(statements[0], 'BEGIN IMMEDIATE')
+
+
+@override_settings(METRICS_TOKEN='scrape-token')
+class MetricsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.item = Menu.objects.create(name="Margherita", price=Decimal('16.99'), category=Category.objects.for_name("Pizza"))
+
+    def scrape(self):
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+
+    def test_scrape_needs_token_address_or_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong-token')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(METRICS_TOKEN=None):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, status.HTTP_200_OK)
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='192.0.2.1').status_code, 403)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(User.objects.create_user(username='staff', password='testpass123', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+
+    def test_requests_are_counted_by_route_and_status(self):
+        self.client.get(reverse('menu-list-create'))
+        self.client.get(reverse('menu-list-create'))
+        self.client.get(reverse('menu-detail', kwargs={'pk': 999}))
+        self.client.get('/no-such-page/')
+        samples = self.scrape()
+        self.assertEqual(samples['http_requests_total{route="menu-list-create",method="GET",status="200"}'], 2)
+        self.assertEqual(samples['http_requests_total{route="menu-detail",method="GET",status="404"}'], 1)
+        self.assertEqual(samples['http_requests_total{route="<unmatched>",method="GET",status="404"}'], 1)
+        self.assertEqual(
+            samples['http_request_duration_seconds_bucket{route="menu-list-create",method="GET",le="+Inf"}'], 2
+        )
+        self.assertEqual(samples['http_request_duration_seconds_count{route="menu-list-create",method="GET"}'], 2)
+        size = len(self.client.get(reverse('menu-list-create')).content)
+        self.assertEqual(self.scrape()['http_response_size_bytes_sum{route="menu-list-create"}'], 3 * size)
+
+    def test_unknown_methods_share_a_label(self):
+        for method in ('PROPFIND', 'BREW', 'brew'):
+            self.client.generic(method, reverse('api-overview'))
+        samples = self.scrape()
+        self.assertEqual(samples['http_requests_total{route="api-overview",method="other",status="405"}'], 3)
+        self.assertFalse([name for name in samples if 'BREW' in name or 'brew' in name or 'PROPFIND' in name])
+
+    def test_queries_and_serializer_time(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('menu-detail', kwargs={'pk': self.item.pk}))
+        samples = self.scrape()
+        self.assertEqual(samples['db_queries_per_request_sum{route="menu-detail"}'], 2)
+        self.assertGreater(samples['db_query_duration_seconds_sum{route="menu-detail"}'], 0)
+        self.assertGreater(samples['serializer_duration_seconds_sum{route="menu-detail"}'], 0)
+
+    async def test_asgi_requests_are_recorded(self):
+        await self.async_client.get(reverse('menu-list-create'))
+        response = await self.async_client.get('/metrics', headers={'authorization': 'Bearer scrape-token'})
+        self.assertIn(
+            'http_requests_total{route="menu-list-create",method="GET",status="200"} 1', response.content.decode()
+        )
+
+    def test_thread_shards_are_summed(self):
+        def record():
+            for _ in range(1000):
+                registry.inc(registry.shard(), REQUESTS, ('menu-list-create', 'GET', '200'))
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        key = 'http_requests_total{route="menu-list-create",method="GET",status="200"}'
+        self.assertEqual(self.scrape()[key], 4000)
+        # Exited threads were retired, not dropped
+        self.assertEqual(self.scrape()[key], 4000)
+
+    def test_worker_processes_are_aggregated(self):
+        key = 'http_requests_total{route="menu-list-create",method="GET",status="200"}'
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_MULTIPROC_DIR=directory):
+            with open(os.path.join(directory, 'metrics-1-1.json'), 'w') as file:
+                json.dump([['http_requests_total', ['menu-list-create', 'GET', '200'], [5]]], file)
+            self.client.get(reverse('menu-list-create'))
+            self.assertEqual(self.scrape()[key], 6)
+            registry.flush()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            # A flushed file is not counted twice by its own process
+            self.assertEqual(self.scrape()[key], 6)
+
+    def test_label_values_are_escaped(self):
+        self.client.get('/restaurant/menu/category/a"b/')
+        self.assertIn(
+            'http_requests_total{route="menu-by-category",method="GET",status="200"}', self.scrape()
+        )
+        text = render({(REQUESTS.name, ('say "hi"\n', 'GET', '200')): [1]})
+        self.assertIn(r'route="say \"hi\"\n"', text)
+
+
+class GenerateDataTest(TestCase):
+    END = datetime(2030, 6, 30).date()
+
+    def generate(self, seed=7):
+        return generate(seed=seed, menu_items=120, users=30, bookings=800, end=self.END)
+
+    def test_seeded_and_rerunnable(self):
+        self.assertEqual(self.generate(), {'menu_items': 120, 'users': 30, 'bookings': 800})
+        fields = ['customer_name', 'no_of_guests', 'booking_date', 'table_number', 'user__username']
+        first = list(Booking.objects.order_by('booking_date', 'table_number').values_list(*fields))
+        menu = list(Menu.objects.order_by('name').values_list('name', 'price', 'category__name'))
+        # The same seed produces the same rows, which a rerun skips
+        self.assertEqual(self.generate(), {'menu_items': 0, 'users': 0, 'bookings': 0})
+
+        Booking.objects.all().delete()
+        Menu.objects.all().delete()
+        User.objects.all().delete()
+        self.generate()
+        self.assertEqual(list(Booking.objects.order_by('booking_date', 'table_number').values_list(*fields)), first)
+        self.assertEqual(list(Menu.objects.order_by('name').values_list('name', 'price', 'category__name')), menu)
+
+    def test_bookings_fit_their_tables(self):
+        self.generate()
+        tables = settings.RESTAURANT_TABLES
+        duration = settings.BOOKING_DURATION
+        previous = {}
+        for booking in Booking.objects.order_by('table_number', 'booking_date'):
+            self.assertLessEqual(booking.no_of_guests, tables[booking.table_number])
+            if booking.table_number in previous:
+                self.assertGreaterEqual(booking.booking_date - previous[booking.table_number], duration)
+            previous[booking.table_number] = booking.booking_date
+        self.assertEqual(timezone.localdate(Booking.objects.latest('booking_date').booking_date), self.END)
+        self.assertTrue(Booking.objects.filter(user__isnull=False).exists())
+        # Generated items are searchable: the FTS triggers fire on raw inserts
+        self.assertTrue(search_menu('baklava'))
+
+    def test_command(self):
+        out = StringIO()
+        call_command(
+            'generate_data', '--seed=1', '--menu-items=10', '--users=5', '--bookings=50',
+            '--end=2030-06-30', stdout=out,
+        )
+        self.assertIn('Generated 10 menu items, 5 users', out.getvalue())
+        self.assertEqual(Booking.objects.count(), 50)
+        self.assertTrue(User.objects.first().check_password('temppass123'))
+
+
+@override_settings(RESTAURANT_TABLES={1: 2, 2: 4})
+class SlotInventoryTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        availability_index.invalidate()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.start = (timezone.now() + timedelta(days=2)).replace(minute=0, second=0, microsecond=0)
+        self.url = reverse('booking-list-create')
+
+    def book(self, hours=0, table_number=None, guests=2):
+        data = {
+            'customer_name': 'Jane Doe',
+            'customer_email': 'jane@example.com',
+            'no_of_guests': guests,
+            'booking_date': (self.start + timedelta(hours=hours)).isoformat(),
+        }
+        if table_number is not None:
+            data['table_number'] = table_number
+        return self.client.post(self.url, data, format='json')
+
+    def inventory(self):
+        return list(SlotInventory.objects.values_list('slot', 'covers_left', 'tables_left', 'tables_taken'))
+
+    def test_bookings_take_and_give_back_slots(self):
+        response = self.book(table_number=2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # Two hours of half-hour slots; table 2 is the second bit
+        self.assertEqual(self.inventory(), [
+            (self.start + timedelta(minutes=30 * i), 4, 1, 0b10) for i in range(4)
+        ])
+        booking = Booking.objects.get()
+        response = self.client.patch(
+            reverse('booking-detail', kwargs={'pk': booking.pk}),
+            {'booking_date': (self.start + timedelta(hours=1)).isoformat()}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row[1:] for row in self.inventory()], [(6, 2, 0)] * 2 + [(4, 1, 0b10)] * 4)
+        booking.refresh_from_db()
+        booking.delete()
+        self.assertEqual({row[1:] for row in self.inventory()}, {(6, 2, 0)})
+
+    def test_bookings_without_table_cannot_overbook(self):
+        self.assertEqual(self.book().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(hours=1).status_code, status.HTTP_201_CREATED)
+        response = self.book(hours=1.5)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('No table', response.data['detail'])
+        # Covers are counted too: 4 seats are left after a booking for 2
+        self.assertEqual(self.book(hours=4).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.book(hours=4, guests=5).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_lost_race_is_a_conflict(self):
+        self.assertEqual(self.book(table_number=1).status_code, status.HTTP_201_CREATED)
+        # A concurrent request validated before the first one committed
+        with mock.patch('restaurant.serializers.table_is_free', return_value=True):
+            response = self.book(hours=1, table_number=1)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_admin_reports_full_slots_as_form_errors(self):
+        self.assertEqual(self.book(table_number=1).status_code, status.HTTP_201_CREATED)
+        self.client.force_login(User.objects.create_superuser(username='admin', password='adminpass123'))
+        url = reverse('admin:restaurant_booking_add')
+        local = timezone.localtime(self.start + timedelta(hours=1))
+        data = {
+            'customer_name': 'Walk In', 'customer_email': 'walkin@example.com', 'customer_phone': '',
+            'no_of_guests': 2, 'booking_date_0': local.strftime('%Y-%m-%d'),
+            'booking_date_1': local.strftime('%H:%M:%S'), 'table_number': 1, 'special_requests': '',
+        }
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('no longer available', str(response.context['adminform'].form.errors['table_number']))
+        self.assertEqual(Booking.objects.count(), 1)
+
+        response = self.client.post(url, {**data, 'table_number': 2})
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(Booking.objects.count(), 2)
+        # Moving a booking onto a taken table is rejected the same way
+        booking = Booking.objects.get(table_number=2)
+        response = self.client.post(reverse('admin:restaurant_booking_change', args=[booking.pk]), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('table_number', response.context['adminform'].form.errors)
+        # Its own slots don't count against it
+        response = self.client.post(
+            reverse('admin:restaurant_booking_change', args=[booking.pk]), {**data, 'table_number': 2, 'no_of_guests': 3}
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual({row[1:] for row in self.inventory() if row[3] == 0b11}, {(1, 0, 0b11)})
+
+    def test_bulk_reports_full_slots(self):
+        payload = [
+            {'customer_name': f'Guest {i}', 'customer_email': 'guest@example.com', 'no_of_guests': 2,
+             'booking_date': self.start.isoformat()}
+            for i in range(3)
+        ]
+        response = self.client.post(reverse('booking-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'created', 'error'])
+        self.assertEqual({row[2] for row in self.inventory()}, {0})
+
+        response = self.client.post(reverse('booking-bulk'), {'mode': 'atomic', 'operations': [
+            {'op': 'create', 'data': {**payload[0], 'booking_date': (self.start + timedelta(hours=3)).isoformat()}},
+            {'op': 'create', 'data': payload[1]},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in response.data['results']], ['skipped', 'error'])
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_index_agrees_with_partial_slots(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.book(hours=0.25, table_number=1).status_code, status.HTTP_201_CREATED)
+        # 00:15-02:15 holds the 02:00 slot, which a booking at 02:15 needs too
+        self.assertNotIn(1, availability_index.free_tables(self.start + timedelta(hours=2.25), 2))
+        response = self.book(hours=2.25, table_number=1)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('already booked', str(response.data['table_number']))
+
+        self.assertIn(1, availability_index.free_tables(self.start + timedelta(hours=2.5), 2))
+        self.assertEqual(self.book(hours=2.5, table_number=1).status_code, status.HTTP_201_CREATED)
+
+    def test_unknown_tables_rejected(self):
+        response = self.book(table_number=3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('does not exist', str(response.data['table_number']))
+        with self.assertRaises(SlotUnavailable):
+            reserve([(self.start, 3, 2)])
+        self.assertEqual(self.inventory(), [])
+
+        with override_settings(RESTAURANT_TABLES={number: 2 for number in range(1, 65)}):
+            with self.assertRaises(ImproperlyConfigured):
+                dining_room()
+
+    def test_rebuild_matches_incremental_updates(self):
+        for hours, table_number, guests in [(0, 1, 2), (0.5, None, 3), (3, 2, 4), (3.25, 1, 1)]:
+            self.assertEqual(self.book(hours, table_number, guests).status_code, status.HTTP_201_CREATED)
+        Booking.objects.filter(no_of_guests=3).delete()
+        incremental = [row for row in self.inventory() if row[2] < 2]
+        SlotInventory.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_slot_inventory', stdout=out)
+        self.assertEqual(self.inventory(), incremental)
+        self.assertEqual(rebuild_inventory(), len(incremental))
+
+
+class BookingArchiveTest(APITestCase):
+    def setUp(self):
+        self.staff_user = User.objects.create_user(username='staffuser', password='staffpass123', is_staff=True)
+        self.client.force_authenticate(self.staff_user)
+        tz = timezone.get_current_timezone()
+        self.today = timezone.localdate()
+        for days, name in [(-200, 'Oldest'), (-120, 'Older'), (-100, 'Old'), (-10, 'Recent'), (5, 'Upcoming')]:
+            Booking.objects.create(
+                customer_name=name,
+                customer_email=f"{name.lower()}@example.com",
+                no_of_guests=2,
+                booking_date=datetime.combine(self.today + timedelta(days=days), time(19, 30), tzinfo=tz),
+                table_number=3,
+                user=self.staff_user if name == 'Older' else None
+            )
+
+    def export(self, start, end):
+        response = self.client.get(
+            reverse('booking-export', kwargs={'file_format': 'ndjson'}),
+            {'start': (self.today + timedelta(days=start)).isoformat(),
+             'end': (self.today + timedelta(days=end)).isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        return [json.loads(line)['customer_name'] for line in lines]
+
+    def test_archives_old_bookings_in_batches(self):
+        before = {booking.pk: booking for booking in Booking.objects.filter(customer_name__startswith='Old')}
+        progress = []
+        self.assertEqual(archive_bookings(batch_size=2, progress=progress.append), 3)
+        self.assertEqual(progress, [2, 3])
+        self.assertEqual(list(Booking.objects.values_list('customer_name', flat=True)), ['Recent', 'Upcoming'])
+        for archived in BookingArchive.objects.all():
+            booking = before[archived.pk]
+            self.assertEqual(
+                (archived.booking_date, archived.created_at, archived.updated_at, archived.user_id),
+                (booking.booking_date, booking.created_at, booking.updated_at, booking.user_id)
+            )
+        self.assertEqual(self.staff_user.archived_bookings.get().customer_name, 'Older')
+        # The inventory of archived days goes with them
+        self.assertFalse(SlotInventory.objects.filter(slot__lt=timezone.now() - timedelta(days=90)).exists())
+        self.assertEqual(archive_bookings(), 0)
+
+    def test_reads_span_the_archive_only_for_past_ranges(self):
+        archive_bookings()
+        self.assertEqual(len(bookings_between(self.today, self.today + timedelta(days=30))), 1)
+        self.assertEqual(len(bookings_between(self.today - timedelta(days=150), self.today)), 2)
+        self.assertEqual(self.export(-250, 30), ['Oldest', 'Older', 'Old', 'Recent', 'Upcoming'])
+        self.assertEqual(self.export(-110, 0), ['Old', 'Recent'])
+        self.assertEqual(self.export(0, 30), ['Upcoming'])
+
+    def test_command(self):
+        out = StringIO()
+        call_command('archive_bookings', '--days=30', '--batch-size=2', '--pause=0', stdout=out)
+        self.assertIn('Archived 3 bookings', out.getvalue())
+        self.assertEqual(BookingArchive.objects.count(), 3)
+        self.assertEqual(Booking.objects.count(), 2)
+
+
+class CompiledSerializerTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser', email='test@test.com', password='testpass123', first_name='Zoë', is_staff=True
+        )
+        for name, price in [('Crème brûlée', Decimal('10')), ('Bruschetta', Decimal('9.99')), ('Olives', Decimal('0.5'))]:
+            Menu.objects.create(name=name, price=price, category=Category.objects.for_name('Starters'), featured=True)
+        start = (timezone.now() + timedelta(days=1)).replace(second=0, microsecond=0)
+        for i, (table_number, user) in enumerate([(1, self.user), (None, None), (4, self.user)]):
+            Booking.objects.create(
+                customer_name=f'Guest {i}',
+                customer_email=f'guest{i}@example.com',
+                no_of_guests=2,
+                booking_date=start + timedelta(hours=3 * i, microseconds=12345 * i),
+                table_number=table_number,
+                special_requests='Allergic to "nuts"\n' if i else '',
+                user=user
+            )
+        self.client.force_authenticate(self.user)
+
+    def assertSameOutput(self, serializer_class, queryset):
+        fast = compiled(serializer_class)
+        self.assertEqual(
+            JSONRenderer().render(fast.serialize(fast.rows(queryset))),
+            JSONRenderer().render(serializer_class(queryset, many=True).data)
+        )
+
+    def test_output_matches_serializers(self):
+        for serializer_class, queryset in [
+            (MenuSerializer, Menu.objects.all()),
+            (BookingSerializer, Booking.objects.all()),
+            (UserSerializer, User.objects.all()),
+        ]:
+            with self.subTest(serializer=serializer_class.__name__):
+                self.assertSameOutput(serializer_class, queryset)
+                with timezone.override('America/New_York'):
+                    self.assertSameOutput(serializer_class, queryset)
+
+    def test_views_match_serializers(self):
+        booking = Booking.objects.filter(user__isnull=True).get()
+        response = self.client.get(reverse('booking-detail', kwargs={'pk': booking.pk}))
+        self.assertEqual(response.content, JSONRenderer().render(BookingSerializer(booking).data))
+        response = self.client.get(reverse('booking-list-create'), {'cursor': ''})
+        self.assertEqual(
+            json.loads(response.content)['results'],
+            json.loads(JSONRenderer().render(BookingSerializer(Booking.objects.all(), many=True).data))
+        )
+        item = Menu.objects.get(name='Olives')
+        response = self.client.get(reverse('menu-detail', kwargs={'pk': item.pk}))
+        self.assertEqual(response.content, JSONRenderer().render(MenuSerializer(item).data))
+        response = self.client.get(reverse('booking-detail', kwargs={'pk': 999}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['detail'], 'No Booking matches the given query.')
+
+    def test_rejects_fields_it_cannot_compile(self):
+        class MethodSerializer(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Menu
+                fields = ['id', 'label']
+
+        with self.assertRaises(ImproperlyConfigured):
+            CompiledSerializer(MethodSerializer)
+
+
+class FastJSONTest(APITestCase):
+    PAYLOAD = {
+        'results': [{'price': '9.99', 'name': 'Crème brûlée\u2028', 'available': True, 'table_number': None}],
+        'decimal': Decimal('12.50'),
+        'utc': datetime(2026, 1, 1, 12, 0, 0, 5, tzinfo=zoneinfo.ZoneInfo('UTC')),
+        'winter_london': datetime(2026, 1, 1, 12, 0, tzinfo=zoneinfo.ZoneInfo('Europe/London')),
+        'paris': datetime(2026, 7, 1, 12, 0, tzinfo=zoneinfo.ZoneInfo('Europe/Paris')),
+        'naive': datetime(2026, 1, 1),
+        'date': datetime(2026, 1, 2).date(),
+        'time': time(12, 30, 1, 5),
+        'duration': timedelta(hours=1),
+        'uuid': uuid.UUID(int=5),
+        1: ('tuple', 2.5),
+    }
+
+    def render(self, data):
+        fast = FastJSONRenderer().render(data)
+        self.assertEqual(fast, JSONRenderer().render(data))
+        return fast
+
+    def parse(self, body):
+        fast = FastJSONParser().parse(BytesIO(body))
+        self.assertEqual(fast, JSONParser().parse(BytesIO(body)))
+        return fast
+
+    def test_renders_like_drf(self):
+        self.render(self.PAYLOAD)
+        # Beyond orjson's 64 bits: DRF's renderer takes over
+        self.assertEqual(self.render({'big': 2 ** 70}), b'{"big":1180591620717411303424}')
+        with mock.patch('restaurant.renderers.orjson', None):
+            self.render(self.PAYLOAD)
+
+    def test_parses_like_drf(self):
+        self.assertEqual(self.parse(b'{"a": [1, 2.5, "\\u00e9", {"b": null}]}'), {'a': [1, 2.5, 'é', {'b': None}]})
+        self.assertEqual(self.parse(b'{"n": 123456789012345678901234567890}'), {'n': 123456789012345678901234567890})
+        for body in [b'{"a":', b'{"a": NaN}']:
+            messages = []
+            for parser in (FastJSONParser(), JSONParser()):
+                with self.assertRaises(ParseError) as raised:
+                    parser.parse(BytesIO(body))
+                messages.append(str(raised.exception))
+            self.assertEqual(messages[0], messages[1])
+
+    def test_configured_for_the_api(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('booking-list-create'), {
+            'customer_name': 'Zoë', 'customer_email': 'zoe@example.com', 'no_of_guests': 2,
+            'booking_date': (timezone.now() + timedelta(days=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertEqual(response.data['customer_name'], 'Zoë')
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_SIZE=1024)
+class CompressionTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        pizza = Category.objects.for_name("Pizza")
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(12):
+                Menu.objects.create(
+                    name=f"Pizza {number}", description="Tomato, mozzarella and basil",
+                    price=Decimal('12.50'), category=pizza, featured=number < 2,
+                )
+
+    def get(self, url, encoding='gzip, deflate, br', **extra):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding, **extra)
+
+    def compressions(self, compress):
+        """The responses ``compress`` compressed, leaving out menu snapshot rebuilds."""
+        return [call for call in compress.call_args_list if 'compresslevel' in call.kwargs]
+
+    def test_menu_list_gzipped(self):
+        url = reverse('menu-list-create')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.get(url)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    def test_compressed_menu_cached_per_version(self):
+        url = reverse('menu-list-create')
+        with mock.patch('restaurant.compression.gzip.compress', wraps=gzip.compress) as compress:
+            first = self.get(url).content
+            self.assertEqual(self.get(url).content, first)
+            self.assertEqual(len(self.compressions(compress)), 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                Menu.objects.filter(name="Pizza 0").get().delete()
+            response = self.get(url)
+            self.assertEqual(len(self.compressions(compress)), 2)
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 11)
+
+    def test_html_not_compressed(self):
+        self.client.force_login(User.objects.create_user(username='alice', password='testpass123'))
+        response = self.get(reverse('menu-list-create'), HTTP_ACCEPT='text/html')
+        self.assertGreater(len(response.content), 1024)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn(b'alice', response.content)
+
+    def test_indent_not_shared(self):
+        url = reverse('menu-list-create')
+        compact = gzip.decompress(self.get(url).content)
+        indented = gzip.decompress(self.get(url, HTTP_ACCEPT='application/json; indent=4').content)
+        self.assertNotEqual(indented, compact)
+        self.assertEqual(json.loads(indented), json.loads(compact))
+        self.assertIn(b'\n    ', indented)
+
+    def test_negotiation(self):
+        url = reverse('menu-list-create')
+        for encoding, compressed in [
+            ('gzip;q=0, deflate', False), ('identity', False), ('br', False),
+            ('*', True), ('GZIP;q=0.5', True), ('gzip;q=0, *', False),
+        ]:
+            with self.subTest(encoding=encoding):
+                self.assertEqual('Content-Encoding' in self.get(url, encoding), compressed)
+
+    def test_small_responses_not_compressed(self):
+        url = reverse('featured-menu')
+        response = self.get(url)
+        self.assertLess(len(response.content), 1024)
+        self.assertNotIn('Content-Encoding', response)
+        self.assertNotIn('Accept-Encoding', response.get('Vary', ''))
+        with override_settings(RESPONSE_COMPRESSION_MIN_SIZE=0):
+            self.assertEqual(self.get(url)['Content-Encoding'], 'gzip')
+            # Not worth it when gzip can't make the payload smaller
+            self.assertNotIn('Content-Encoding', self.get(reverse('menu-categories')))
+
+    def test_uncached_responses_compressed_per_request(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        Booking.objects.bulk_create([
+            Booking(customer_name=f"Guest {number}", customer_email="guest@example.com", no_of_guests=2,
+                    booking_date=timezone.now() + timedelta(days=number + 1), user=user)
+            for number in range(10)
+        ])
+        self.client.force_authenticate(user)
+        url = reverse('booking-list-create')
+        with mock.patch('restaurant.compression.gzip.compress', wraps=gzip.compress) as compress:
+            self.get(url)
+            response = self.get(url)
+            self.assertEqual(len(self.compressions(compress)), 2)
+        self.assertEqual(json.loads(gzip.decompress(response.content))['count'], 10)
+
+    def test_weak_etag_still_validates(self):
+        url = reverse('menu-list-create')
+        response = self.get(url)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(response['ETag'], 'W/' + self.client.get(url)['ETag'])
+        response = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(ASGI_URLCONF='littlelemon.urls_asgi')
+    async def test_async_views_share_compressed_bytes(self):
+        url = reverse('menu-list-create')
+        sync_response = await sync_to_async(self.get)(url)
+        with mock.patch('restaurant.compression.gzip.compress', wraps=gzip.compress) as compress:
+            response = await self.async_client.get(url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content, sync_response.content)
+        self.assertEqual(self.compressions(compress), [])
+
+    def test_level_from_settings(self):
+        url = reverse('featured-menu')
+        with override_settings(RESPONSE_COMPRESSION_MIN_SIZE=0, RESPONSE_COMPRESSION_LEVEL=1), \
+                mock.patch('restaurant.compression.gzip.compress', wraps=gzip.compress) as compress:
+            self.get(url)
+        self.assertEqual(self.compressions(compress)[0].kwargs['compresslevel'], 1)
+
+
+class SparseFieldsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', email='test@test.com', password='testpass123')
+        self.menu_item = Menu.objects.create(
+            name="Test Pizza", description="Delicious test pizza", price=Decimal('15.99'),
+            category=Category.objects.for_name("Pizza"), featured=True,
+        )
+        self.booking = Booking.objects.create(
+            customer_name="John Doe", customer_email="john@example.com", no_of_guests=4,
+            booking_date=timezone.now() + timedelta(days=1), user=self.user,
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_menu_endpoints(self):
+        for url, items in [
+            (reverse('menu-list-create'), lambda data: data['results']),
+            (reverse('menu-list-create') + '?cursor=', lambda data: data['results']),
+            (reverse('featured-menu'), lambda data: data),
+            (reverse('menu-by-category', kwargs={'category': 'pizza'}), lambda data: data),
+            (reverse('menu-search') + '?q=pizza', lambda data: data['results']),
+            (reverse('menu-detail', kwargs={'pk': self.menu_item.pk}), lambda data: [data]),
+        ]:
+            with self.subTest(url=url):
+                full = items(self.client.get(url).json())
+                separator = '&' if '?' in url else '?'
+                sparse = items(self.client.get(f'{url}{separator}fields=price,name,id,category').json())
+                extra = ['highlight'] if 'highlight' in full[0] else []
+                self.assertEqual(list(sparse[0]), ['id', 'name', 'price', 'category', *extra])
+                self.assertEqual(sparse[0]['price'], full[0]['price'])
+                omitted = items(self.client.get(f'{url}{separator}omit=description,created_at,updated_at').json())
+                self.assertEqual(
+                    list(omitted[0]), ['id', 'name', 'price', 'category', 'available', 'featured', *extra])
+
+    def test_booking_columns_pruned(self):
+        url = reverse('booking-list-create')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'fields': 'id,customer_name'})
+        self.assertEqual(response.json()['results'], [{'id': self.booking.pk, 'customer_name': 'John Doe'}])
+        select = queries.captured_queries[-1]['sql']
+        self.assertNotIn('JOIN', select)
+        self.assertNotIn('special_requests', select)
+
+        response = self.client.get(url, {'omit': 'user'})
+        self.assertNotIn('user', response.json()['results'][0])
+        self.assertIn('special_requests', response.json()['results'][0])
+        # Keyset pagination still finds its ordering columns
+        response = self.client.get(url, {'fields': 'customer_name', 'cursor': '', 'page_size': 1})
+        self.assertEqual(response.json()['results'], [{'customer_name': 'John Doe'}])
+
+        detail = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        response = self.client.get(detail, {'fields': 'user'})
+        self.assertEqual(response.json(), {'user': UserSerializer(self.user).data})
+
+    def test_fieldsets_have_their_own_etags(self):
+        url = reverse('booking-detail', kwargs={'pk': self.booking.pk})
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'id': self.booking.pk})
+
+    def test_unknown_field_rejected(self):
+        response = self.client.get(reverse('featured-menu'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'fields': ['Unknown field: secret.']})
+        response = self.client.get(reverse('booking-list-create'), {'omit': 'password'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(ASGI_URLCONF='littlelemon.urls_asgi')
+    async def test_async_views_match(self):
+        token = 'Bearer ' + str(RefreshToken.for_user(self.user).access_token)
+        for url in [
+            reverse('menu-list-create') + '?fields=id,name',
+            reverse('featured-menu') + '?omit=description',
+            reverse('menu-by-category', kwargs={'category': 'pizza'}) + '?fields=name',
+            reverse('booking-detail', kwargs={'pk': self.booking.pk}) + '?fields=customer_name',
+            reverse('featured-menu') + '?fields=nope',
+        ]:
+            sync_response = await sync_to_async(self.client.get)(url)
+            async_response = await self.async_client.get(url, headers={'authorization': token})
+            self.assertEqual(async_response.status_code, sync_response.status_code, url)
+            self.assertEqual(async_response.json(), sync_response.json(), url)
+
+
+class OccupancyRollupTest(APITestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.day = timezone.localdate() + timedelta(days=3)
+
+    def book(self, hour, table_number, guests, day=None):
+        booking_date = timezone.make_aware(datetime.combine(day or self.day, time(hour, 0)))
+        return Booking.objects.create(
+            customer_name="Guest", customer_email="guest@example.com", no_of_guests=guests,
+            booking_date=booking_date, table_number=table_number,
+        )
+
+    def rollups(self):
+        return list(
+            OccupancyRollup.objects.filter(bookings__gt=0)
+            .values_list('date', 'hour', 'table_number', 'guests', 'bookings')
+        )
+
+    def assertMatchesRebuild(self):
+        rollups = self.rollups()
+        rebuild_rollups()
+        self.assertEqual(rollups, self.rollups())
+
+    def test_follows_booking_writes(self):
+        first = self.book(19, 1, 2)
+        second = self.book(19, 3, 4)
+        self.book(12, None, 3)
+        self.assertEqual(self.rollups(), [
+            (self.day, 12, 0, 3, 1), (self.day, 19, 1, 2, 1), (self.day, 19, 3, 4, 1),
+        ])
+
+        second.table_number, second.no_of_guests = 1, 2
+        second.booking_date += timedelta(hours=2)
+        second.save()
+        # Not loaded with the fields the rollup key needs
+        moved = Booking.objects.only('customer_name').get(pk=first.pk)
+        moved.table_number = 2
+        moved.save()
+        first.refresh_from_db()
+        first.delete()
+        self.assertEqual(self.rollups(), [(self.day, 12, 0, 3, 1), (self.day, 21, 1, 2, 1)])
+        self.assertMatchesRebuild()
+
+        # Archived bookings stay in the rollups
+        Booking.objects.update(booking_date=timezone.now() - timedelta(days=200))
+        rebuild_rollups()
+        before = self.rollups()
+        archive_bookings()
+        self.assertEqual(Booking.objects.count(), 0)
+        self.assertEqual(self.rollups(), before)
+        self.assertMatchesRebuild()
+
+    def test_bulk_endpoint(self):
+        kept = self.book(19, 1, 2)
+        cancelled = self.book(19, 2, 2)
+        self.client.force_authenticate(self.staff)
+        booking_date = timezone.make_aware(datetime.combine(self.day, time(13, 0))).isoformat()
+        response = self.client.post(reverse('booking-bulk'), {'mode': 'atomic', 'operations': [
+            {'op': 'cancel', 'id': cancelled.pk},
+            {'op': 'update', 'id': kept.pk, 'data': {'no_of_guests': 4, 'table_number': 3}},
+            {'op': 'create', 'data': {
+                'customer_name': 'New', 'customer_email': 'new@example.com', 'no_of_guests': 5,
+                'booking_date': booking_date, 'table_number': 7,
+            }},
+        ]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(self.rollups(), [(self.day, 13, 7, 5, 1), (self.day, 19, 3, 4, 1)])
+        self.assertMatchesRebuild()
+
+    def test_report(self):
+        self.book(19, 1, 2)
+        self.book(20, 3, 4)
+        self.book(19, None, 3)
+        next_month = (self.day.replace(day=1) + timedelta(days=32)).replace(day=1)
+        self.book(19, 1, 2, day=next_month)
+        url = reverse('occupancy-report')
+        month = self.day.strftime('%Y-%m')
+
+        self.client.force_authenticate(User.objects.create_user(username='guest'))
+        self.assertEqual(self.client.get(url, {'start': month, 'end': month}).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.staff)
+        # Read from the rollups alone, however many bookings there are
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'start': month, 'end': month})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(all('restaurant_booking' not in query['sql'] for query in queries))
+        report = response.json()
+        self.assertEqual(report['start'], self.day.replace(day=1).isoformat())
+        self.assertEqual((report['bookings'], report['covers']), (3, 9))
+        self.assertEqual(report['days'], [{
+            'date': self.day.isoformat(), 'bookings': 3, 'covers': 9,
+            'hours': [{'hour': 19, 'bookings': 2, 'covers': 5}, {'hour': 20, 'bookings': 1, 'covers': 4}],
+        }])
+        tables = {table['table_number']: table for table in report['tables']}
+        self.assertEqual(len(tables), len(settings.RESTAURANT_TABLES))
+        self.assertEqual(tables[3]['covers'], 4)
+        days = int(report['end'][-2:])
+        self.assertAlmostEqual(tables[1]['utilization'], 2 / (12 * days), places=4)
+        self.assertEqual(tables[2]['utilization'], 0)
+        self.assertEqual(report['unassigned'], {'bookings': 1, 'covers': 3})
+        self.assertEqual(report['party_sizes'], [
+            {'guests': 2, 'bookings': 1}, {'guests': 3, 'bookings': 1}, {'guests': 4, 'bookings': 1},
+        ])
+
+        response = self.client.get(url, {'start': month, 'end': next_month.strftime('%Y-%m')})
+        self.assertEqual(response.json()['bookings'], 4)
+        for params in [{'start': month, 'end': '2000-01'}, {'start': '2000-01', 'end': '2001-01'}, {'start': 'May'}]:
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_rebuild_command(self):
+        self.book(19, 1, 2)
+        OccupancyRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_occupancy', '--days', '0', stdout=out)
+        self.assertIn('1 rows', out.getvalue())
+        self.assertEqual(self.rollups(), [(self.day, 19, 1, 2, 1)])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def read_from(self, method, path, status_code=200, cookies=None, primary=False, user=None):
+        """The database a request's view reads from, and its response."""
+        seen = []
+
+        def view(request):
+            if user is not None:
+                # As DRF does once it has authenticated a token
+                request.user = user
+            if primary:
+                with use_primary():
+                    seen.append(self.router.db_for_read(Menu))
+            else:
+                seen.append(self.router.db_for_read(Menu))
+            return HttpResponse(status=status_code)
+
+        request = getattr(self.factory, method)(path)
+        request.COOKIES.update(cookies or {})
+        response = replica_middleware(view)(request)
+        self.assertIsNone(self.router.db_for_read(Menu))
+        return seen[0], response
+
+    def test_routes_api_reads_to_replicas(self):
+        self.assertIn(self.read_from('get', '/restaurant/menu/')[0], ['replica1', 'replica2'])
+        self.assertIn(self.read_from('head', '/restaurant/booking/')[0], ['replica1', 'replica2'])
+        self.assertIsNone(self.read_from('get', '/admin/')[0])
+        self.assertIsNone(self.read_from('get', '/restaurant/menu/', primary=True)[0])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertIsNone(self.read_from('get', '/restaurant/menu/')[0])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        alias, response = self.read_from('post', '/restaurant/booking/', status_code=201)
+        self.assertIsNone(alias)
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertTrue(cookie['httponly'])
+
+        self.assertIsNone(self.read_from('get', '/restaurant/booking/', cookies={PIN_COOKIE: cookie.value})[0])
+        expired = {PIN_COOKIE: str(time_module.time() - 1)}
+        self.assertIsNotNone(self.read_from('get', '/restaurant/booking/', cookies=expired)[0])
+        self.assertIsNotNone(self.read_from('get', '/restaurant/booking/', cookies={PIN_COOKIE: 'x'})[0])
+        # Nothing was written
+        _, response = self.read_from('post', '/restaurant/booking/', status_code=400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_pin_the_user_to_the_primary(self):
+        user = User.objects.create_user(username='tokenuser', password='testpass123')
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.read_from('post', '/restaurant/booking/', status_code=400, user=user)
+        self.assertIsNotNone(self.read_from('get', '/restaurant/booking/', user=user)[0])
+
+        self.read_from('post', '/restaurant/booking/', status_code=201, user=user)
+        # Without the cookie, as token clients often are
+        self.assertIsNone(self.read_from('get', '/restaurant/booking/', user=user)[0])
+        self.assertIsNotNone(self.read_from('get', '/restaurant/booking/', user=other)[0])
+        self.assertIsNotNone(self.read_from('get', '/restaurant/booking/')[0])
+
+    def test_writes_and_migrations_go_to_the_primary(self):
+        token = route_request(self.factory.get('/restaurant/menu/'))
+        try:
+            self.assertIn(self.router.db_for_read(Menu), ['replica1', 'replica2'])
+            self.assertEqual(self.router.db_for_write(Menu), 'default')
+            self.assertIsNone(self.router.db_for_read(User))
+            # Filled from the primary: cached for the whole menu version
+            self.assertIsNone(cached_menu_data('replica-test', '', lambda: self.router.db_for_read(Menu)))
+        finally:
+            reset_route(token)
+        self.assertFalse(self.router.allow_migrate('replica1', 'restaurant'))
+        self.assertIsNone(self.router.allow_migrate('default', 'restaurant'))
+
+    def test_health_reports_replica_lag(self):
+        url = reverse('replica-health')
+        with override_settings(DATABASE_REPLICAS=[]):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['replicas'], [])
+
+        # The test database standing in for a replica
+        with override_settings(DATABASE_REPLICAS=['default']):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response.json()['replicas'], [{'alias': 'default', 'lag_seconds': None, 'healthy': False}])
+
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE TABLE replica_status (refreshed_at REAL NOT NULL)')
+                cursor.execute('INSERT INTO replica_status VALUES (%s)', [time_module.time() - 2])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            [replica] = response.json()['replicas']
+            self.assertTrue(replica['healthy'])
+            self.assertGreaterEqual(replica['lag_seconds'], 2)
+
+            with connection.cursor() as cursor:
+                cursor.execute('UPDATE replica_status SET refreshed_at = %s', [time_module.time() - 3600])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertFalse(response.json()['healthy'])
+
+
+class ReplicaCopyTest(TransactionTestCase):
+    # The backup waits for the source's write transactions, like TestCase's
+    def test_copy_database(self):
+        Menu.objects.create(name="Bruschetta", price=Decimal('7.50'), category=Category.objects.for_name("Starters"))
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'replica.sqlite3')
+            before = time_module.time()
+            copy_database(target)
+            copy = sqlite3.connect(target)
+            try:
+                names = [name for name, in copy.execute(f'SELECT name FROM {Menu._meta.db_table}')]
+                [(refreshed_at,)] = copy.execute('SELECT refreshed_at FROM replica_status').fetchall()
+
+                # A connection kept open across refreshes reads the new copy, status included
+                Menu.objects.create(name="Arancini", price=Decimal('8.50'), category=Category.objects.for_name("Starters"))
+                refreshed_again = copy_database(target)
+                newer = [name for name, in copy.execute(f'SELECT name FROM {Menu._meta.db_table} ORDER BY name')]
+                status_rows = copy.execute('SELECT refreshed_at FROM replica_status').fetchall()
+            finally:
+                copy.close()
+        self.assertEqual(names, ["Bruschetta"])
+        self.assertGreaterEqual(refreshed_at, before)
+        self.assertEqual(newer, ["Arancini", "Bruschetta"])
+        self.assertEqual(status_rows, [(refreshed_again,)])
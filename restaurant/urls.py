@@ -7,8 +7,17 @@ urlpatterns = [
     path('menu/<int:pk>/', views.MenuDetailView.as_view(), name='menu-detail'),
     path('menu/featured/', views.featured_menu_items, name='featured-menu'),
     path('menu/categories/', views.menu_categories, name='menu-categories'),
+    path('menu/search/', views.menu_search, name='menu-search'),
+    path('menu/snapshot/', views.menu_snapshot, name='menu-snapshot'),
+    path('menu/export/<str:file_format>/', views.menu_export, name='menu-export'),
+    path('menu/import/<str:file_format>/', views.menu_import, name='menu-import'),
     path('menu/category/<str:category>/', views.menu_by_category, name='menu-by-category'),
     path('booking/', views.BookingListCreateView.as_view(), name='booking-list-create'),
+    path('booking/export/<str:file_format>/', views.booking_export, name='booking-export'),
+    path('booking/bulk/', views.BookingBulkView.as_view(), name='booking-bulk'),
     path('booking/<int:pk>/', views.BookingDetailView.as_view(), name='booking-detail'),
+    path('availability/', views.table_availability, name='table-availability'),
+    path('reports/occupancy/', views.occupancy, name='occupancy-report'),
+    path('health/replicas/', views.replica_health, name='replica-health'),
     path('profile/', views.user_profile, name='user-profile'),
 ]
\ No newline at end of file
@@ -0,0 +1,11 @@
+from django.urls import path
+from . import async_views
+
+# Same paths and names as restaurant.urls; see littlelemon.urls_asgi
+urlpatterns = [
+    path('menu/', async_views.menu_list, name='menu-list-create'),
+    path('menu/featured/', async_views.featured_menu_items, name='featured-menu'),
+    path('menu/categories/', async_views.menu_categories, name='menu-categories'),
+    path('menu/category/<str:category>/', async_views.menu_by_category, name='menu-by-category'),
+    path('booking/<int:pk>/', async_views.booking_detail, name='booking-detail'),
+]
@@ -1,15 +1,53 @@
+import csv
+from datetime import datetime
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseForbidden, Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.text import slugify
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+from .authentication import load_user
+from .availability import availability_index
+from .booking_export import FORMATS as BOOKING_FILE_FORMATS, bookings_between, export_bookings
+from .bulk import process_booking_operations
+from .menu_io import FORMATS as MENU_FILE_FORMATS, export_menu, import_menu, read_rows, text_stream
+from .cache import cached_menu_data, get_menu_version
+from .compiled import CompiledListMixin, CompiledRetrieveMixin, compiled
+from .compression import accepts_gzip, compress_once
+from .conditional import CollectionConditionalGetMixin, ObjectConditionalGetMixin
+from .inventory import SlotUnavailable
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, registry, render as render_metrics, scrape_allowed
 from .models import Menu, Booking
-from .serializers import MenuSerializer, BookingSerializer, BookingCreateSerializer, UserSerializer
+from .occupancy import occupancy_report
+from .pagination import BookingPagination, MenuPagination, canonical_url
+from .replicas import max_lag, replica_health as check_replicas
+from .serializers import (
+    MenuSerializer, BookingSerializer, BookingCreateSerializer, UserSerializer, AvailabilityQuerySerializer,
+    BookingExportQuerySerializer, OccupancyQuerySerializer, MenuSearchQuerySerializer,
+)
+from .search import search_menu
+from .snapshot import get_menu_snapshot
+from .sparse import FIELDS_PARAM, fields_variant, prune, requested_fields
 
 
-class MenuListCreateView(generics.ListCreateAPIView):
-    queryset = Menu.objects.all()
+def cached_menu_response(endpoint, variant, build):
+    """``cached_menu_data`` as a response whose gzipped body is cached as well."""
+    version = get_menu_version()
+    return compress_once(Response(cached_menu_data(endpoint, variant, build)), version, f'{endpoint}|{variant}')
+
+
+class MenuListCreateView(CollectionConditionalGetMixin, generics.ListCreateAPIView):
+    queryset = MenuSerializer.setup_eager_loading(Menu.objects.all())
     serializer_class = MenuSerializer
+    pagination_class = MenuPagination
 
     def get_permissions(self):
         if self.request.method == 'GET':
@@ -18,9 +56,27 @@ class MenuListCreateView(generics.ListCreateAPIView):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    def get_collection_freshness(self):
+        snapshot = get_menu_snapshot()
+        return snapshot.last_modified, snapshot.count
+
+    def list(self, request, *args, **kwargs):
+        fields = requested_fields(request, MenuSerializer)
+        # Other query parameters don't change the page, nor get a cache entry of their own
+        self.paginator.base_url = canonical_url(request, [
+            *self.paginator.query_params(request), (FIELDS_PARAM, fields_variant(fields) or None),
+        ])
+
+        def build():
+            # The snapshot is already in the default (category, name) ordering
+            page = self.paginate_queryset(get_menu_snapshot().items)
+            return self.get_paginated_response(prune(page, fields)).data
+
+        return cached_menu_response('menu-list', self.paginator.base_url, build)
 
-class MenuDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Menu.objects.all()
+
+class MenuDetailView(ObjectConditionalGetMixin, CompiledRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = MenuSerializer.setup_eager_loading(Menu.objects.all())
     serializer_class = MenuSerializer
 
     def get_permissions(self):
@@ -31,8 +87,52 @@ class MenuDetailView(generics.RetrieveUpdateDestroyAPIView):
         return [permission() for permission in permission_classes]
 
 
-class BookingListCreateView(generics.ListCreateAPIView):
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def menu_export(request, file_format):
+    """Stream the whole menu as CSV or NDJSON"""
+    if file_format not in MENU_FILE_FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(export_menu(file_format), content_type=EXPORT_CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="menu.{file_format}"'
+    return response
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def menu_import(request, file_format):
+    """
+    Upsert menu items from a CSV or NDJSON upload, keyed on ``name``.
+
+    Accepts a multipart ``file`` field or the raw file as the request body.
+    """
+    if file_format not in MENU_FILE_FORMATS:
+        raise Http404
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': ['No file was submitted.']}, status=status.HTTP_400_BAD_REQUEST)
+        stream = text_stream(upload.file)
+    elif request.stream is not None:
+        stream = text_stream(request.stream)
+    else:
+        return Response({'detail': 'Empty request body.'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        summary = import_menu(read_rows(stream, file_format))
+    except (UnicodeDecodeError, csv.Error) as exc:
+        return Response({'detail': f'Could not read file: {exc}'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(summary)
+
+
+class BookingListCreateView(CollectionConditionalGetMixin, CompiledListMixin, generics.ListCreateAPIView):
     serializer_class = BookingSerializer
+    pagination_class = BookingPagination
 
     def get_permissions(self):
         """
@@ -47,15 +147,29 @@ class BookingListCreateView(generics.ListCreateAPIView):
 
     def get_queryset(self):
         user = self.request.user
+        queryset = BookingSerializer.setup_eager_loading(Booking.objects.all())
         if user.is_staff:
-            return Booking.objects.all()
-        return Booking.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+    def get_etag_parts(self, request):
+        # Staff and regular users see different collections at the same URL
+        return [request.get_full_path(), request.user.pk, request.user.is_staff]
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return BookingCreateSerializer
         return BookingSerializer
 
+    def create(self, request, *args, **kwargs):
+        # Check availability and insert under one write lock (BEGIN IMMEDIATE)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except SlotUnavailable as exc:
+            # Lost the slot to a concurrent booking, or the room is full
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+
     def perform_create(self, serializer):
         # For anonymous bookings, don't set user
         if self.request.user.is_authenticated:
@@ -64,37 +178,207 @@ class BookingListCreateView(generics.ListCreateAPIView):
             serializer.save()
 
 
-class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
+class BookingDetailView(ObjectConditionalGetMixin, CompiledRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
+    etag_columns = tuple(f'user__{field}' for field in UserSerializer.Meta.fields)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except SlotUnavailable as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
 
     def get_queryset(self):
         user = self.request.user
+        queryset = BookingSerializer.setup_eager_loading(Booking.objects.all())
         if user.is_staff:
-            return Booking.objects.all()
-        return Booking.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
+
+
+class BookingBulkView(APIView):
+    """
+    Create, update or cancel many bookings in one request.
+
+    The body is either a list of booking payloads to create, or
+    ``{"mode": "partial" | "atomic", "operations": [{"op": ..., "id": ..., "data": {...}}]}``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        payload = request.data
+        if isinstance(payload, list):
+            mode, operations = 'partial', [{'op': 'create', 'data': item} for item in payload]
+        elif isinstance(payload, dict):
+            mode, operations = payload.get('mode', 'partial'), payload.get('operations')
+        else:
+            mode, operations = None, None
+
+        if mode not in ('partial', 'atomic') or not isinstance(operations, list):
+            return Response(
+                {'detail': 'Expected a list of bookings or {"mode": "partial"|"atomic", "operations": [...]}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        limit = getattr(settings, 'BOOKING_BULK_MAX_OPERATIONS', 500)
+        if len(operations) > limit:
+            return Response(
+                {'detail': f'At most {limit} operations per request.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, applied = process_booking_operations(operations, request.user, atomic=mode == 'atomic')
+        failed = any(result['status'] == 'error' for result in results)
+        succeeded = any(result['status'] not in ('error', 'skipped') for result in results)
+        if not failed:
+            response_status = status.HTTP_200_OK
+        elif applied and succeeded:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'mode': mode, 'applied': applied, 'results': results}, status=response_status)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def booking_export(request, file_format):
+    """Stream all bookings between ?start= and ?end= (inclusive dates) as CSV or NDJSON"""
+    if file_format not in BOOKING_FILE_FORMATS:
+        raise Http404
+    query = BookingExportQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    start, end = query.validated_data['start'], query.validated_data['end']
+
+    response = StreamingHttpResponse(
+        export_bookings(bookings_between(start, end), file_format),
+        content_type=EXPORT_CONTENT_TYPES[file_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="bookings-{start}-{end}.{file_format}"'
+    return response
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def featured_menu_items(request):
-    featured_items = Menu.objects.filter(featured=True, available=True)
-    serializer = MenuSerializer(featured_items, many=True)
-    return Response(serializer.data)
+    fields = requested_fields(request, MenuSerializer)
+
+    def build():
+        return prune(get_menu_snapshot().featured, fields)
+
+    return cached_menu_response('featured-menu', fields_variant(fields), build)
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def menu_by_category(request, category):
-    menu_items = Menu.objects.filter(category__iexact=category, available=True)
-    serializer = MenuSerializer(menu_items, many=True)
-    return Response(serializer.data)
+    fields = requested_fields(request, MenuSerializer)
+
+    def build():
+        return prune(get_menu_snapshot().category_items(category), fields)
+
+    return cached_menu_response('menu-by-category', f'{slugify(category)}|{fields_variant(fields)}', build)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_search(request):
+    """Menu items matching ?q=, best match first, with the matches highlighted"""
+    query = MenuSearchQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    limit, offset = params['limit'], params['offset']
+    fields = requested_fields(request, MenuSerializer)
+    url = canonical_url(request, [
+        ('q', params['q']), ('limit', limit), ('offset', offset), (FIELDS_PARAM, fields_variant(fields) or None),
+    ])
+
+    def build():
+        hits = search_menu(params['q'], limit=limit + 1, offset=offset)
+        has_next, hits = len(hits) > limit, hits[:limit]
+        serializer = compiled(MenuSerializer, fields)
+        rows = list(serializer.rows(Menu.objects.filter(pk__in=[pk for pk, _, _ in hits]), 'pk'))
+        items = {row.pk: item for row, item in zip(rows, serializer.serialize(rows))}
+        return {
+            'query': params['q'],
+            'next': replace_query_param(url, 'offset', offset + limit) if has_next else None,
+            'previous': replace_query_param(url, 'offset', max(offset - limit, 0)) if offset else None,
+            'results': [
+                {**items[pk], 'highlight': highlight}
+                for pk, _, highlight in hits if pk in items
+            ],
+        }
+
+    return cached_menu_response('menu-search', url, build)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def menu_snapshot(request):
+    """The whole menu grouped by category, served as pre-encoded bytes"""
+    snapshot = get_menu_snapshot()
+    if accepts_gzip(request):
+        response = HttpResponse(snapshot.gzip, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(snapshot.raw, content_type='application/json')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def table_availability(request):
+    """Free tables at a given time, or free slots over one or more days"""
+    query = AvailabilityQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    guests = params['guests']
+
+    if params.get('time') is not None:
+        booking_date = timezone.make_aware(datetime.combine(params['date'], params['time']))
+        return Response({
+            'booking_date': booking_date.isoformat(),
+            'guests': guests,
+            'tables': availability_index.free_tables(booking_date, guests),
+        })
+
+    slots = availability_index.free_slots(params['date'], guests, days=params['days'])
+    return Response({
+        'date': params['date'].isoformat(),
+        'days': params['days'],
+        'guests': guests,
+        'slots': [
+            {'booking_date': slot.isoformat(), 'tables': tables}
+            for slot, tables in slots
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def occupancy(request):
+    """Covers, table utilization and party sizes from ?start= to ?end= (YYYY-MM months), from the rollups"""
+    query = OccupancyQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    return Response(occupancy_report(query.validated_data['start'], query.validated_data['end']))
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def replica_health(request):
+    """Lag of every read replica behind the primary; 503 once one is unknown or over REPLICA_MAX_LAG"""
+    healthy, replicas = check_replicas()
+    return Response(
+        {'healthy': healthy, 'max_lag_seconds': max_lag(), 'replicas': replicas},
+        status=status.HTTP_200_OK if healthy else status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
 
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def user_profile(request):
-    serializer = UserSerializer(request.user)
+    serializer = UserSerializer(load_user(request.user))
     return Response(serializer.data)
 
 
@@ -115,6 +399,11 @@ def api_overview(request):
             'Delete Menu Item': '/restaurant/menu/{id}/ (DELETE)',
             'Featured Items': '/restaurant/menu/featured/',
             'By Category': '/restaurant/menu/category/{category}/',
+            'Categories': '/restaurant/menu/categories/',
+            'Search Menu': '/restaurant/menu/search/?q=basil',
+            'Menu Snapshot': '/restaurant/menu/snapshot/',
+            'Export Menu': '/restaurant/menu/export/{csv|ndjson}/',
+            'Import Menu': '/restaurant/menu/import/{csv|ndjson}/ (POST)',
         },
         'Bookings': {
             'List Bookings': '/restaurant/booking/',
@@ -122,6 +411,13 @@ def api_overview(request):
             'Get Booking': '/restaurant/booking/{id}/',
             'Update Booking': '/restaurant/booking/{id}/ (PUT/PATCH)',
             'Cancel Booking': '/restaurant/booking/{id}/ (DELETE)',
+            'Bulk Bookings': '/restaurant/booking/bulk/ (POST)',
+            'Export Bookings': '/restaurant/booking/export/{csv|ndjson}/?start=YYYY-MM-DD&end=YYYY-MM-DD',
+            'Table Availability': '/restaurant/availability/?date=YYYY-MM-DD&time=HH:MM&guests=N',
+            'Occupancy Report': '/restaurant/reports/occupancy/?start=YYYY-MM&end=YYYY-MM',
+        },
+        'Health': {
+            'Replica Lag': '/restaurant/health/replicas/',
         },
         'User': {
             'User Profile': '/restaurant/profile/',
@@ -138,5 +434,15 @@ def api_overview(request):
 @permission_classes([AllowAny])
 def menu_categories(request):
     """Get all unique menu categories"""
-    categories = Menu.objects.values_list('category', flat=True).distinct().order_by('category')
-    return Response(sorted(set(categories)))
+    def build():
+        return get_menu_snapshot().categories
+
+    return cached_menu_response('menu-categories', '', build)
+
+
+@require_safe
+def metrics(request):
+    """Request metrics of all worker processes in the Prometheus text format"""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(registry.collect()), content_type=METRICS_CONTENT_TYPE)